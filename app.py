@@ -1,9 +1,25 @@
-from flask import Flask, flash, redirect, render_template, request, session, jsonify, send_file
-from flask_session import Session
-from werkzeug.security import check_password_hash, generate_password_hash
-from helpers import privilege_required, db
+from flask import Flask, Response, flash, g, redirect, render_template, request, session, jsonify, send_file, stream_with_context
+from helpers import privilege_required, invalidate_privileges, match_expression, page_arguments, split_page, render_fragment, fragment_response, db
+from fragments import cached_fragment, cached_page, team_version
+from slowlog import observe_slow_statement, summarize
+from profiling import discard_profile, finish_profile, hottest_frames, load_profiles, merge_profiles, start_profile
+from metrics import finish_request, metrics_allowed, observe_lock, observe_statement, render_metrics, start_request
+from database import DATABASE, DatabaseBusy
+from migrate import check_schema, db_cli
+from assets import assets_cli, serve_asset, url_for as asset_url_for
+from events import EVENT_RETENTION, compact_tombstones, stream_events
+from history import compact_events, latest_change, revert_change, topic_activity
+from archive import ARCHIVE_AFTER, archive_done_notes, board_notes, done_page
+from positions import note_position, rebalance_positions
+from sessions import purge_sessions, revoke_sessions, session_interface
+from compression import CompressionMiddleware
+from passwords import PasswordHashingBusy, RETRY_AFTER, hash_password, verify_password
+from ratelimit import RateLimited, check_rate_limit
 from dotenv import load_dotenv
 from os import getenv
+from time import time
+import click
+import sys
 import re
 import string
 import random
@@ -12,25 +28,250 @@ import random
 app = Flask(__name__)
 load_dotenv()
 
-# Configure session to use filesystem (instead of signed cookies)
+# Configure sessions, stored in SQLite by default or in signed cookies (see sessions.py)
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
 app.secret_key = getenv("SECRET_KEY")
-Session(app)
+app.session_interface = session_interface()
 
 app.jinja_env.add_extension('jinja2.ext.do')
 
+# Compress HTML and JSON responses for clients that accept it
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+
+# Schema migrations are applied with 'flask db upgrade'
+app.cli.add_command(db_cli)
+
+# Fingerprinted static files are built with 'flask assets build' and linked through url_for
+app.cli.add_command(assets_cli)
+app.jinja_env.globals["url_for"] = asset_url_for
+app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+
+@app.cli.command("recount")
+def recount():
+    """
+    Recompute the denormalized membership and public team counters from scratch
+    """
+
+    with db.transaction():
+        teams_fixed = db.execute("""
+                                 UPDATE teams SET member_count = 
+                                 (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id)
+                                 WHERE member_count != 
+                                 (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id)
+                                 """)
+        users_fixed = db.execute("""
+                                 UPDATE users SET team_count = 
+                                 (SELECT COUNT(*) FROM team_members WHERE team_members.user_id = users.id)
+                                 WHERE team_count != 
+                                 (SELECT COUNT(*) FROM team_members WHERE team_members.user_id = users.id)
+                                 """)
+        db.execute("""
+                   UPDATE counters SET value = (SELECT COUNT(*) FROM teams WHERE access_type = 'public') 
+                   WHERE name = 'public_teams'
+                   """)
+
+    print(f"Fixed member counts of {teams_fixed} teams and team counts of {users_fixed} users")
+
+@app.cli.command("compact-tombstones")
+def compact_tombstones_command():
+    """
+    Remove deleted note tombstones that are older than the retention period
+    """
+
+    print(f"Removed {compact_tombstones()} tombstones")
+
+@app.cli.command("compact-events")
+def compact_events_command():
+    """
+    Fold note events older than the retention period into per-topic snapshots
+    """
+
+    print(f"Compacted {compact_events(EVENT_RETENTION)} events")
+
+@app.cli.command("archive-notes")
+@click.option("--days", type=float, default=ARCHIVE_AFTER / 86400, help="Archive notes done for longer than this.")
+def archive_notes_command(days):
+    """
+    Move notes that have been done for a while out of their boards and into the archive
+    """
+
+    print(f"Archived {archive_done_notes(int(days * 86400))} notes")
+
+@app.cli.command("rebalance-positions")
+def rebalance_positions_command():
+    """
+    Give the board columns whose note position keys have grown long evenly spaced short keys again
+    """
+
+    print(f"Rebalanced {rebalance_positions()} columns")
+
+@app.cli.command("purge-sessions")
+def purge_sessions_command():
+    """
+    Remove expired sessions from the database
+    """
+
+    print(f"Removed {purge_sessions(force=True)} expired sessions")
+
+# Every statement run while handling a request is timed for Server-Timing and /metrics
+db.observers.append(observe_statement)
+
+# Write lock waits, retries and failures are counted for /metrics
+db.lock_observers.append(observe_lock)
+
+# Statements slower than SLOW_QUERY_MS are logged along with their query plan
+db.observers.append(observe_slow_statement)
+
+@app.cli.command("slow-queries")
+@click.option("--limit", default=10, help="Number of statements to show.")
+def slow_queries_command(limit):
+    """
+    Summarize the slow query log by the total time spent in each statement
+    """
+
+    try:
+        summaries = summarize()
+    except FileNotFoundError:
+        print("No slow queries have been logged")
+        return
+
+    for summary in summaries[:limit]:
+        print(f"{summary['total_ms']:.1f} ms total, {summary['count']} calls, "
+              f"{summary['total_ms'] / summary['count']:.1f} ms mean, {summary['max_ms']:.1f} ms max, "
+              f"routes: {', '.join(sorted(summary['routes']))}")
+        print(f"    {summary['sql']}")
+        for line in summary["plan"] or []:
+            print(f"        {line}")
+        print()
+
+@app.cli.command("profiles")
+@click.option("--route", help="Only merge the profiles of this route (endpoint).")
+@click.option("--team", help="Only merge the profiles of this team's pages.")
+@click.option("--minutes", type=float, help="Only merge the profiles of the last this many minutes.")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the merged collapsed stacks to this file.")
+def profiles_command(route, team, minutes, output):
+    """
+    Merge spooled request profiles into collapsed stacks for flame graph tools (flamegraph.pl, speedscope...)
+    """
+
+    profiles = load_profiles(route, team, time() - minutes * 60 if minutes else None)
+    if not profiles:
+        print("No matching profiles have been spooled")
+        return
+
+    lines = merge_profiles(profiles)
+    if output:
+        with open(output, "w") as file:
+            file.write("\n".join(lines) + "\n")
+    else:
+        print("\n".join(lines))
+
+    samples = sum(profile["samples"] for profile in profiles)
+    mean = sum(profile["ms"] for profile in profiles) / len(profiles)
+    print(f"{len(profiles)} profiles, {samples} samples, {mean:.1f} ms mean", file=sys.stderr)
+    for name, share in hottest_frames(profiles):
+        print(f"{share:>6.1%}  {name}", file=sys.stderr)
+
+@app.before_request
+def before_request():
+    """
+    Ensure the database schema is up to date before serving requests, start timing
+    (and, when asked to, profiling) them, and turn away API calls over their rate limit
+    """
+    start_request()
+    start_profile()
+    check_schema(DATABASE)
+    check_rate_limit()
+
 @app.after_request
 def after_request(response):
     """
-    Ensure responses aren't cached
+    Ensure responses aren't cached, unless the route chose its own caching policy
     """
+
+    # Static files and the JSON board API set Cache-Control themselves so browsers can revalidate them
+    if "Cache-Control" in response.headers:
+        return response
+
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Expires"] = 0
     response.headers["Pragma"] = "no-cache"
     return response
 
 
+@app.errorhandler(PasswordHashingBusy)
+def handle_hashing_busy(error):
+    """
+    Turn requests away while password hashing is saturated, so they don't tie up workers
+    """
+
+    response = jsonify({"success": False, 
+                        "error": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = RETRY_AFTER
+    return response
+
+
+@app.errorhandler(RateLimited)
+def handle_rate_limited(error):
+    """
+    Tell clients calling an API faster than its rate limit allows when they can try again
+    """
+
+    response = jsonify({"success": False, 
+                        "error": str(error)})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+@app.errorhandler(DatabaseBusy)
+def handle_database_busy(error):
+    """
+    Ask the client to retry a write that couldn't get the database's write lock, instead of showing an error page
+    """
+
+    response = jsonify({"success": False, 
+                        "error": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+@app.after_request
+def record_metrics(response):
+    """
+    Record the request's timings and report them in a Server-Timing header
+    """
+
+    return finish_request(response)
+
+
+@app.after_request
+def record_profile(response):
+    """
+    Write the request's profile to the spool directory if it was profiled, while its timings are still around
+    """
+
+    return finish_profile(response)
+
+
+# Requests that fail before producing a response still stop being profiled
+app.teardown_request(discard_profile)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Expose every worker's request and query metrics in Prometheus' text format
+    """
+
+    if not metrics_allowed():
+        return Response("Forbidden\n", status=403, mimetype="text/plain")
+
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 # Pretty much copy pasted from 
 # https://stackoverflow.com/questions/29332056/global-error-handler-for-any-exception
 @app.errorhandler(Exception)
@@ -94,10 +335,15 @@ def login_api():
     rows = db.execute("SELECT * FROM users WHERE username = ?", username)
 
     # Ensure username exists and password is correct
-    if len(rows) != 1 or not check_password_hash(rows[0]["hash"], password):
+    valid, new_hash = verify_password(rows[0]["hash"], password) if len(rows) == 1 else (False, None)
+    if not valid:
         return jsonify({"success": False, 
                         "error": "Invalid username and/or password!"})
 
+    # Replace hashes made with an older or weaker method now that the password is known
+    if new_hash:
+        db.execute("UPDATE users SET hash = ? WHERE id = ?", new_hash, rows[0]["id"])
+
     # Remember which user has logged in
     session["user_id"] = rows[0]["id"]
     session["username"] = rows[0]["username"]
@@ -180,7 +426,7 @@ def register_api():
                         "error": "Passwords don't match!"})
 
     # Create user account
-    user_id = db.execute("INSERT INTO users (username, hash) VALUES (?, ?)", username, generate_password_hash(password))
+    user_id = db.execute("INSERT INTO users (username, hash) VALUES (?, ?)", username, hash_password(password))
 
     if user_id:
         # Log in the new user
@@ -220,7 +466,7 @@ def account_api():
     
     # Validate current password
     rows = db.execute("SELECT * FROM users WHERE id = ?", user_id)
-    if len(rows) != 1 or not check_password_hash(rows[0]["hash"], current_password):
+    if len(rows) != 1 or not verify_password(rows[0]["hash"], current_password)[0]:
         return jsonify({"success": False, 
                         "error": "Your current password is incorrect, please try again!"})
     
@@ -287,8 +533,11 @@ def account_api():
         success = session["username"] = new_username
     
     if new_password and new_password.strip() and password_valid:
-        new_hash = generate_password_hash(new_password)
+        new_hash = hash_password(new_password)
         db.execute("UPDATE users SET hash = ? WHERE id = ?", new_hash, user_id)
+
+        # Log out every other session of the user
+        revoke_sessions(user_id, session)
     
     flash("Successfully updated your account!")
     return jsonify({"success": True})
@@ -327,30 +576,62 @@ def explore():
     # Check if user has searched a specific name
     search_query = request.args.get("search", "").strip()
 
+    # Teams are paginated by name, starting after the last name of the previous page
+    after, limit = page_arguments()
+
+    # Search results are ranked by relevance (bm25, names weighted over descriptions) then name,
+    # the cursor's rank is recomputed from its name so the cursor stays a plain team name
     if search_query:
+        match = match_expression(search_query)
         teams = db.execute("""
-                            SELECT id, name, description, access_type, code,
-                            (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
-                            FROM teams
-                            WHERE teams.id NOT IN 
+                            SELECT teams.id, teams.name, teams.description, teams.access_type, teams.code, teams.member_count, teams.version
+                            FROM teams_search
+                            JOIN teams ON teams.id = teams_search.rowid
+                            WHERE teams_search MATCH ?
+                            AND teams.id NOT IN 
                             (SELECT team_id FROM team_members WHERE user_id = ?)
-                            AND access_type != 'private'
-                            AND teams.name LIKE ?
-                            ORDER BY teams.name ASC
-                            """, session["user_id"], f"%{search_query}%")
+                            AND teams.access_type = 'public'
+                            AND (bm25(teams_search, 10.0, 1.0), teams.name) > (
+                                COALESCE((SELECT bm25(teams_search, 10.0, 1.0) FROM teams_search
+                                          WHERE teams_search MATCH ?
+                                          AND rowid = (SELECT id FROM teams WHERE name = ?)), -1e308), ?)
+                            ORDER BY bm25(teams_search, 10.0, 1.0), teams.name ASC
+                            LIMIT ?
+                            """, match, session["user_id"], match, after, after, limit + 1)
+
+        # Search result totals aren't precomputed, so the page count is left open
+        total = None
 
     else:
         teams = db.execute("""
-                            SELECT id, name, description, access_type, code,
-                            (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
+                            SELECT id, name, description, access_type, code, member_count, version
                             FROM teams
                             WHERE teams.id NOT IN 
                             (SELECT team_id FROM team_members WHERE user_id = ?)
-                            AND access_type != 'private'
+                            AND access_type = 'public'
+                            AND teams.name > ?
                             ORDER BY teams.name ASC
-                            """, session["user_id"])
+                            LIMIT ?
+                            """, session["user_id"], after, limit + 1)
+
+        # Public teams minus the ones the user is already in, which is at most 20 rows
+        total = db.execute("""
+                           SELECT (SELECT value FROM counters WHERE name = 'public_teams') -
+                           (SELECT COUNT(*) FROM team_members 
+                            JOIN teams ON team_members.team_id = teams.id
+                            WHERE team_members.user_id = ? AND teams.access_type = 'public') AS total
+                           """, session["user_id"])[0]["total"]
+
+    teams, next_cursor = split_page(teams, limit, "name")
+
+    # Each team's card is rendered once per team version, which membership and team edits bump
+    cards = [cached_fragment(("explore_card", team["id"], team["version"]), "explore_card.html", team=team)
+             for team in teams]
+
+    if request.args.get("partial"):
+        return render_fragment("explore_cards.html", next_cursor, cards=cards)
         
-    return render_template("explore.html", teams=teams)
+    return render_template("explore.html", cards=cards, next_cursor=next_cursor, total=total, limit=limit)
 
 @app.route("/join_team_api", methods=["POST"])
 @privilege_required("login", "json")
@@ -373,7 +654,7 @@ def join_team_api():
             return jsonify({"success": False, 
                             "error": "You are already a member of this team!"})
 
-        membership_count = db.execute("SELECT COUNT(user_id) FROM team_members WHERE user_id = ?", session["user_id"])[0]["COUNT(user_id)"]
+        membership_count = db.execute("SELECT team_count FROM users WHERE id = ?", session["user_id"])[0]["team_count"]
         if membership_count >= 20:
             return jsonify({"success": False, 
                             "error": "To join a team, you must leave another! Team membership is limited to 20 teams!"})
@@ -394,39 +675,53 @@ def join_team_api():
     return jsonify({"success": False, "error": "Invalid team ID, please try again!"})
 
 
-@app.route("/teams", methods=["GET"])
-@privilege_required("login", "html")
-def teams():
+def render_teams_page(method=None):
     """
-    View all teams user is a member of
+    Render a page of the teams the user is a member of, shared by the teams, create team and join team pages
     """
     
     # Check if user has searched a specific name
     search_query = request.args.get("search", "").strip()
 
-    # If they have find teams with that name
-    if search_query:
-        teams = db.execute("""
-                            SELECT teams.id, teams.name, teams.description, teams.code, teams.access_type, team_members.privilege,
-                                (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
-                            FROM teams
-                            JOIN team_members ON teams.id = team_members.team_id
-                            WHERE team_members.user_id = ?
-                            AND teams.name LIKE ?
-                            ORDER BY team_members.privilege, teams.name ASC
-                            """, session["user_id"], f"%{search_query}%")
-        
-    else:
-        teams = db.execute("""
-                            SELECT teams.id, teams.name, teams.description, teams.code, teams.access_type, team_members.privilege,
-                                (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
-                            FROM teams
-                            JOIN team_members ON teams.id = team_members.team_id
-                            WHERE team_members.user_id = ?
-                            ORDER BY team_members.privilege, teams.name ASC
-                            """, session["user_id"])
+    # Teams are paginated by (privilege, name), the cursor's privilege is looked up from its name
+    after, limit = page_arguments()
+
+    # Searches are matched against the full-text index, only the user's own teams are then kept
+    teams = db.execute("""
+                        SELECT teams.id, teams.name, teams.description, teams.code, teams.access_type, team_members.privilege,
+                            teams.member_count
+                        FROM teams
+                        JOIN team_members ON teams.id = team_members.team_id
+                        WHERE team_members.user_id = ?
+                        AND (? = '' OR teams.id IN (SELECT rowid FROM teams_search WHERE teams_search MATCH ?))
+                        AND (team_members.privilege, teams.name) > (
+                            COALESCE((SELECT privilege FROM team_members
+                                      JOIN teams ON team_members.team_id = teams.id
+                                      WHERE teams.name = ? AND team_members.user_id = ?), ''), ?)
+                        ORDER BY team_members.privilege, teams.name ASC
+                        LIMIT ?
+                        """, session["user_id"], search_query, match_expression(search_query), after, session["user_id"], after, limit + 1)
+
+    teams, next_cursor = split_page(teams, limit, "name")
+
+    if request.args.get("partial"):
+        return render_fragment("teams_cards.html", next_cursor, teams=teams)
+
+    total = None
+    if not search_query:
+        total = db.execute("SELECT team_count FROM users WHERE id = ?", session["user_id"])[0]["team_count"]
+
+    return render_template("teams.html", teams=teams, next_cursor=next_cursor, total=total, limit=limit, method=method)
+
+
+@app.route("/teams", methods=["GET"])
+@privilege_required("login", "html")
+def teams():
+    """
+    View all teams user is a member of
+    """
 
-    return render_template("teams.html", teams=teams)
+    return render_teams_page()
 
 
 @app.route("/create_team", methods=["GET"])
@@ -436,16 +731,7 @@ def create_team():
     Show the teams page with the create team form open
     """
     
-    teams = db.execute("""
-                        SELECT teams.id, teams.name, teams.description, teams.code, teams.access_type, team_members.privilege,
-                            (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
-                        FROM teams
-                        JOIN team_members ON teams.id = team_members.team_id
-                        WHERE team_members.user_id = ?
-                        ORDER BY team_members.privilege
-                        """, session["user_id"])
-    
-    return render_template("teams.html", teams=teams, method="get_create_team")
+    return render_teams_page(method="get_create_team")
 
 @app.route("/create_team_api", methods=["POST"])
 @privilege_required("login", "json")
@@ -461,7 +747,7 @@ def create_team_api():
     team_description = data.get("team_description")
     team_access_type = data.get("team_access_type")
 
-    membership_count = db.execute("SELECT COUNT(user_id) FROM team_members WHERE user_id = ?", session["user_id"])[0]["COUNT(user_id)"]
+    membership_count = db.execute("SELECT team_count FROM users WHERE id = ?", session["user_id"])[0]["team_count"]
     if membership_count >= 20:
         return jsonify({"success": False, 
                         "error": "To create a team, you must leave another team! Team membership is limited to 20 teams!"})
@@ -534,17 +820,7 @@ def join_team():
     Show the teams page with the join code modal already opened
     """
 
-    teams = db.execute("""
-                        SELECT teams.id, teams.name, teams.description, teams.code, teams.access_type, team_members.privilege,
-                            (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
-                        FROM teams
-                        JOIN team_members ON teams.id = team_members.team_id
-                        WHERE team_members.user_id = ?
-                        GROUP BY teams.id
-                        ORDER BY team_members.privilege
-                        """, session["user_id"])
-    
-    return render_template("teams.html", teams=teams, method="get_join_team")
+    return render_teams_page(method="get_join_team")
 
 @app.route("/join_with_credentials_api", methods=["POST"])
 @privilege_required("login", "json")
@@ -558,7 +834,7 @@ def join_with_credentials_api():
     team_name = data.get("team_name")
     team_code = data.get("team_code")
 
-    membership_count = db.execute("SELECT COUNT(user_id) FROM team_members WHERE user_id = ?", session["user_id"])[0]["COUNT(user_id)"]
+    membership_count = db.execute("SELECT team_count FROM users WHERE id = ?", session["user_id"])[0]["team_count"]
     if membership_count >= 20:
         return jsonify({"success": False, 
                         "error": "To join a team, you must leave another! Team membership is limited to 20 teams!"})
@@ -602,18 +878,10 @@ def leave_team_api(team_name):
     Allow users to leave a team
     """
     
-    data = request.get_json()
-    team_id = data.get("team_id")
-    privilege = db.execute("SELECT privilege FROM team_members WHERE user_id = ? AND team_id = ?", session["user_id"], team_id)[0]["privilege"]
-
-    team_info = db.execute("""
-                            SELECT COUNT(team_members.team_id), teams.name 
-                            FROM team_members 
-                            JOIN teams ON team_members.team_id = teams.id 
-                            WHERE team_members.team_id = ?
-                            """, team_id)[0]
-    
-    member_count = team_info["COUNT(team_members.team_id)"]
+    team_id = g.team_id
+    privilege = g.privilege
+
+    member_count = db.execute("SELECT member_count FROM teams WHERE id = ?", team_id)[0]["member_count"]
 
     # If the user is an admin, check if they are able to leave the team
     if privilege == "admin":
@@ -627,6 +895,7 @@ def leave_team_api(team_name):
                             "error": "Admins cannot leave the team if they are the last admin! Please delete the team, or pass on admin privileges instead!", "name": team_name})
 
     success = db.execute("DELETE FROM team_members WHERE team_id = ? AND user_id = ?", team_id, session["user_id"])
+    invalidate_privileges(team_id, session["user_id"])
     
     if success:
         flash(f"Successfully left {team_name}")
@@ -643,15 +912,34 @@ def team_page(team_name):
     View a team's page
     """
     
-    topics = db.execute("""
-                        SELECT topics.id, topics.name, teams.name AS team_name
-                        FROM topics 
-                        JOIN teams ON topics.team_id = teams.id
-                        WHERE teams.name = ?
-                        ORDER BY topics.name
-                        """, team_name)
-
-    return render_template("team_page.html", topics=topics, team_name=team_name)
+    # Topics are paginated by name, which is unique within a team
+    after, limit = page_arguments()
+
+    def load():
+        topics = db.execute("""
+                            SELECT id, name, ? AS team_name
+                            FROM topics 
+                            WHERE team_id = ?
+                            AND name > ?
+                            ORDER BY name
+                            LIMIT ?
+                            """, team_name, g.team_id, after, limit + 1)
+
+        topics, next_cursor = split_page(topics, limit, "name")
+
+        # Teams have at most 20 topics, so this only reads a few index entries
+        total = db.execute("SELECT COUNT(*) AS total FROM topics WHERE team_id = ?", g.team_id)[0]["total"]
+
+        return {"topics": topics}, next_cursor, total
+
+    # Rendered pages are cached under the team's version, which topic and team writes bump
+    key = ("topic_cards", g.team_id, team_version(g.team_id), after, limit)
+    topics_html, next_cursor, total = cached_page(key, "topic_cards.html", load)
+
+    if request.args.get("partial"):
+        return fragment_response(topics_html, next_cursor)
+
+    return render_template("team_page.html", topics_html=topics_html, team_name=team_name, next_cursor=next_cursor, total=total, limit=limit)
     
 """
 Logic and route block end regarding team viewing, team creation, team leaving.
@@ -670,28 +958,40 @@ def manage_team(team_name):
     Allow user to manage teams that they are an admin in
     """
 
-    search_query = request.args.get("search", "")
+    search_query = request.args.get("search", "").strip()
 
     team = db.execute("""
-                      SELECT *,
-                        (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
+                      SELECT *
                       FROM teams 
-                      WHERE name = ?
-                      """, team_name)[0]
+                      WHERE id = ?
+                      """, g.team_id)[0]
     
+    # Members are paginated by username, the admin viewing the page is never listed
+    after, limit = page_arguments()
+
     members = db.execute("""
                         SELECT users.username, team_members.user_id, team_members.privilege
                         FROM team_members 
                         JOIN users ON team_members.user_id = users.id 
                         WHERE team_members.team_id = ? 
-                        AND users.username LIKE ?
+                        AND team_members.user_id != ?
+                        AND (? = '' OR users.id IN (SELECT rowid FROM users_search WHERE users_search MATCH ?))
+                        AND users.username > ?
                         ORDER BY users.username ASC
-                        """, team["id"], f"%{search_query}%")
+                        LIMIT ?
+                        """, team["id"], session["user_id"], search_query, match_expression(search_query), after, limit + 1)
+
+    members, next_cursor = split_page(members, limit, "username")
+
+    if request.args.get("partial"):
+        return render_fragment("member_list.html", next_cursor, members=members)
+
+    total = None if search_query else team["member_count"] - 1
 
     if "search" in request.args:
-        return render_template("manage_team.html", team=team, current_user=session["user_id"], members=members, method="get_search_members")
+        return render_template("manage_team.html", team=team, members=members, next_cursor=next_cursor, total=total, limit=limit, method="get_search_members")
     else:
-        return render_template("manage_team.html", team=team, current_user=session["user_id"], members=members)
+        return render_template("manage_team.html", team=team, members=members, next_cursor=next_cursor, total=total, limit=limit)
 
 @app.route("/manage_team_api/<string:team_name>", methods=["POST"])
 @privilege_required("admin", "json")
@@ -704,7 +1004,7 @@ def manage_team_api(team_name):
     # however requested team data is of higher priority
     data = request.get_json()
 
-    team_id = db.execute("SELECT id FROM teams WHERE name = ?", team_name)[0]["id"]
+    team_id = g.team_id
 
     current_data = db.execute("SELECT * FROM teams WHERE id = ?", team_id)[0]
 
@@ -751,6 +1051,7 @@ def manage_team_api(team_name):
     
     # If all is well create the new team and add the user as admin
     success = db.execute("UPDATE teams SET name = ?, code = ?, description = ?, access_type = ? WHERE id = ?", team_name, team_code, team_description, team_access_type, team_id)
+    invalidate_privileges(team_id)
     
     if success:
         flash("Successfully updated team!")
@@ -773,7 +1074,7 @@ def manage_member_api(team_name):
     member_id = data.get("member_id")
     new_privilege = data.get("privilege")
     
-    team_id = db.execute("SELECT id FROM teams WHERE name = ?", team_name)[0]["id"]
+    team_id = g.team_id
     
     # Check if the privilege was given and is valid
     if not new_privilege:
@@ -805,6 +1106,7 @@ def manage_member_api(team_name):
     # Validate and update member privilege
     if new_privilege == "kick":
         success = db.execute("DELETE FROM team_members WHERE team_id = ? AND user_id = ?", team_id, member_id)
+        invalidate_privileges(team_id, int(member_id))
         if success:
             flash(f"Successfully kicked {member_name} from team!")
             return jsonify({"success": True})
@@ -813,6 +1115,7 @@ def manage_member_api(team_name):
                         "error": "An error occurred, please try again!"})
 
     success = db.execute("UPDATE team_members SET privilege = ? WHERE team_id = ? AND user_id = ?", new_privilege, team_id, member_id)
+    invalidate_privileges(team_id, int(member_id))
     if success:
         flash(f"Successfully updated {member_name}'s privilege to {new_privilege}!")
         return jsonify({"success": True})
@@ -830,11 +1133,11 @@ def delete_team_api(team_name):
         return jsonify({"success": False, "error": 
                         "No team name provided!"})
         
-    team_id = db.execute("SELECT id FROM teams WHERE name = ?", team_name)[0]["id"]
+    team_id = g.team_id
 
-    exists = db.execute("SELECT id FROM teams WHERE id = ?", team_id)
-    if exists:
+    if team_id:
         success = db.execute("DELETE FROM teams WHERE id = ?", team_id)
+        invalidate_privileges(team_id)
         if success:
             flash(f"Successfully deleted {team_name}!")
             return jsonify({"success": True})
@@ -853,30 +1156,48 @@ def edit_team(team_name):
     Show the edit team page
     """
     
-    search_query = request.args.get("search", "")
+    search_query = request.args.get("search", "").strip()
 
     team = db.execute("""
-                    SELECT teams.name, teams.description, teams.code, teams.access_type, team_members.privilege,
-                    (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id) AS member_count
+                    SELECT name, description, code, access_type, ? AS privilege, member_count
                     FROM teams 
-                    JOIN team_members ON teams.id = team_members.team_id
-                    WHERE name = ?
-                    """, team_name)[0]
+                    WHERE id = ?
+                    """, g.privilege, g.team_id)[0]
     
-    topics = db.execute("""
-                        SELECT topics.id, topics.name 
-                        FROM topics 
-                        JOIN teams ON topics.team_id = teams.id
-                        WHERE teams.name = ?
-                        AND topics.name LIKE ?
-                        ORDER BY topics.name
-                        """, team_name, f"%{search_query}%")
+    # Topics are paginated by name, which is unique within a team
+    after, limit = page_arguments()
+
+    def load():
+        topics = db.execute("""
+                            SELECT id, name 
+                            FROM topics 
+                            WHERE team_id = ?
+                            AND (? = '' OR id IN (SELECT rowid FROM topics_search WHERE topics_search MATCH ?))
+                            AND name > ?
+                            ORDER BY name
+                            LIMIT ?
+                            """, g.team_id, search_query, match_expression(search_query), after, limit + 1)
+
+        topics, next_cursor = split_page(topics, limit, "name")
+
+        # Teams have at most 20 topics, so this only reads a few index entries
+        total = None
+        if not search_query:
+            total = db.execute("SELECT COUNT(*) AS total FROM topics WHERE team_id = ?", g.team_id)[0]["total"]
 
+        return {"topics": topics}, next_cursor, total
+
+    # Rendered pages are cached under the team's version, which topic and team writes bump
+    key = ("topic_list", g.team_id, team_version(g.team_id), search_query, after, limit)
+    topics_html, next_cursor, total = cached_page(key, "topic_list.html", load)
+
+    if request.args.get("partial"):
+        return fragment_response(topics_html, next_cursor)
 
     if "search" in request.args:
-        return render_template("edit_team.html", topics=topics, team=team, method="get_search_topics")
+        return render_template("edit_team.html", topics_html=topics_html, team=team, next_cursor=next_cursor, total=total, limit=limit, method="get_search_topics")
     else:
-        return render_template("edit_team.html", topics=topics, team=team)
+        return render_template("edit_team.html", topics_html=topics_html, team=team, next_cursor=next_cursor, total=total, limit=limit)
 
 @app.route("/create_topic_api/<string:team_name>", methods=["POST"])
 @privilege_required("editor", "json")
@@ -904,7 +1225,7 @@ def create_topic_api(team_name):
         return jsonify({"success": False, 
                         "error": f"Topic name is {name_length} characters, minimum is 7 characters!"})
 
-    team_id = db.execute("SELECT id FROM teams WHERE name = ?", team_name)[0]["id"]
+    team_id = g.team_id
 
     # Check the topic count doesn't exceed limit
     topic_count = db.execute("SELECT COUNT(id) FROM topics WHERE team_id = ?", team_id)[0]["COUNT(id)"]
@@ -912,6 +1233,12 @@ def create_topic_api(team_name):
         return jsonify({"success": False, 
                         "error": "To create a topic, you must delete another topic! Topic count is limited to 20 topics!"})
 
+    # Check if the topic name is already taken in this team
+    is_taken = db.execute("SELECT 1 FROM topics WHERE team_id = ? AND name = ?", team_id, topic_name)
+    if is_taken:
+        return jsonify({"success": False, 
+                        "error": "A topic with this name already exists!"})
+
     # Create the new topic
     success = db.execute("INSERT INTO topics (name, team_id) VALUES (?, ?)", topic_name, team_id)
     if success:
@@ -935,7 +1262,7 @@ def edit_topic_api(team_name, topic_name):
         return jsonify({"success": False,
                         "error": "Please provide a new name!"})
 
-    team_id = db.execute("SELECT id FROM teams WHERE name = ?", team_name)[0]["id"]
+    team_id = g.team_id
     topic_data = db.execute("SELECT id FROM topics WHERE name = ? AND team_id = ?", topic_name, team_id)[0]
    
     # Check if the topic exists
@@ -963,6 +1290,13 @@ def edit_topic_api(team_name, topic_name):
         return jsonify({"success": False,
                         "error": f"Team name contains {name_length} characters, must be at least 7 characters!"})
 
+    # Check if the new name is already taken in this team
+    if requested_name != topic_name:
+        is_taken = db.execute("SELECT 1 FROM topics WHERE team_id = ? AND name = ?", team_id, requested_name)
+        if is_taken:
+            return jsonify({"success": False,
+                            "error": "A topic with this name already exists!"})
+
     # Update the topic name
     success = db.execute("UPDATE topics SET name = ? WHERE id = ?", requested_name, topic_data["id"])
     if success:
@@ -992,131 +1326,428 @@ def board(team_name, topic_name):
     info = {"team_name": team_name, 
             "topic_name": topic_name}
     
-    privilege = db.execute("""
-                                SELECT privilege FROM team_members
-                                JOIN teams ON team_members.team_id = teams.id
-                                WHERE team_members.user_id = ?
-                                AND teams.name = ?
-                                """, session["user_id"], team_name)[0]["privilege"]
-    
-    cards = db.execute("""
-                        SELECT notes.id, notes.content, notes.status, notes.topic_id
-                        FROM notes
-                        JOIN topics ON notes.topic_id = topics.id
-                        JOIN teams ON topics.team_id = teams.id
-                        WHERE teams.name = ?
-                        AND topics.name = ?
-                        """, team_name, topic_name)
-    
-    return render_template("board.html", cards=cards, privilege=privilege, info=info)
+    privilege = g.privilege
 
+    # Only the live columns and the latest done notes are loaded, older ones are in the archive view
+    topic_id = note_topic_id(topic_name)
+    cards, older_done = board_notes(topic_id) if topic_id is not None else ([], False)
 
-@app.route("/create_note_api/<string:team_name>/<string:topic_name>", methods=["POST"])
-@privilege_required("editor", "json")
-def create_note_api(team_name, topic_name):
+    return render_template("board.html", cards=cards, older_done=older_done, privilege=privilege, info=info)
+
+
+@app.route("/team/<string:team_name>/topic/<string:topic_name>/archive", methods=["GET"])
+@privilege_required("member", "html")
+def board_archive(team_name, topic_name):
     """
-    Create a new note for a specific topic in a team
+    Show a topic's done notes newest first, including archived ones, a page at a time
     """
-    
-    data = request.get_json()
-    content = data.get("content")
-    status = data.get("status")
 
-    # Check if the content exists
-    if not content:
-        return jsonify({"success": False, 
-                        "error": "Please provide note content!"})
+    # Pages are keyed by when and which note was done, see done_page
+    after, limit = page_arguments(default_limit=20)
 
-    team_id = db.execute("SELECT id FROM teams WHERE name = ?", team_name)[0]["id"]
+    topic_id = note_topic_id(topic_name)
+    notes, next_cursor = done_page(topic_id, after, limit) if topic_id is not None else ([], "")
 
-    topic_id = db.execute("SELECT id FROM topics WHERE name = ? AND team_id = ?", topic_name, team_id)
+    if request.args.get("partial"):
+        return render_fragment("archive_cards.html", next_cursor, notes=notes)
 
-    # Check if the topic exists
-    if topic_id:
-        topic_id = topic_id[0]["id"]
+    return render_template("archive.html", notes=notes, team_name=team_name, topic_name=topic_name,
+                           next_cursor=next_cursor, limit=limit)
+
+
+@app.route("/team/<string:team_name>/topic/<string:topic_name>/events", methods=["GET"])
+@privilege_required("member", "json")
+def board_events(team_name, topic_name):
+    """
+    Stream note changes of a topic to the board as Server-Sent Events
+    """
+
+    topic = db.execute("SELECT id FROM topics WHERE team_id = ? AND name = ?", g.team_id, topic_name)
+    if not topic:
+        return jsonify({"success": False,
+                        "error": "Topic does not exist!"})
+
+    # Browsers send the last event they saw when reconnecting, so nothing is missed in between
+    last_event_id = request.headers.get("Last-Event-ID", "")
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+
+    return Response(stream_with_context(stream_events(topic[0]["id"], last_event_id)),
+                    mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no"})
+
+
+@app.route("/api/team/<string:team_name>/topic/<string:topic_name>/notes", methods=["GET"])
+@privilege_required("member", "json")
+def board_notes_api(team_name, topic_name):
+    """
+    Return a topic's notes as JSON, with an ETag so unchanged boards can be revalidated for free
+    """
+
+    topic = db.execute("SELECT id, version FROM topics WHERE team_id = ? AND name = ?", g.team_id, topic_name)
+    if not topic:
+        return jsonify({"success": False,
+                        "error": "Topic does not exist!"})
+
+    # The version is bumped by every note write, so it changes whenever the notes do
+    topic_id, version = topic[0]["id"], topic[0]["version"]
+    etag = f"{topic_id}.{version}"
+
+    # Clients that already have this version get an empty 304 without the notes being queried,
+    # compressed responses weaken the ETag so it is compared weakly
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
     else:
+        notes, older_done = board_notes(topic_id)
+        response = jsonify({"success": True,
+                            "version": version,
+                            "notes": [{"id": note["id"], "content": note["content"], "status": note["status"],
+                                       "position": note["position"]}
+                                      for note in notes],
+                            "older_done": older_done})
+
+    # Let the browser revalidate, but never cache a member's board in shared caches
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@app.route("/api/team/<string:team_name>/topic/<string:topic_name>/changes", methods=["GET"])
+@privilege_required("member", "json")
+def board_changes_api(team_name, topic_name):
+    """
+    Return the notes created, changed or deleted since the given topic version
+    """
+
+    since = request.args.get("since", "")
+    if not since.isdigit():
+        return jsonify({"success": False,
+                        "error": "Please provide the version to sync from!"})
+    since = int(since)
+
+    topic = db.execute("SELECT id, version, compacted_version FROM topics WHERE team_id = ? AND name = ?", g.team_id, topic_name)
+    if not topic:
         return jsonify({"success": False,
                         "error": "Topic does not exist!"})
+    topic = topic[0]
 
-    # Add the note to the database
-    db.execute("INSERT INTO notes (content, status, topic_id) VALUES (?, ?, ?)", content, status, topic_id)
+    # Tombstones older than compacted_version are gone, so such clients have to reload all notes
+    if since < topic["compacted_version"]:
+        return jsonify({"success": True,
+                        "reset": True,
+                        "version": topic["version"]})
 
-    flash("Successfully created new note!")
-    return jsonify({"success": True})
+    notes = db.execute("""
+                       SELECT id, content, status, position, deleted, version
+                       FROM notes
+                       WHERE topic_id = ? AND version > ?
+                       ORDER BY version
+                       """, topic["id"], since)
 
+    changes = []
+    for note in notes:
+        if note["deleted"]:
+            changes.append({"id": note["id"], "deleted": True, "version": note["version"]})
+        else:
+            changes.append({"id": note["id"], "content": note["content"], "status": note["status"],
+                            "position": note["position"], "version": note["version"]})
 
-@app.route("/edit_note_api/<string:team_name>/<string:topic_name>", methods=["POST"])
+    return jsonify({"success": True,
+                    "reset": False,
+                    "version": topic["version"],
+                    "changes": changes})
+
+
+# Columns a note can be placed in, moving a note to "delete" deletes it instead
+NOTE_STATUSES = ["announcements", "todo", "doing", "done"]
+NOTE_MAX_LENGTH = 500
+
+# Upper bound on the operations a single batch request may apply
+MAX_BATCH_OPERATIONS = 100
+
+
+class BatchAborted(Exception):
+    """
+    Raised inside a batch's transaction to roll back every operation once one of them fails
+    """
+
+
+def note_topic_id(topic_name):
+    """
+    Return the id of a topic in the current team, or None if it does not exist
+    """
+
+    topic = db.execute("SELECT id FROM topics WHERE name = ? AND team_id = ?", topic_name, g.team_id)
+    return topic[0]["id"] if topic else None
+
+
+def apply_note_operation(operation, topic_id):
+    """
+    Validate a single create, edit, move or delete operation against the current user's
+    privilege and apply it to a topic's notes, returning the result as a dict
+    """
+
+    action = operation.get("action")
+    note_id = operation.get("note_id")
+    content = operation.get("content")
+    status = operation.get("status")
+    after_id = operation.get("after_id")
+    authorized = g.privilege in ["editor", "admin"]
+
+    if action not in ["create", "edit", "move", "delete"]:
+        return {"success": False, 
+                "error": "Invalid note action!"}
+
+    # Creating and editing notes requires editor privileges
+    if action in ["create", "edit"] and not authorized:
+        return {"success": False, 
+                "error": "You do not have authorization for this action!"}
+
+    if action == "create":
+
+        # Check if the content exists
+        if not content:
+            return {"success": False, 
+                    "error": "Please provide note content!"}
+    else:
+
+        # Check if the note exists in this topic
+        note_valid = db.execute("SELECT 1 FROM notes WHERE id = ? AND topic_id = ? AND deleted = 0", note_id, topic_id)
+        if not note_valid:
+            return {"success": False,
+                    "error": "Note does not exist!"}
+
+        # Blank content and the delete column both delete the note
+        if (action == "edit" and not content) or (action == "move" and status == "delete"):
+            action = "delete"
+
+    # Deleting leaves a tombstone for syncing clients
+    if action == "delete":
+        db.execute("UPDATE notes SET deleted = 1, deleted_at = strftime('%s', 'now'), updated_by = ? WHERE id = ?",
+                   session["user_id"], note_id)
+        return {"success": True}
+
+    if action in ["create", "move"]:
+
+        # Check if user is trying mess with announcements while not authorized
+        if not authorized and status == "announcements":
+            return {"success": False,
+                    "error": "You are not authorized for this action!"}
+
+        # Check if the new status is valid
+        if status not in NOTE_STATUSES:
+            return {"success": False, 
+                    "error": "Invalid status!"}
+
+        # Notes go right after after_id, at the top of the column if it is null
+        if after_id is not None and (not isinstance(after_id, int) or isinstance(after_id, bool)):
+            return {"success": False,
+                    "error": "Invalid note position!"}
+
+    if action in ["create", "edit"]:
+
+        # Check length requirement
+        note_length = len(content)
+        if note_length > NOTE_MAX_LENGTH:
+            return {"success": False, 
+                    "error": f"Note content is {note_length} characters, limit is {NOTE_MAX_LENGTH}!"}
+
+    # Apply the change, the board picks it up from the event stream and the history records who made it
+    if action == "edit":
+        db.execute("UPDATE notes SET content = ?, updated_by = ? WHERE id = ?", content, session["user_id"], note_id)
+        return {"success": True}
+
+    # Notes are placed between their new neighbours' keys, so only the note itself is written,
+    # operations without an after_id put the note at the end of its column
+    with db.transaction():
+        position = note_position(topic_id, status, after_id, note_id, end="after_id" not in operation)
+
+        if action == "create":
+            note_id = db.execute("""
+                                 INSERT INTO notes (content, status, topic_id, position, updated_by)
+                                 VALUES (?, ?, ?, ?, ?)
+                                 """, content, status, topic_id, position, session["user_id"])
+            return {"success": True, "note_id": note_id, "position": position}
+
+        db.execute("UPDATE notes SET status = ?, position = ?, updated_by = ? WHERE id = ?",
+                   status, position, session["user_id"], note_id)
+
+    return {"success": True, "position": position}
+
+
+def note_operation_response(operation, topic_name):
+    """
+    Apply a single note operation from one of the per-note APIs and return its JSON response
+    """
+
+    topic_id = note_topic_id(topic_name)
+
+    # Check if the topic exists
+    if topic_id is None:
+        return jsonify({"success": False,
+                        "error": "Topic does not exist!"})
+
+    return jsonify(apply_note_operation(operation, topic_id))
+
+
+@app.route("/create_note_api/<string:team_name>/<string:topic_name>", methods=["POST"])
 @privilege_required("editor", "json")
-def edit_note_api(team_name, topic_name):
+def create_note_api(team_name, topic_name):
     """
-    Edit an existing note for a specific topic in a team
+    Create a new note for a specific topic in a team
     """
     
     data = request.get_json()
-    note_id = data.get("note_id")
-    content = data.get("content")
+    operation = {"action": "create",
+                 "content": data.get("content"),
+                 "status": data.get("status")}
 
-    # Check if the note exists
-    note_valid = db.execute("SELECT 1 FROM notes WHERE id = ?", note_id)
-    if not note_valid:
-        return jsonify({"success": False,
-                        "error": "Note does not exist!"})
+    # Without an after_id the note is added at the end of its column
+    if "after_id" in data:
+        operation["after_id"] = data["after_id"]
 
-    # If content was blank, delete the note
-    if not content:
-        db.execute("DELETE FROM notes WHERE id = ?", note_id)
-        flash("Successfully deleted note!")
-        return jsonify({"success": True})
+    return note_operation_response(operation, topic_name)
 
-    # Check length requirement
-    note_length =  len(content)
-    if note_length > 500:
-        return jsonify({"success": False, 
-                        "error": f"Note content is {note_length} characters, limit is 500!"})
 
-    # If all goes well update the note
-    db.execute("UPDATE notes SET content = ? WHERE id = ?",content, note_id)
-    flash("Successfully edited note!")
-    return jsonify({"success": True})
+@app.route("/edit_note_api/<string:team_name>/<string:topic_name>", methods=["POST"])
+@privilege_required("editor", "json")
+def edit_note_api(team_name, topic_name):
+    """
+    Edit an existing note for a specific topic in a team, deleting it if the content is blank
+    """
+    
+    data = request.get_json()
+    return note_operation_response({"action": "edit",
+                                    "note_id": data.get("note_id"),
+                                    "content": data.get("content")}, topic_name)
 
 
 @app.route("/move_note_api/<string:team_name>/<string:topic_name>", methods=["POST"])
 @privilege_required("member", "json")
 def move_note_api(team_name, topic_name):
     """
-    Change a notes status in a topic
+    Change a notes status in a topic, or its place within its column
     """
     
     data = request.get_json()
-    note_id = data["note_id"]
-    new_status = data["column_id"]
-    is_authorized = data["is_authorized"]
-    
-    # Check if user is trying mess with announcements while not authorized
-    if not is_authorized and new_status == 'announcements':
+    operation = {"action": "move",
+                 "note_id": data.get("note_id"),
+                 "status": data.get("column_id")}
+
+    # The note is dropped right after after_id (at the top for null), or at the end without one
+    if "after_id" in data:
+        operation["after_id"] = data["after_id"]
+
+    return note_operation_response(operation, topic_name)
+
+
+@app.route("/batch_notes_api/<string:team_name>/<string:topic_name>", methods=["POST"])
+@privilege_required("member", "json")
+def batch_notes_api(team_name, topic_name):
+    """
+    Apply a list of note operations to a topic in a single transaction
+    Either every operation is applied or, if any of them fails, none are
+    """
+
+    data = request.get_json()
+    operations = data.get("operations")
+
+    # Check that there is a reasonably sized list of operations
+    if not isinstance(operations, list) or not operations:
         return jsonify({"success": False,
-                        "error": "You are not authorized for this action!"})
+                        "error": "Please provide the note operations!"})
 
-    # Check if the note exists
-    note_valid = db.execute("SELECT 1 FROM notes WHERE id = ?", note_id)
-    if not note_valid:
+    if len(operations) > MAX_BATCH_OPERATIONS:
         return jsonify({"success": False,
-                        "error": "Note does not exist!"})
+                        "error": f"At most {MAX_BATCH_OPERATIONS} note operations can be applied at once!"})
 
-    # Check if the new status is valid
-    if new_status not in ["announcements", "todo", "doing", "done", "delete"]:
-        return jsonify({"success": False, 
-                        "error": "Invalid status!"})
-    
-    # If the new is status is delete, delete the note
-    if new_status == "delete":
-        db.execute("DELETE FROM notes WHERE id = ?", note_id)
-        flash("Successfully deleted note!")
-        return jsonify({"success": True})
+    topic_id = note_topic_id(topic_name)
 
-    # Else, update the notes status
-    db.execute("UPDATE notes SET status = ? WHERE id = ?", new_status, note_id)
-    return jsonify({"success": True})
+    # Check if the topic exists
+    if topic_id is None:
+        return jsonify({"success": False,
+                        "error": "Topic does not exist!"})
+
+    results = []
+    try:
+        with db.transaction():
+            for operation in operations:
+                if isinstance(operation, dict):
+                    result = apply_note_operation(operation, topic_id)
+                else:
+                    result = {"success": False, "error": "Invalid note operation!"}
+
+                results.append(result)
+                if not result["success"]:
+                    raise BatchAborted
+    except BatchAborted:
+        return jsonify({"success": False,
+                        "error": f"Operation {len(results)} failed: {results[-1]['error']}",
+                        "results": results})
+
+    return jsonify({"success": True,
+                    "results": results})
+
+
+
+@app.route("/undo_note_api/<string:team_name>/<string:topic_name>", methods=["POST"])
+@privilege_required("member", "json")
+def undo_note_api(team_name, topic_name):
+    """
+    Undo the current user's latest change to a topic's notes, undoing again redoes it
+    """
+
+    topic_id = note_topic_id(topic_name)
+
+    # Check if the topic exists
+    if topic_id is None:
+        return jsonify({"success": False,
+                        "error": "Topic does not exist!"})
+
+    event = latest_change(topic_id, session["user_id"])
+    if event is None:
+        return jsonify({"success": False,
+                        "error": "There is nothing to undo!"})
+
+    # Undoing is held to the same rules as making the change back by hand
+    authorized = g.privilege in ["editor", "admin"]
+    if not authorized and (event["kind"] == "edited" or event["previous_status"] == "announcements"):
+        return jsonify({"success": False,
+                        "error": "You do not have authorization for this action!"})
+
+    if not revert_change(event, session["user_id"]):
+        return jsonify({"success": False,
+                        "error": "The note has changed since, it can not be undone!"})
+
+    return jsonify({"success": True,
+                    "note_id": event["note_id"],
+                    "undone": event["kind"]})
+
+
+@app.route("/api/team/<string:team_name>/topic/<string:topic_name>/activity", methods=["GET"])
+@privilege_required("member", "json")
+def board_activity_api(team_name, topic_name):
+    """
+    Return a topic's recent note changes newest first, a page at a time
+    """
+
+    # Pages are keyed by event id, see topic_activity
+    after, limit = page_arguments(default_limit=20)
+
+    topic_id = note_topic_id(topic_name)
+    if topic_id is None:
+        return jsonify({"success": False,
+                        "error": "Topic does not exist!"})
+
+    events, next_cursor = topic_activity(topic_id, after, limit)
+
+    return jsonify({"success": True,
+                    "events": [{"id": event["id"], "kind": event["kind"], "note_id": event["note_id"],
+                                "content": event["content"], "status": event["status"],
+                                "previous_content": event["previous_content"],
+                                "previous_status": event["previous_status"],
+                                "username": event["username"], "created_at": event["created_at"]}
+                               for event in events],
+                    "next_cursor": next_cursor})
 
 """
 Logic and route block end regarding board viewing and management.
@@ -0,0 +1,117 @@
+from os import getenv
+from time import time
+
+from helpers import db
+
+
+# Done notes are moved to the archive once they have been done for this many seconds,
+# at most ARCHIVE_BATCH per write transaction so concurrent requests aren't held up
+ARCHIVE_AFTER = int(getenv("NOTES_ARCHIVE_AFTER", 14 * 24 * 3600))
+ARCHIVE_BATCH = 200
+
+# How many of the latest done notes a board shows, older ones are only in its archive view
+BOARD_DONE_NOTES = int(getenv("BOARD_DONE_NOTES", 20))
+
+
+def archive_done_notes(age=ARCHIVE_AFTER, batch=ARCHIVE_BATCH):
+    """
+    Move notes that have been done for longer than age seconds to the archive, in batches
+    The notes are left as tombstones, so open boards and syncing clients see them leave
+    Returns the number of notes archived
+    """
+
+    cutoff = int(time()) - age
+
+    archived = 0
+    while True:
+
+        # Both statements pick the same oldest notes, the transaction keeps them from changing in between,
+        # and archiving is nobody's change to undo
+        with db.transaction():
+            db.execute("""
+                       INSERT INTO archived_notes (note_id, content, topic_id, done_at, archived_at)
+                       SELECT id, content, topic_id, done_at, strftime('%s', 'now')
+                       FROM notes
+                       WHERE status = 'done' AND deleted = 0 AND done_at < ?
+                       ORDER BY done_at, id
+                       LIMIT ?
+                       """, cutoff, batch)
+            count = db.execute("""
+                               UPDATE notes SET deleted = 1, deleted_at = strftime('%s', 'now'), updated_by = NULL
+                               WHERE id IN
+                               (SELECT id FROM notes
+                                WHERE status = 'done' AND deleted = 0 AND done_at < ?
+                                ORDER BY done_at, id
+                                LIMIT ?)
+                               """, cutoff, batch)
+
+        archived += count
+        if count < batch:
+            return archived
+
+
+def board_notes(topic_id, done_limit=BOARD_DONE_NOTES):
+    """
+    Return a topic's notes in its live columns plus its latest done notes, and whether it has older
+    done notes, so loading a board costs as much as its active work rather than its whole history
+    """
+
+    # Each column comes out of the notes_topic_status_position index already in board order
+    notes = db.execute("""
+                       SELECT id, content, status, topic_id, position
+                       FROM notes
+                       WHERE topic_id = ?
+                       AND status IN ('announcements', 'todo', 'doing')
+                       AND deleted = 0
+                       ORDER BY status, position, id
+                       """, topic_id)
+
+    done = db.execute("""
+                      SELECT id, content, status, topic_id, position
+                      FROM notes
+                      WHERE topic_id = ?
+                      AND status = 'done'
+                      AND deleted = 0
+                      ORDER BY done_at DESC, id DESC
+                      LIMIT ?
+                      """, topic_id, done_limit + 1)
+
+    older = len(done) > done_limit or bool(db.execute("SELECT 1 FROM archived_notes WHERE topic_id = ? LIMIT 1",
+                                                      topic_id))
+
+    # The latest done notes are picked by when they were done but shown in their column's order
+    done = sorted(done[:done_limit], key=lambda note: (note["position"], note["id"]))
+
+    return notes + done, older
+
+
+def done_page(topic_id, after, limit):
+    """
+    Return a page of a topic's done notes, archived or not, newest first, and the next page's cursor
+    The cursor is the last note's "done_at.note_id"
+    """
+
+    done_at, _, note_id = after.partition(".")
+    if not (done_at.isdigit() and note_id.isdigit()):
+        done_at, note_id = 2 ** 62, 0
+
+    notes = db.execute("""
+                       SELECT id, content, done_at, date(done_at, 'unixepoch') AS done_date, 0 AS archived
+                       FROM notes
+                       WHERE topic_id = ?
+                       AND status = 'done'
+                       AND deleted = 0
+                       AND (done_at, id) < (?, ?)
+                       UNION ALL
+                       SELECT note_id AS id, content, done_at, date(done_at, 'unixepoch') AS done_date, 1 AS archived
+                       FROM archived_notes
+                       WHERE topic_id = ?
+                       AND (done_at, note_id) < (?, ?)
+                       ORDER BY done_at DESC, id DESC
+                       LIMIT ?
+                       """, topic_id, int(done_at), int(note_id), topic_id, int(done_at), int(note_id), limit + 1)
+
+    if len(notes) > limit:
+        last = notes[limit - 1]
+        return notes[:limit], f"{last['done_at']}.{last['id']}"
+    return notes, ""
@@ -0,0 +1,148 @@
+import click
+import gzip
+import hashlib
+import json
+import mimetypes
+import shutil
+from flask import abort, request, send_from_directory, url_for as flask_url_for
+from flask.cli import AppGroup
+from os import listdir, makedirs, path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+STATIC_DIR = path.join(path.dirname(path.abspath(__file__)), "static")
+
+# Fingerprinted copies and their manifest are written here by 'flask assets build'
+DIST_DIR = path.join(STATIC_DIR, "dist")
+MANIFEST = path.join(DIST_DIR, "manifest.json")
+
+# A file's name only changes with its content, so browsers may keep it forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Precompressed variants are only kept when they save at least this fraction of the size
+MIN_SAVING = 0.1
+
+# Original file name -> fingerprinted file name, loaded once per worker
+manifest = None
+
+
+def fingerprint(filename, content):
+    """
+    Return the file name with a short hash of its content inserted before the extension
+    """
+
+    stem, extension = path.splitext(filename)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+
+
+def build():
+    """
+    Write a fingerprinted copy of every file in static/ with .gz and .br variants,
+    replacing the previous build, and return the new manifest
+    """
+
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    makedirs(DIST_DIR)
+
+    built = {}
+    for filename in sorted(listdir(STATIC_DIR)):
+        source = path.join(STATIC_DIR, filename)
+        if not path.isfile(source):
+            continue
+
+        with open(source, "rb") as file:
+            content = file.read()
+
+        hashed = built[filename] = fingerprint(filename, content)
+        with open(path.join(DIST_DIR, hashed), "wb") as file:
+            file.write(content)
+
+        variants = {".gz": gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+
+        for extension, compressed in variants.items():
+            if len(compressed) <= len(content) * (1 - MIN_SAVING):
+                with open(path.join(DIST_DIR, hashed + extension), "wb") as file:
+                    file.write(compressed)
+
+    with open(MANIFEST, "w") as file:
+        json.dump(built, file, indent=4, sort_keys=True)
+
+    return built
+
+
+def load_manifest():
+    """
+    Return the build's manifest, or an empty one if the assets haven't been built
+    """
+
+    global manifest
+    if manifest is None:
+        try:
+            with open(MANIFEST) as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            manifest = {}
+
+    return manifest
+
+
+def url_for(endpoint, **values):
+    """
+    Flask's url_for, except static files point at their fingerprinted copy when one was built
+    """
+
+    if endpoint == "static":
+        hashed = load_manifest().get(values.get("filename"))
+        if hashed:
+            values["filename"] = hashed
+            return flask_url_for("assets", **values)
+
+    return flask_url_for(endpoint, **values)
+
+
+def serve_asset(filename):
+    """
+    Serve a fingerprinted file, precompressed if the browser accepts it, cached for a year
+    """
+
+    if filename not in load_manifest().values():
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+
+    for candidate, extension in [("br", ".br"), ("gzip", ".gz")]:
+        if candidate in request.accept_encodings and path.isfile(path.join(DIST_DIR, filename + extension)):
+            encoding = candidate
+            filename += extension
+            break
+
+    response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = IMMUTABLE
+    return response
+
+
+assets_cli = AppGroup("assets", help="Build the static assets.")
+
+
+@assets_cli.command("build")
+def build_command():
+    """
+    Fingerprint and precompress the files in static/
+    """
+
+    built = build()
+    for filename, hashed in built.items():
+        click.echo(f"{filename} -> dist/{hashed}")
+
+    if brotli is None:
+        click.echo("brotli is not installed, only .gz variants were written")
@@ -0,0 +1,82 @@
+"""
+Measure bytes saved and CPU spent compressing representative pages at different settings
+
+Run from the repository root with: python -m benchmarks.compression [--repeat N]
+"""
+
+import argparse
+import os
+import tempfile
+from os import path
+from time import process_time
+
+
+PAGES = {"teams": "/teams",
+         "explore": "/explore",
+         "team page": "/team/team1",
+         "board": "/team/team1/topic/Topic One",
+         "notes api": "/api/team/team1/topic/Topic One/notes"}
+
+SETTINGS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("br", 1), ("br", 4), ("br", 11)]
+
+
+def fetch_pages(directory, notes):
+    """
+    Render each page uncompressed for a member of team1, whose board holds the given number of notes
+    """
+
+    # The database path is read when the app is imported
+    os.environ["DATABASE"] = path.join(directory, "bench.db")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from benchmarks.db_layer import seed
+    from migrate import upgrade
+    upgrade(os.environ["DATABASE"])
+    seed(os.environ["DATABASE"], notes_per_topic=notes)
+
+    from app import app
+    from helpers import db
+    user_id = db.execute("SELECT user_id FROM team_members WHERE team_id = 1 LIMIT 1")[0]["user_id"]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+        session["username"] = f"user{user_id}"
+
+    return {name: client.get(url, headers={"Accept-Encoding": "identity"}).data for name, url in PAGES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--notes", type=int, default=300)
+    arguments = parser.parse_args()
+
+    from compression import CompressionMiddleware, brotli
+
+    with tempfile.TemporaryDirectory() as directory:
+        pages = fetch_pages(directory, arguments.notes)
+
+    print(f"{'page':<10} {'setting':<8} {'bytes':>8} {'compressed':>10} {'saved':>6} {'us cpu':>8}")
+    for name, body in pages.items():
+        for encoding, level in SETTINGS:
+            if encoding == "br" and brotli is None:
+                continue
+
+            middleware = CompressionMiddleware(None, gzip_level=level, brotli_quality=level)
+
+            start = process_time()
+            for _ in range(arguments.repeat):
+                compressor = middleware.compressor(encoding)
+                compressed = compressor.compress(body) + compressor.finish()
+            cost = (process_time() - start) * 1e6 / arguments.repeat
+
+            saved = 1 - len(compressed) / len(body)
+            print(f"{name:<10} {f'{encoding}-{level}':<8} {len(body):>8} {len(compressed):>10} {saved:>6.0%} {cost:>8.0f}")
+
+    if brotli is None:
+        print("brotli is not installed, only gzip was measured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Microbenchmark comparing cs50's SQL with the in-house sqlite3 layer in database.py
+
+Run from the repository root with: python -m benchmarks.db_layer [--iterations N] [--threads N]
+"""
+
+import argparse
+import logging
+import random
+import sqlite3
+import tempfile
+import threading
+from os import path
+from time import perf_counter
+
+from database import SQL
+from migrate import upgrade
+
+
+# Representative statements taken from helpers.py and app.py
+PRIVILEGE_QUERY = """
+                  SELECT teams.id AS team_id, team_members.privilege
+                  FROM users
+                  LEFT JOIN teams ON teams.name = ?
+                  LEFT JOIN team_members ON team_members.team_id = teams.id
+                    AND team_members.user_id = users.id
+                  WHERE users.id = ?
+                  """
+
+BOARD_QUERY = """
+              SELECT notes.id, notes.content, notes.status, notes.topic_id
+              FROM notes
+              JOIN topics ON notes.topic_id = topics.id
+              WHERE topics.team_id = ?
+              AND topics.name = ?
+              """
+
+
+def seed(database, users=500, teams=100, notes_per_topic=50):
+    """
+    Fill a freshly migrated database with a small but realistic data set
+    """
+
+    connection = sqlite3.connect(database)
+    connection.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, 'x')",
+                           [(i, f"user{i}") for i in range(1, users + 1)])
+    connection.executemany("INSERT INTO teams (id, name, code, description, access_type) VALUES (?, ?, 'CODE123', '', 'public')",
+                           [(i, f"team{i}") for i in range(1, teams + 1)])
+    connection.executemany("INSERT INTO team_members (team_id, user_id, privilege) VALUES (?, ?, 'editor')",
+                           [(team, user) for user in range(1, users + 1)
+                            for team in random.Random(user).sample(range(1, teams + 1), 10)])
+    connection.executemany("INSERT INTO topics (id, name, team_id) VALUES (?, ?, ?)",
+                           [(team, "Topic One", team) for team in range(1, teams + 1)])
+    connection.executemany("INSERT INTO notes (content, status, topic_id) VALUES (?, 'todo', ?)",
+                           [(f"note {n}", topic) for topic in range(1, teams + 1) for n in range(notes_per_topic)])
+    connection.commit()
+    connection.close()
+
+
+def workloads(db, teams):
+    """
+    Return the named operations to time against a database layer
+    """
+
+    def privilege():
+        db.execute(PRIVILEGE_QUERY, f"team{random.randint(1, teams)}", random.randint(1, 500))
+
+    def board():
+        db.execute(BOARD_QUERY, random.randint(1, teams), "Topic One")
+
+    def write():
+        note_id = db.execute("INSERT INTO notes (content, status, topic_id) VALUES (?, 'todo', ?)",
+                             "benchmark", random.randint(1, teams))
+        db.execute("UPDATE notes SET status = 'done' WHERE id = ?", note_id)
+        db.execute("DELETE FROM notes WHERE id = ?", note_id)
+
+    return {"privilege lookup": privilege, "board cards": board, "insert/update/delete": write}
+
+
+def run(operation, iterations, threads=1):
+    """
+    Run an operation iterations times on each thread, returning operations per second
+    """
+
+    def worker():
+        for _ in range(iterations):
+            operation()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    return iterations * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = path.join(directory, "bench.db")
+        upgrade(database)
+        seed(database)
+
+        layers = {"database.SQL": SQL(database)}
+        try:
+            from cs50 import SQL as CS50SQL
+            layers["cs50.SQL"] = CS50SQL(f"sqlite:///{database}")
+        except ImportError:
+            print("cs50 is not installed, only benchmarking database.SQL")
+
+        # cs50 logs every statement, keep the output readable
+        logging.getLogger("cs50").disabled = True
+
+        print(f"{'layer':<14} {'operation':<22} {'threads':>7} {'ops/s':>10} {'us/op':>8}")
+        for name, db in layers.items():
+            for operation_name, operation in workloads(db, 100).items():
+
+                # cs50's SQL shares one connection between threads, so it is only timed single threaded
+                for threads in ([1, arguments.threads] if name == "database.SQL" else [1]):
+                    run(operation, 100, threads)
+                    rate = run(operation, arguments.iterations, threads)
+                    print(f"{name:<14} {operation_name:<22} {threads:>7} {rate:>10.0f} {1e6 / rate:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark applying note operations one request at a time versus through batch_notes_api
+
+Run from the repository root with: python -m benchmarks.note_batch [--notes N] [--rounds N]
+"""
+
+import argparse
+import os
+import tempfile
+from os import path
+from time import perf_counter
+
+
+def setup(directory):
+    """
+    Point the app at a fresh database inside directory and return a logged in test client
+    """
+
+    # The database path is read when the app is imported, and sessions are stored in the working directory
+    os.environ["DATABASE"] = path.join(directory, "bench.db")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["RATE_LIMIT_DEFAULT"] = "0"
+    os.environ["RATE_LIMITS"] = ""
+    os.chdir(directory)
+
+    from migrate import upgrade
+    upgrade(os.environ["DATABASE"])
+
+    from app import app
+    client = app.test_client()
+
+    client.post("/register_api", json={"username": "bench", "password": "Benchmark1", "confirmation": "Benchmark1"})
+    client.post("/create_team_api", json={"team_name": "Bench Team", "team_code": "",
+                                          "team_description": "", "team_access_type": "public"})
+    client.post("/create_topic_api/Bench Team", json={"topic_name": "Bench Topic"})
+
+    return client
+
+
+def single(client, notes):
+    """
+    Create, move and delete notes with one request per operation
+    """
+
+    note_ids = []
+    for n in range(notes):
+        response = client.post("/create_note_api/Bench Team/Bench Topic", json={"content": f"note {n}", "status": "todo"})
+        note_ids.append(response.get_json()["note_id"])
+
+    for note_id in note_ids:
+        client.post("/move_note_api/Bench Team/Bench Topic", json={"note_id": note_id, "column_id": "done"})
+
+    for note_id in note_ids:
+        client.post("/move_note_api/Bench Team/Bench Topic", json={"note_id": note_id, "column_id": "delete"})
+
+    return notes * 3
+
+
+def batch(client, notes):
+    """
+    Create, move and delete the same notes with one batch request per step
+    """
+
+    url = "/batch_notes_api/Bench Team/Bench Topic"
+
+    response = client.post(url, json={"operations": [{"action": "create", "content": f"note {n}", "status": "todo"}
+                                                     for n in range(notes)]})
+    note_ids = [result["note_id"] for result in response.get_json()["results"]]
+
+    client.post(url, json={"operations": [{"action": "move", "note_id": note_id, "status": "done"}
+                                          for note_id in note_ids]})
+    client.post(url, json={"operations": [{"action": "delete", "note_id": note_id}
+                                          for note_id in note_ids]})
+
+    return notes * 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        client = setup(directory)
+
+        print(f"{'path':<8} {'operations':>10} {'ops/s':>10} {'us/op':>8}")
+        for name, workload in {"single": single, "batch": batch}.items():
+            workload(client, arguments.notes)
+
+            operations = 0
+            start = perf_counter()
+            for _ in range(arguments.rounds):
+                operations += workload(client, arguments.notes)
+            elapsed = perf_counter() - start
+
+            rate = operations / elapsed
+            print(f"{name:<8} {operations:>10} {rate:>10.0f} {1e6 / rate:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
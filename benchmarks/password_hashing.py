@@ -0,0 +1,50 @@
+"""
+Benchmark password verification throughput for different PASSWORD_HASH_METHOD settings
+
+Run from the repository root with: python -m benchmarks.password_hashing [--logins N] [--processes N] [--methods ...]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from time import perf_counter
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+METHODS = ["scrypt", "scrypt:16384:8:1", "pbkdf2:sha256:600000", "pbkdf2:sha256:260000"]
+
+PASSWORD = "Benchmark1"
+
+
+def login(password_hash):
+    """
+    The CPU bound part of a login
+    """
+
+    return check_password_hash(password_hash, PASSWORD)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--processes", type=int, default=cpu_count())
+    parser.add_argument("--methods", nargs="+", default=METHODS)
+    arguments = parser.parse_args()
+
+    print(f"{'method':<24} {'ms/login':>9} {'logins/s':>9} {'logins/s/core':>14}")
+    with ProcessPoolExecutor(arguments.processes) as pool:
+        for method in arguments.methods:
+            password_hash = generate_password_hash(PASSWORD, method)
+            list(pool.map(login, [password_hash] * arguments.processes))
+
+            start = perf_counter()
+            assert all(pool.map(login, [password_hash] * arguments.logins))
+            elapsed = perf_counter() - start
+
+            rate = arguments.logins / elapsed
+            print(f"{method:<24} {1000 / rate * arguments.processes:>9.1f} {rate:>9.1f} {rate / arguments.processes:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the latency the API rate limiter adds to requests under their limit, and what refusing costs
+
+Run from the repository root with: python -m benchmarks.rate_limiting [--requests N] [--rounds N]
+    [--routes ROUTE ...]
+"""
+
+import argparse
+import os
+import tempfile
+from os import path
+
+from benchmarks.routes import MEMBERS_PER_TEAM, PASSWORD_HASH_METHOD, ROUTES, generate, run_client
+
+
+# Limiter settings compared, as (description, limit for every endpoint, tokens a worker leases at once)
+# The limits are far above the requests made, apart from the one measuring refusals, and "leased"
+# leases as many tokens as the default 120/60 limit does
+CONFIGURATIONS = {
+    "off": ("no rate limiting", None, None),
+    "leased": ("under the limit, 12 tokens leased at a time", "1000000/60", 12),
+    "unleased": ("under the limit, a bucket write per request", "1000000/60", 1),
+    "refused": ("over the limit, every request refused", "1/3600", 1),
+}
+
+
+def configure(configuration):
+    """
+    Switch the limiter of this process to a configuration, starting from empty buckets
+    """
+
+    import ratelimit
+    from helpers import db
+
+    _, limit, lease = CONFIGURATIONS[configuration]
+    ratelimit.default_limit = ratelimit.parse_limit(limit) if limit else None
+    ratelimit.limits = {}
+    if lease is not None:
+        ratelimit.LEASE_SHARE = lease / ratelimit.default_limit[0]
+
+    ratelimit.leases.clear()
+    db.execute("DELETE FROM rate_limits")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per route and round")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds of every configuration, the best is kept")
+    parser.add_argument("--routes", nargs="+", default=["move_note_api", "edit_note_api", "board_notes_api"],
+                        choices=sorted(ROUTES))
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        # The settings are read when the app is imported
+        os.environ["DATABASE"] = path.join(directory, "bench.db")
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ["PASSWORD_HASH_METHOD"] = PASSWORD_HASH_METHOD
+        os.environ["PASSWORD_HASH_WORKERS"] = "0"
+        os.environ["METRICS_DIR"] = path.join(directory, "metrics")
+        os.environ["SLOW_QUERY_MS"] = "-1"
+
+        from migrate import upgrade
+        upgrade(os.environ["DATABASE"])
+        generate(os.environ["DATABASE"], users=2 * MEMBERS_PER_TEAM, teams_per_user=1, topics_per_team=2,
+                 notes_per_topic=40)
+
+        # Logging in is an API call too, so it goes through the configuration being measured
+        results = {}
+        for route in arguments.routes:
+            configure("off")
+            run_client(os.environ["DATABASE"], route, 100)
+
+            for _ in range(arguments.rounds):
+                for configuration in CONFIGURATIONS:
+                    if configuration == "refused" and not route.endswith("_api"):
+                        continue
+                    configure(configuration)
+                    result = run_client(os.environ["DATABASE"], route, arguments.requests)
+                    best = results.get((route, configuration))
+                    if best is None or result["mean_ms"] < best["mean_ms"]:
+                        results[(route, configuration)] = result
+
+    print(f"{'route':<18} {'limiter':<10} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'added us':>9} {'errors':>7}")
+    for route in arguments.routes:
+        baseline = results[(route, "off")]
+        for configuration in CONFIGURATIONS:
+            result = results.get((route, configuration))
+            if result is None:
+                continue
+            added = (result["mean_ms"] - baseline["mean_ms"]) * 1000
+            print(f"{route:<18} {configuration:<10} {result['mean_ms']:>8.3f} {result['p50_ms']:>8.3f} "
+                  f"{result['p99_ms']:>8.3f} {added:>9.1f} {result['errors']:>7}")
+
+    print()
+    for configuration, (description, limit, _) in CONFIGURATIONS.items():
+        print(f"{configuration}: {description}" + (f" ({limit})" if limit else ""))
+
+
+if __name__ == "__main__":
+    main()
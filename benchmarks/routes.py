@@ -0,0 +1,463 @@
+"""
+Benchmark the latency percentiles and throughput of every route against a generated database
+
+Run from the repository root with: python -m benchmarks.routes [--users N] [--teams-per-user N]
+    [--topics-per-team N] [--notes-per-topic N] [--server client|gunicorn] [--requests N] [--threads N]
+    [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from http.cookies import SimpleCookie
+from os import path
+from time import perf_counter, sleep, time
+from urllib.parse import quote
+
+
+# Users are hashed cheaply, logging in isn't what is measured here (see benchmarks.password_hashing)
+PASSWORD = "Benchmark1"
+PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+
+# How many members a generated team has on average, which sets the number of teams
+MEMBERS_PER_TEAM = 10
+
+STATUSES = ["announcements", "todo", "doing", "done"]
+
+# Every route, as (method, url, JSON body) built from the benchmarking user's context and the request's number
+# Writes are chosen so that repeating them leaves the data the same size (apart from created notes)
+ROUTES = {
+    "index": lambda user, n: ("GET", "/", None),
+    "login": lambda user, n: ("GET", "/login", None),
+    "register": lambda user, n: ("GET", "/register", None),
+    "account": lambda user, n: ("GET", "/account", None),
+    "explore": lambda user, n: ("GET", "/explore", None),
+    "explore_page": lambda user, n: ("GET", f"/explore?after={quote(user['middle_team'])}&partial=1", None),
+    "explore_search": lambda user, n: ("GET", "/explore?search=team", None),
+    "teams": lambda user, n: ("GET", "/teams", None),
+    "teams_search": lambda user, n: ("GET", "/teams?search=team", None),
+    "create_team": lambda user, n: ("GET", "/create_team", None),
+    "join_team": lambda user, n: ("GET", "/join_team", None),
+    "team_page": lambda user, n: ("GET", f"/team/{quote(user['team'])}", None),
+    "manage_team": lambda user, n: ("GET", f"/manage_team/{quote(user['team'])}", None),
+    "manage_team_api": lambda user, n: ("POST", f"/manage_team_api/{quote(user['team'])}",
+                                        {"team_name": user["team"], "team_code": user["code"],
+                                         "team_description": f"Edited {n}", "team_access_type": "public"}),
+    "manage_member_api": lambda user, n: ("POST", f"/manage_member_api/{quote(user['team'])}",
+                                          {"member_id": str(user["member"]),
+                                           "privilege": ["editor", "drag-only"][n % 2]}),
+    "edit_team": lambda user, n: ("GET", f"/edit_team/{quote(user['team'])}", None),
+    "board": lambda user, n: ("GET", f"/team/{quote(user['team'])}/topic/Topic 1", None),
+    "board_archive": lambda user, n: ("GET", f"/team/{quote(user['team'])}/topic/Topic 1/archive", None),
+    "board_notes_api": lambda user, n: ("GET", f"/api/team/{quote(user['team'])}/topic/Topic 1/notes", None),
+    "board_activity_api": lambda user, n: ("GET", f"/api/team/{quote(user['team'])}/topic/Topic 1/activity", None),
+    "board_changes_api": lambda user, n: ("GET", f"/api/team/{quote(user['team'])}/topic/Topic 1/changes?since=1",
+                                          None),
+    "create_note_api": lambda user, n: ("POST", f"/create_note_api/{quote(user['team'])}/Topic 2",
+                                        {"content": f"Benchmark note {n}", "status": "todo"}),
+    "edit_note_api": lambda user, n: ("POST", f"/edit_note_api/{quote(user['team'])}/Topic 1",
+                                      {"note_id": user["note"], "content": f"Edited {n}"}),
+    "move_note_api": lambda user, n: ("POST", f"/move_note_api/{quote(user['team'])}/Topic 1",
+                                      {"note_id": user["note"], "column_id": ["todo", "doing"][n % 2],
+                                       "after_id": None}),
+    "batch_notes_api": lambda user, n: ("POST", f"/batch_notes_api/{quote(user['team'])}/Topic 1", {"operations": [
+        {"action": "edit", "note_id": user["note"], "content": f"Batched {n}"},
+        {"action": "move", "note_id": user["note"], "status": ["todo", "doing"][n % 2]}]}),
+}
+
+# Routes left out, and why
+SKIPPED = {
+    "login_api": "dominated by password hashing, see benchmarks.password_hashing",
+    "register_api": "dominated by password hashing, see benchmarks.password_hashing",
+    "account_api": "dominated by password hashing, see benchmarks.password_hashing",
+    "logout": "ends the session the other routes use",
+    "board_events": "a long lived event stream, not a request/response",
+    "metrics": "only served to localhost or with a token, and measures the other routes",
+    "join_team_api": "changes the user's teams, so repeating it measures a different request",
+    "join_with_credentials_api": "changes the user's teams, so repeating it measures a different request",
+    "leave_team_api": "changes the user's teams, so repeating it measures a different request",
+    "create_team_api": "changes the user's teams, so repeating it measures a different request",
+    "delete_team_api": "changes the user's teams, so repeating it measures a different request",
+    "create_topic_api": "topics are capped at 20 per team, so it can't be repeated",
+    "edit_topic_api": "renaming or deleting a topic breaks the board routes",
+    "undo_note_api": "reverts the user's own latest change, which the note write routes already measure",
+}
+
+
+def generate(database, users, teams_per_user, topics_per_team, notes_per_topic, seed=0):
+    """
+    Fill a freshly migrated database through bulk inserts
+    Every user n up to the number of teams is the admin of "Team n", plus teams_per_user - 1 random other teams
+    """
+
+    from werkzeug.security import generate_password_hash
+
+    if not 1 <= teams_per_user <= 20 or not 2 <= topics_per_team <= 20:
+        raise ValueError("Users are in 1 to 20 teams, and teams have 2 to 20 topics")
+
+    rng = random.Random(seed)
+    teams = max(teams_per_user, math.ceil(users * teams_per_user / MEMBERS_PER_TEAM))
+    password_hash = generate_password_hash(PASSWORD, PASSWORD_HASH_METHOD)
+
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA foreign_keys = ON")
+
+    connection.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, ?)",
+                           ((n, f"user{n}", password_hash) for n in range(1, users + 1)))
+
+    connection.executemany("""
+                           INSERT INTO teams (id, name, code, description, access_type)
+                           VALUES (?, ?, ?, ?, ?)
+                           """, ((n, team_name(n), f"CODE{n:06}", f"Description of team {n}",
+                                  "public" if n % 3 else "private")
+                                 for n in range(1, teams + 1)))
+
+    def memberships():
+        for user in range(1, users + 1):
+            own = [user] if user <= teams else []
+            others = [team for team in rng.sample(range(1, teams + 1), teams_per_user + 1) if team not in own]
+            for team in own:
+                yield team, user, "admin"
+            for team in others[:teams_per_user - len(own)]:
+                yield team, user, rng.choice(["admin", "editor", "drag-only"])
+
+    connection.executemany("INSERT INTO team_members (team_id, user_id, privilege) VALUES (?, ?, ?)", memberships())
+
+    connection.executemany("INSERT INTO topics (id, name, team_id) VALUES (?, ?, ?)",
+                           (((team - 1) * topics_per_team + n, f"Topic {n}", team)
+                            for team in range(1, teams + 1) for n in range(1, topics_per_team + 1)))
+
+    connection.executemany("INSERT INTO notes (content, status, topic_id, position) VALUES (?, ?, ?, ?)",
+                           ((f"Note {n} " + "lorem ipsum " * rng.randint(0, 10), rng.choice(STATUSES), topic,
+                             f"{2 * n + 1:06}")
+                            for topic in range(1, teams * topics_per_team + 1) for n in range(notes_per_topic)))
+
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+
+    return teams
+
+
+def team_name(n):
+    """
+    Name of a generated team, zero padded so names sort like their numbers
+    """
+
+    return f"Team {n:06}"
+
+
+def user_context(database, user_id):
+    """
+    Return what a user's requests are built from: their own team and one of its notes and other members
+    """
+
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+
+    team = connection.execute("SELECT id, name, code FROM teams WHERE id = ?", (user_id,)).fetchone()
+    member = connection.execute("SELECT user_id FROM team_members WHERE team_id = ? AND user_id != ? LIMIT 1",
+                                (user_id, user_id)).fetchone()
+    note = connection.execute("""
+                              SELECT notes.id FROM notes JOIN topics ON notes.topic_id = topics.id
+                              WHERE topics.team_id = ? AND topics.name = 'Topic 1' LIMIT 1
+                              """, (user_id,)).fetchone()
+    teams = connection.execute("SELECT COUNT(*) FROM teams").fetchone()[0]
+    connection.close()
+
+    if team is None or member is None or note is None:
+        raise ValueError(f"user{user_id} needs a team of their own with another member and a note, "
+                         "generate more teams or members")
+
+    return {"username": f"user{user_id}", "team": team["name"], "code": team["code"],
+            "member": member["user_id"], "note": note["id"], "middle_team": team_name(teams // 2)}
+
+
+def percentile(latencies, fraction):
+    """
+    Nearest-rank percentile of sorted latencies
+    """
+
+    return latencies[min(len(latencies) - 1, max(0, math.ceil(fraction * len(latencies)) - 1))]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Turn a route's latencies (in seconds) into its result
+    """
+
+    latencies = sorted(latencies)
+    return {"requests": len(latencies),
+            "errors": errors,
+            "throughput": round(len(latencies) / elapsed, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3)}
+
+
+def failed(status, body):
+    """
+    Check whether a response is an error, JSON APIs report theirs with a 200
+    """
+
+    if status not in (200, 302):
+        return True
+    return body.startswith(b"{") and b'"success":false' in body.replace(b" ", b"")
+
+
+def run_client(database, route, requests):
+    """
+    Time a route through the Flask test client, one request at a time
+    """
+
+    from app import app
+
+    client = app.test_client()
+    user = user_context(database, 1)
+    client.post("/login_api", json={"username": user["username"], "password": PASSWORD})
+
+    latencies = []
+    errors = 0
+    start = perf_counter()
+    for n in range(requests):
+        method, url, body = ROUTES[route](user, n)
+
+        request_start = perf_counter()
+        response = client.open(url, method=method, json=body, headers={"Accept-Encoding": "gzip"})
+        data = response.get_data()
+        latencies.append(perf_counter() - request_start)
+
+        errors += failed(response.status_code, data)
+
+    return summarize(latencies, errors, perf_counter() - start)
+
+
+class Connection:
+    """
+    A logged in keep-alive connection to the server
+    """
+
+    def __init__(self, port, username):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port)
+        self.cookie = ""
+
+        status, _ = self.request("POST", "/login_api", {"username": username, "password": PASSWORD})
+        if status != 200 or not self.cookie:
+            raise RuntimeError(f"Couldn't log {username} in")
+
+    def request(self, method, url, body):
+        """
+        Send a request, returning its status and (still compressed) body
+        """
+
+        headers = {"Accept-Encoding": "gzip", "Cookie": self.cookie}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(body)
+
+        self.connection.request(method, quote(url, safe="/?=&%"), body, headers)
+        response = self.connection.getresponse()
+        data = response.read()
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            cookie = SimpleCookie(header)
+            self.cookie = "; ".join(f"{name}={morsel.value}" for name, morsel in cookie.items())
+
+        return response.status, data
+
+
+def run_concurrent(database, port, route, requests, threads):
+    """
+    Time a route against a running server, from threads each logged in as a different user
+    """
+
+    users = [user_context(database, n) for n in range(1, threads + 1)]
+    connections = [Connection(port, user["username"]) for user in users]
+
+    latencies = []
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(connection, user):
+        barrier.wait()
+        for n in range(requests // threads):
+            method, url, body = ROUTES[route](user, n)
+
+            request_start = perf_counter()
+            status, data = connection.request(method, url, body)
+            latencies.append(perf_counter() - request_start)
+
+            if failed(status, data):
+                errors.append(status)
+
+    pool = [threading.Thread(target=worker, args=pair) for pair in zip(connections, users)]
+    for thread in pool:
+        thread.start()
+
+    barrier.wait()
+    start = perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    return summarize(latencies, len(errors), elapsed)
+
+
+def start_gunicorn(workers, threads):
+    """
+    Serve the app with gunicorn's threaded workers on a free port, returning the process and port
+    """
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "--worker-class", "gthread",
+                                "--workers", str(workers), "--threads", str(threads),
+                                "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"],
+                               env=os.environ.copy())
+
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None:
+                break
+            sleep(0.1)
+
+    process.kill()
+    raise RuntimeError("gunicorn didn't start")
+
+
+def git_commit():
+    """
+    Return the current commit, so results can be compared between commits
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Print how each route's p50, p99 and throughput changed since a baseline
+    """
+
+    print(f"\nCompared with {baseline.get('commit')}:")
+    for name in ("server", "data", "settings"):
+        if baseline.get(name) != results[name]:
+            print(f"Warning: the baseline's {name} differs, {baseline.get(name)} instead of {results[name]}")
+
+    print(f"{'route':<20} {'p50':>8} {'p99':>8} {'req/s':>8}")
+    for route, result in results["routes"].items():
+        old = baseline["routes"].get(route)
+        if old is None:
+            continue
+
+        changes = [result[name] / old[name] - 1 if old[name] else 0.0 for name in ("p50_ms", "p99_ms", "throughput")]
+        print(f"{route:<20} {changes[0]:>+8.0%} {changes[1]:>+8.0%} {changes[2]:>+8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--teams-per-user", type=int, default=10)
+    parser.add_argument("--topics-per-team", type=int, default=5)
+    parser.add_argument("--notes-per-topic", type=int, default=30)
+    parser.add_argument("--database", help="reuse (or generate once into) this database instead of a temporary one")
+    parser.add_argument("--server", choices=["client", "gunicorn"], default="client")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent clients against gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--worker-threads", type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="print the change since the results in this JSON file")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = arguments.database or path.join(directory, "bench.db")
+
+        # The database path and settings are read when the app is imported, by this process or gunicorn's
+        os.environ["DATABASE"] = database
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ["PASSWORD_HASH_METHOD"] = PASSWORD_HASH_METHOD
+        os.environ["METRICS_DIR"] = path.join(directory, "metrics")
+        os.environ["SLOW_QUERY_MS"] = "-1"
+
+        # One user repeats each route far faster than the API rate limits allow (see benchmarks.rate_limiting)
+        os.environ["RATE_LIMIT_DEFAULT"] = "0"
+        os.environ["RATE_LIMITS"] = ""
+
+        if not path.exists(database):
+            from migrate import upgrade
+            upgrade(database)
+
+            start = perf_counter()
+            teams = generate(database, arguments.users, arguments.teams_per_user,
+                             arguments.topics_per_team, arguments.notes_per_topic)
+            print(f"Generated {arguments.users} users and {teams} teams in {perf_counter() - start:.1f}s")
+
+        connection = sqlite3.connect(database)
+        data = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("users", "teams", "team_members", "topics", "notes")}
+        connection.close()
+
+        results = {"commit": git_commit(),
+                   "time": int(time()),
+                   "server": arguments.server,
+                   "data": data,
+                   "settings": {name: getattr(arguments, name) for name in ("requests", "threads", "workers",
+                                                                            "worker_threads")},
+                   "routes": {}}
+
+        process = None
+        if arguments.server == "gunicorn":
+            process, port = start_gunicorn(arguments.workers, arguments.worker_threads)
+
+        try:
+            print(f"{'route':<20} {'req/s':>8} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'errors':>6}")
+            for route in arguments.routes:
+                if process is None:
+                    run_client(database, route, 10)
+                    result = run_client(database, route, arguments.requests)
+                else:
+                    run_concurrent(database, port, route, arguments.threads, arguments.threads)
+                    result = run_concurrent(database, port, route, arguments.requests, arguments.threads)
+
+                results["routes"][route] = result
+                print(f"{route:<20} {result['throughput']:>8.0f} {result['mean_ms']:>8.2f} {result['p50_ms']:>8.2f} "
+                      f"{result['p90_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['max_ms']:>8.2f} {result['errors']:>6}")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    print("Not measured: " + ", ".join(SKIPPED) + " (see SKIPPED)")
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
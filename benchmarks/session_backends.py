@@ -0,0 +1,92 @@
+"""
+Benchmark the cost of loading and saving a session per request for each session backend
+
+Run from the repository root with: python -m benchmarks.session_backends [--iterations N]
+"""
+
+import argparse
+import os
+import tempfile
+from os import path
+from time import perf_counter
+
+
+def backends(directory):
+    """
+    Return the named session interfaces to time, including Flask-Session's filesystem one if installed
+    """
+
+    from sessions import CookieSessionInterface, SQLiteSessionInterface
+
+    interfaces = {"sqlite": SQLiteSessionInterface(), "cookie": CookieSessionInterface()}
+    try:
+        from flask_session.sessions import FileSystemSessionInterface
+        interfaces["filesystem"] = FileSystemSessionInterface(path.join(directory, "flask_session"), 500, 0o600,
+                                                              "session:", False, True)
+    except ImportError:
+        print("Flask-Session is not installed, skipping the filesystem backend")
+
+    return interfaces
+
+
+def login_cookie(app, interface):
+    """
+    Save a logged in session through the interface and return the cookie it sets
+    """
+
+    with app.test_request_context() as context:
+        session = interface.open_session(app, context.request)
+        session["user_id"] = 1
+        session["username"] = "bench"
+        response = app.response_class()
+        interface.save_session(app, session, response)
+
+    return response.headers["Set-Cookie"].split(";", 1)[0]
+
+
+def run(app, interface, cookie, iterations, modify):
+    """
+    Open and save a session iterations times, returning microseconds per request
+    """
+
+    start = perf_counter()
+    for n in range(iterations):
+        with app.test_request_context(headers={"Cookie": cookie}) as context:
+            session = interface.open_session(app, context.request)
+            session.get("user_id")
+            if modify:
+                session["_flashes"] = [("message", f"flash {n}")]
+            interface.save_session(app, session, app.response_class())
+
+    return (perf_counter() - start) * 1e6 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5000)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        # The database path is read when the app is imported
+        os.environ["DATABASE"] = path.join(directory, "bench.db")
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+
+        from migrate import upgrade
+        upgrade(os.environ["DATABASE"])
+
+        from app import app
+        from helpers import db
+        db.execute("INSERT INTO users (id, username, hash) VALUES (1, 'bench', 'x')")
+
+        print(f"{'backend':<12} {'request':<10} {'us/request':>10}")
+        for name, interface in backends(directory).items():
+            cookie = login_cookie(app, interface)
+            for modify in [False, True]:
+                run(app, interface, cookie, 100, modify)
+                cost = run(app, interface, cookie, arguments.iterations, modify)
+                print(f"{name:<12} {'write' if modify else 'read':<10} {cost:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
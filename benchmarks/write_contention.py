@@ -0,0 +1,175 @@
+"""
+Stress concurrent note writers across processes and report write lock waits, retries and failures
+
+Run from the repository root with: python -m benchmarks.write_contention [--processes N] [--threads N]
+    [--teams N] [--duration SECONDS] [--busy-timeout MS] [--retries N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+from os import path
+from time import perf_counter
+
+from benchmarks.routes import MEMBERS_PER_TEAM, PASSWORD, PASSWORD_HASH_METHOD, generate, summarize
+
+
+TOPICS_PER_TEAM = 5
+NOTES_PER_TOPIC = 40
+
+# Share of writes that move a note (the rest edit one), like people dragging cards around
+MOVE_SHARE = 0.7
+
+
+def writer(client, team, topics, duration, seed):
+    """
+    Move and edit random notes of a team's topics until the duration is over,
+    returning the latencies and how many writes succeeded, were refused as busy or errored
+    """
+
+    rng = random.Random(seed)
+    latencies = []
+    outcomes = {"ok": 0, "busy": 0, "error": 0}
+
+    end = perf_counter() + duration
+    while perf_counter() < end:
+        topic = rng.choice(list(topics))
+        note_id = rng.choice(topics[topic])
+
+        if rng.random() < MOVE_SHARE:
+            url = f"/move_note_api/{team}/{topic}"
+            body = {"note_id": note_id, "column_id": rng.choice(["todo", "doing", "done"])}
+        else:
+            url = f"/edit_note_api/{team}/{topic}"
+            body = {"note_id": note_id, "content": f"Edited by writer {seed}"}
+
+        start = perf_counter()
+        response = client.post(url, json=body)
+        latencies.append(perf_counter() - start)
+
+        if response.status_code == 503:
+            outcomes["busy"] += 1
+        elif response.is_json and response.get_json()["success"]:
+            outcomes["ok"] += 1
+        else:
+            outcomes["error"] += 1
+
+    return latencies, outcomes
+
+
+def process(number, threads, teams, duration, results):
+    """
+    One server process: run a writer per thread, each logged in as the admin of one of the teams
+    """
+
+    # The app counts write lock contention in metrics.contention through a database lock observer
+    from app import app
+    from helpers import db
+    from metrics import contention
+
+    lock = threading.Lock()
+    latencies = []
+    outcomes = {"ok": 0, "busy": 0, "error": 0}
+
+    def run(writer_number):
+        user_id = writer_number % teams + 1
+        team = db.execute("SELECT name FROM teams WHERE id = ?", user_id)[0]["name"]
+        topics = {}
+        for row in db.execute("""
+                              SELECT topics.name, notes.id FROM topics JOIN notes ON notes.topic_id = topics.id
+                              WHERE topics.team_id = ?
+                              """, user_id):
+            topics.setdefault(row["name"], []).append(row["id"])
+
+        # Logging in writes the session, which can be refused as busy too
+        client = app.test_client()
+        while not client.post("/login_api", json={"username": f"user{user_id}", "password": PASSWORD}).is_json:
+            pass
+
+        writer_latencies, writer_outcomes = writer(client, team, topics, duration, writer_number)
+        with lock:
+            latencies.extend(writer_latencies)
+            for name, count in writer_outcomes.items():
+                outcomes[name] += count
+
+    pool = [threading.Thread(target=run, args=(number * threads + n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    results.put((latencies, outcomes, dict(contention)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="writers per process")
+    parser.add_argument("--teams", type=int, default=8, help="teams the writers are spread over")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--busy-timeout", type=int, help="DATABASE_BUSY_TIMEOUT in milliseconds")
+    parser.add_argument("--retries", type=int, help="DATABASE_WRITE_RETRIES")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        # The settings are read when the app is imported, which each process does after forking
+        os.environ["DATABASE"] = path.join(directory, "bench.db")
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ["PASSWORD_HASH_METHOD"] = PASSWORD_HASH_METHOD
+        os.environ["PASSWORD_HASH_WORKERS"] = "0"
+        os.environ["METRICS_DIR"] = path.join(directory, "metrics")
+        os.environ["SLOW_QUERY_MS"] = "-1"
+        os.environ["RATE_LIMIT_DEFAULT"] = "0"
+        os.environ["RATE_LIMITS"] = ""
+        if arguments.busy_timeout is not None:
+            os.environ["DATABASE_BUSY_TIMEOUT"] = str(arguments.busy_timeout)
+        if arguments.retries is not None:
+            os.environ["DATABASE_WRITE_RETRIES"] = str(arguments.retries)
+
+        from migrate import upgrade
+        upgrade(os.environ["DATABASE"])
+        generate(os.environ["DATABASE"], users=arguments.teams * MEMBERS_PER_TEAM, teams_per_user=1,
+                 topics_per_team=TOPICS_PER_TEAM, notes_per_topic=NOTES_PER_TOPIC)
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        pool = [context.Process(target=process, args=(number, arguments.threads, arguments.teams,
+                                                      arguments.duration, results))
+                for number in range(arguments.processes)]
+        for worker in pool:
+            worker.start()
+
+        latencies = []
+        outcomes = {"ok": 0, "busy": 0, "error": 0}
+        contention = {}
+        for _ in pool:
+            process_latencies, process_outcomes, process_contention = results.get()
+            latencies.extend(process_latencies)
+            for name, count in process_outcomes.items():
+                outcomes[name] += count
+            for name, value in process_contention.items():
+                contention[name] = contention.get(name, 0) + value
+
+        for worker in pool:
+            worker.join()
+
+    writers = arguments.processes * arguments.threads
+    result = summarize(latencies, outcomes["busy"] + outcomes["error"], arguments.duration)
+
+    print(f"{writers} writers ({arguments.processes} processes x {arguments.threads} threads) "
+          f"on {arguments.teams} teams for {arguments.duration:.0f}s")
+    print(f"writes: {result['requests']} ({result['throughput']:.0f}/s), ok {outcomes['ok']}, "
+          f"busy (503) {outcomes['busy']}, errors {outcomes['error']}")
+    print(f"latency ms: mean {result['mean_ms']:.2f}, p50 {result['p50_ms']:.2f}, p90 {result['p90_ms']:.2f}, "
+          f"p99 {result['p99_ms']:.2f}, max {result['max_ms']:.2f}")
+    print(f"write transactions: {contention['transactions']}, waited for the lock {contention['waits']} "
+          f"({contention['wait_seconds']:.2f}s in total), retries {contention['retries']}, "
+          f"gave up {contention['failures']}")
+
+
+if __name__ == "__main__":
+    main()
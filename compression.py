@@ -0,0 +1,170 @@
+import zlib
+from os import getenv
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Responses smaller than this aren't worth compressing
+COMPRESSION_MIN_SIZE = int(getenv("COMPRESSION_MIN_SIZE", 1024))
+
+# zlib level for gzip (1-9) and quality for brotli (0-11), kept moderate since pages are compressed per request
+GZIP_LEVEL = int(getenv("COMPRESSION_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(getenv("COMPRESSION_BROTLI_QUALITY", 4))
+
+# Only text responses compress well, event streams are left alone so each event is sent as it happens
+COMPRESSIBLE_TYPES = ["text/html", "text/css", "text/plain", "text/javascript",
+                      "application/javascript", "application/json", "image/svg+xml"]
+
+
+class GzipCompressor:
+    """
+    Streaming gzip compressor
+    """
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    """
+    Streaming brotli compressor
+    """
+
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    WSGI middleware compressing text responses with brotli or gzip, whichever the client prefers
+    Bodies are compressed as they are produced, so streamed responses keep streaming
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    def compressor(self, encoding):
+        """
+        Return a new compressor for the given encoding
+        """
+
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    def negotiate(self, environ):
+        """
+        Return the best encoding the client accepts, or None
+        """
+
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            return None
+
+        accepted = parse_accept_header(environ.get("HTTP_ACCEPT_ENCODING"))
+        return accepted.best_match(self.encodings)
+
+    def compressible(self, status, headers):
+        """
+        Check whether a response's status and headers allow compressing it
+        """
+
+        if int(status.split(None, 1)[0]) in (204, 206, 304) or status.startswith("1"):
+            return False
+
+        values = {name.lower(): value for name, value in headers}
+        if "content-encoding" in values:
+            return False
+
+        content_type = values.get("content-type", "").split(";", 1)[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return False
+
+        # Known small bodies are sent as they are, unknown lengths are decided while streaming
+        length = values.get("content-length")
+        return length is None or int(length) >= self.minimum_size
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ)
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        response = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            response["status"], response["headers"], response["exc_info"] = status, headers, exc_info
+            return response.setdefault("written", []).append
+
+        app_iter = self.app(environ, capture_start_response)
+        return self.stream(app_iter, response, encoding, start_response)
+
+    def stream(self, app_iter, response, encoding, start_response):
+        """
+        Yield the response body, compressed if it turns out large enough and compressible
+        """
+
+        try:
+            chunks = iter(app_iter)
+            buffered = list(response.get("written", []))
+
+            if not self.compressible(response["status"], response["headers"]):
+                start_response(response["status"], response["headers"], response["exc_info"])
+                yield from buffered
+                yield from chunks
+                return
+
+            # Buffer until the threshold is reached, so bodies that stay small go out uncompressed
+            size = sum(len(chunk) for chunk in buffered)
+            for chunk in chunks:
+                buffered.append(chunk)
+                size += len(chunk)
+                if size >= self.minimum_size:
+                    break
+            else:
+                start_response(response["status"], response["headers"], response["exc_info"])
+                yield b"".join(buffered)
+                return
+
+            headers = [(name, value) for name, value in response["headers"]
+                       if name.lower() not in ("content-length", "etag", "vary")]
+            headers.append(("Content-Encoding", encoding))
+
+            # The compressed body is a different representation of the same resource
+            vary = [value for name, value in response["headers"] if name.lower() == "vary"]
+            headers.append(("Vary", ", ".join(vary + ["Accept-Encoding"])))
+            for name, value in response["headers"]:
+                if name.lower() == "etag":
+                    headers.append((name, value if value.startswith("W/") else f"W/{value}"))
+
+            start_response(response["status"], headers, response["exc_info"])
+
+            compressor = self.compressor(encoding)
+            yield compressor.compress(b"".join(buffered))
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk)
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
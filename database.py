@@ -0,0 +1,255 @@
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from os import getenv, getpid
+from time import perf_counter, sleep
+
+
+DATABASE = getenv("DATABASE", "cloud-board.db")
+
+# Connection tuning, overridable through the environment
+BUSY_TIMEOUT = int(getenv("DATABASE_BUSY_TIMEOUT", 5000))
+MMAP_SIZE = int(getenv("DATABASE_MMAP_SIZE", 64 * 1024 * 1024))
+CACHED_STATEMENTS = int(getenv("DATABASE_CACHED_STATEMENTS", 256))
+
+# Write transactions that still can't take the write lock after the busy timeout are retried
+# this many times, each after a random backoff of up to WRITE_RETRY_BACKOFF * 2 ** attempt seconds
+WRITE_RETRIES = int(getenv("DATABASE_WRITE_RETRIES", 4))
+WRITE_RETRY_BACKOFF = float(getenv("DATABASE_WRITE_RETRY_BACKOFF", 0.02))
+
+# Statements that write, run outside a transaction they get one of their own
+WRITES = ("INSERT", "REPLACE", "UPDATE", "DELETE")
+
+# SQLite's (primary) result codes for a database another connection holds a lock on
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+class Row(sqlite3.Row):
+    """
+    Lightweight result row, indexable by column name like the dicts cs50's SQL used to return
+    """
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except IndexError:
+            return default
+
+
+class DatabaseBusy(sqlite3.OperationalError):
+    """
+    Raised when a write transaction couldn't take the write lock after every retry
+    """
+
+
+def is_locked(error):
+    """
+    Check whether an OperationalError means the database was locked by another connection
+    """
+
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+class SQL:
+    """
+    Drop-in replacement for cs50's SQL built on sqlite3, with one tuned connection per thread
+
+    execute() keeps cs50's contract: statements that produce rows return a list of rows,
+    INSERT returns the new row's id (or None), UPDATE and DELETE return the number of rows
+    matched, and constraint violations raise ValueError. Writes outside a transaction run in
+    a write transaction of their own, so every write waits for the lock in one retried place
+    """
+
+    def __init__(self, path, busy_timeout=BUSY_TIMEOUT, mmap_size=MMAP_SIZE, cached_statements=CACHED_STATEMENTS,
+                 write_retries=WRITE_RETRIES, write_retry_backoff=WRITE_RETRY_BACKOFF):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.write_retries = write_retries
+        self.write_retry_backoff = write_retry_backoff
+
+        self._local = threading.local()
+
+        # Leading keyword of every statement seen so far, so they are only parsed once
+        self._commands = {}
+
+        # Callables run as observer(sql, args, seconds) after every statement, e.g. to collect metrics
+        self.observers = []
+
+        # Callables run as observer(seconds, retries, acquired) after every attempt at taking the write lock,
+        # with the time spent waiting for it, e.g. to count contention
+        self.lock_observers = []
+
+    def connect(self):
+        """
+        Open a new connection with the pragmas every connection should run with
+        """
+
+        connection = sqlite3.connect(self.path,
+                                     isolation_level=None,
+                                     cached_statements=self.cached_statements)
+        connection.row_factory = Row
+
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA temp_store = MEMORY")
+
+        return connection
+
+    @property
+    def connection(self):
+        """
+        The calling thread's connection, reopened after a fork so workers never share one
+        """
+
+        local = self._local
+        connection = getattr(local, "connection", None)
+
+        if connection is None or local.pid != getpid():
+            connection = local.connection = self.connect()
+            local.pid = getpid()
+            local.depth = 0
+
+        return connection
+
+    def close(self):
+        """
+        Close the calling thread's connection if it has one
+        """
+
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == getpid():
+            connection.close()
+        self._local.connection = None
+
+    def command(self, sql):
+        """
+        Return the upper cased leading keyword of a statement
+        """
+
+        command = self._commands.get(sql)
+        if command is None:
+            words = sql.split(None, 1)
+            command = self._commands[sql] = words[0].upper() if words else ""
+        return command
+
+    def execute(self, sql, *args):
+        """
+        Execute a single statement with positional parameters
+        """
+
+        if not self.observers:
+            return self.run(sql, args)
+
+        started = perf_counter()
+        try:
+            return self.run(sql, args)
+        finally:
+            elapsed = perf_counter() - started
+            for observer in self.observers:
+                observer(sql, args, elapsed)
+
+    def run(self, sql, args):
+        """
+        Execute a statement and shape its result the way execute() documents
+        """
+
+        connection = self.connection
+        command = self.command(sql)
+
+        # A lone write takes the write lock up front, where waiting for it can be retried
+        if command in WRITES and not self._local.depth:
+            with self.transaction():
+                return self.run(sql, args)
+
+        try:
+            cursor = connection.execute(sql, args)
+        except sqlite3.IntegrityError as error:
+            raise ValueError(error) from None
+
+        # Anything that produces rows (SELECT, PRAGMA, RETURNING...) returns them
+        if cursor.description is not None:
+            return cursor.fetchall()
+
+        if command in ("INSERT", "REPLACE"):
+            return cursor.lastrowid if cursor.rowcount == 1 else None
+        if command in ("UPDATE", "DELETE"):
+            return cursor.rowcount
+        return True
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """
+        Run the enclosed statements in a single transaction, committing on success
+        Nested transactions simply join the outermost one
+        """
+
+        connection = self.connection
+        local = self._local
+
+        if local.depth:
+            local.depth += 1
+            try:
+                yield self
+            finally:
+                local.depth -= 1
+            return
+
+        if immediate:
+            self.begin_immediate(connection)
+        else:
+            connection.execute("BEGIN")
+
+        local.depth = 1
+        try:
+            yield self
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            local.depth = 0
+
+    def begin_immediate(self, connection):
+        """
+        Start a write transaction, retrying with jittered exponential backoff while another
+        connection holds the write lock, raising DatabaseBusy once the retries run out
+        """
+
+        started = perf_counter()
+        attempt = 0
+        while True:
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as error:
+                if not is_locked(error):
+                    raise
+
+                if attempt >= self.write_retries:
+                    self.notify_lock(perf_counter() - started, attempt, False)
+                    raise DatabaseBusy("The database is busy, please try again!") from error
+
+            # Random backoff spreads retrying writers out instead of having them collide again
+            sleep(random.uniform(0, self.write_retry_backoff * 2 ** attempt))
+            attempt += 1
+
+        self.notify_lock(perf_counter() - started, attempt, True)
+
+    def notify_lock(self, seconds, retries, acquired):
+        """
+        Run the lock observers
+        """
+
+        for observer in self.lock_observers:
+            observer(seconds, retries, acquired)
@@ -0,0 +1,116 @@
+import json
+from os import getenv
+from time import monotonic, sleep, time
+
+from archive import archive_done_notes
+from helpers import db
+from history import compact_events
+from positions import rebalance_positions
+
+
+# How often streams look for new events, how long a single stream is kept open before the
+# browser reconnects (re-running the privilege checks), and how long events are kept in full
+# for the activity feed and undo before being compacted into snapshots (see history.py)
+POLL_INTERVAL = float(getenv("EVENTS_POLL_INTERVAL", 1))
+STREAM_DURATION = float(getenv("EVENTS_STREAM_DURATION", 120))
+HEARTBEAT_INTERVAL = 15
+EVENT_RETENTION = int(getenv("EVENTS_RETENTION", 24 * 3600))
+PRUNE_INTERVAL = 60
+
+# How long deleted notes are kept as tombstones for syncing clients
+TOMBSTONE_RETENTION = int(getenv("TOMBSTONE_RETENTION", 7 * 24 * 3600))
+
+# Last time this worker pruned old events
+last_prune = 0
+
+
+def latest_event_id(topic_id):
+    """
+    Return the id of the newest event of a topic, or 0 if there is none
+    """
+
+    return db.execute("SELECT COALESCE(MAX(id), 0) AS id FROM board_events WHERE topic_id = ?", topic_id)[0]["id"]
+
+
+def compact_tombstones(retention=TOMBSTONE_RETENTION):
+    """
+    Delete note tombstones older than the retention period, raising each affected topic's
+    compacted_version so clients syncing from before it know to reload the whole board
+    Returns the number of tombstones removed
+    """
+
+    cutoff = int(time()) - retention
+
+    with db.transaction():
+        db.execute("""
+                   UPDATE topics SET compacted_version = MAX(compacted_version,
+                       (SELECT MAX(version) FROM notes
+                        WHERE notes.topic_id = topics.id AND deleted = 1 AND deleted_at < ?))
+                   WHERE id IN (SELECT topic_id FROM notes WHERE deleted = 1 AND deleted_at < ?)
+                   """, cutoff, cutoff)
+
+        return db.execute("DELETE FROM notes WHERE deleted = 1 AND deleted_at < ?", cutoff)
+
+
+def prune_events():
+    """
+    Compact events older than the retention period, archive old done notes, compact old tombstones
+    and rebalance columns with long position keys, at most once per interval per worker
+    """
+
+    global last_prune
+    if monotonic() - last_prune < PRUNE_INTERVAL:
+        return
+
+    last_prune = monotonic()
+    compact_events(EVENT_RETENTION)
+    archive_done_notes()
+    compact_tombstones()
+    rebalance_positions()
+
+
+def format_event(event):
+    """
+    Format a board_events row as a Server-Sent Event
+    """
+
+    data = {"note_id": event["note_id"], "content": event["content"], "status": event["status"],
+            "position": event["position"]}
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(topic_id, last_event_id=None):
+    """
+    Yield a topic's events newer than last_event_id as Server-Sent Events, by tailing the
+    board_events table so changes made through any worker reach every viewer
+    """
+
+    if last_event_id is None:
+        last_event_id = latest_event_id(topic_id)
+
+    # Tell the browser how long to wait before reconnecting once the stream ends
+    yield f"retry: {int(POLL_INTERVAL * 1000)}\n\n"
+
+    started = last_heartbeat = monotonic()
+    while monotonic() - started < STREAM_DURATION:
+        events = db.execute("""
+                            SELECT id, kind, note_id, content, status, position
+                            FROM board_events
+                            WHERE topic_id = ? AND id > ?
+                            ORDER BY id
+                            LIMIT 100
+                            """, topic_id, last_event_id)
+
+        for event in events:
+            last_event_id = event["id"]
+            yield format_event(event)
+
+        # Comments keep proxies from closing an idle connection
+        if not events and monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL:
+            last_heartbeat = monotonic()
+            yield ": heartbeat\n\n"
+
+        prune_events()
+
+        if len(events) < 100:
+            sleep(POLL_INTERVAL)
@@ -0,0 +1,140 @@
+import logging
+from collections import OrderedDict
+from os import getenv
+from threading import Lock
+
+from flask import render_template
+from markupsafe import Markup
+
+from helpers import db
+
+
+# Memory budget of each worker's fragment cache, in bytes of rendered HTML
+FRAGMENT_CACHE_BYTES = int(getenv("FRAGMENT_CACHE_BYTES", 16 * 1024 * 1024))
+
+# The cache's stats are logged every this many lookups (0 turns it off), to help tune the budget
+FRAGMENT_CACHE_LOG_INTERVAL = int(getenv("FRAGMENT_CACHE_LOG_INTERVAL", 1000))
+
+logger = logging.getLogger(__name__)
+
+
+class FragmentCache:
+    """
+    LRU cache of rendered template fragments, bounded by the total size of the cached HTML
+    Keys include the version of the data a fragment was rendered from, so writes never have
+    to find and delete entries, stale ones simply stop being used and age out
+    """
+
+    def __init__(self, budget=FRAGMENT_CACHE_BYTES):
+        self.budget = budget
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Return a cached value, or None if it isn't cached
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+            lookups = self.hits + self.misses
+
+        if FRAGMENT_CACHE_LOG_INTERVAL and lookups % FRAGMENT_CACHE_LOG_INTERVAL == 0:
+            logger.info("Fragment cache: %s", self.stats())
+
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value, size):
+        """
+        Cache a value of the given size, evicting the least recently used entries to fit it
+        """
+
+        if size > self.budget:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+            self.entries[key] = (value, size)
+            self.size += size
+
+            while self.size > self.budget:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every entry, keeping the stats
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Return the cache's counters, for tuning its budget
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions,
+                    "entries": len(self.entries),
+                    "bytes": self.size,
+                    "budget": self.budget}
+
+
+fragment_cache = FragmentCache()
+
+
+def team_version(team_id):
+    """
+    Return a team's current version, bumped by triggers on every topic, membership and team write
+    """
+
+    return db.execute("SELECT version FROM teams WHERE id = ?", team_id)[0]["version"]
+
+
+def cached_fragment(key, template, **context):
+    """
+    Render a template, or return its cached rendering for the same key
+    """
+
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(render_template(template, **context))
+        fragment_cache.set(key, html, len(html))
+
+    return html
+
+
+def cached_page(key, template, load):
+    """
+    Return (html, next_cursor, total) for a page of paginated items, only calling load() to query
+    them when the page isn't cached, which returns (template context, next_cursor, total)
+    """
+
+    page = fragment_cache.get(key)
+    if page is None:
+        context, next_cursor, total = load()
+        page = (Markup(render_template(template, **context)), next_cursor, total)
+        fragment_cache.set(key, page, len(page[0]) + len(next_cursor))
+
+    return page
@@ -1,9 +1,130 @@
-from flask import jsonify, render_template, request, session, flash
+from flask import g, jsonify, make_response, render_template, request, session, flash
 from functools import wraps
-from cs50 import SQL
+import re
+from os import getenv
+from threading import Lock
+from time import monotonic
+from urllib.parse import quote
+from database import SQL, DATABASE
 
 
-db = SQL("sqlite:///cloud-board.db")
+db = SQL(DATABASE)
+
+
+# Per-worker cache of resolved authorizations, keyed by (user_id, team_name)
+# Entries are only trusted for a few seconds so other workers' changes show up quickly
+PRIVILEGE_CACHE_TTL = float(getenv("PRIVILEGE_CACHE_TTL", 5))
+PRIVILEGE_CACHE_SIZE = 4096
+
+privilege_cache = {}
+privilege_cache_lock = Lock()
+
+
+def resolve_privilege(user_id, team_name=None):
+    """
+    Resolve the user, the team and the user's privilege in that team with a single query
+    Returns None if the user doesn't exist, otherwise a (team_id, privilege) tuple
+    where team_id is None for unknown teams and privilege is None for non-members
+    """
+
+    key = (user_id, team_name)
+    now = monotonic()
+
+    cached = privilege_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    rows = db.execute("""
+                      SELECT teams.id AS team_id, team_members.privilege
+                      FROM users
+                      LEFT JOIN teams ON teams.name = ?
+                      LEFT JOIN team_members ON team_members.team_id = teams.id
+                        AND team_members.user_id = users.id
+                      WHERE users.id = ?
+                      """, team_name, user_id)
+
+    if not rows:
+        return None
+
+    resolved = (rows[0]["team_id"], rows[0]["privilege"])
+
+    # Only remember successful lookups, so a freshly joined team is usable right away
+    if team_name is None or resolved[1] is not None:
+        with privilege_cache_lock:
+            if len(privilege_cache) >= PRIVILEGE_CACHE_SIZE:
+                for stale_key in [k for k, v in privilege_cache.items() if v[0] <= now]:
+                    del privilege_cache[stale_key]
+                if len(privilege_cache) >= PRIVILEGE_CACHE_SIZE:
+                    privilege_cache.clear()
+            privilege_cache[key] = (now + PRIVILEGE_CACHE_TTL, resolved)
+
+    return resolved
+
+
+def invalidate_privileges(team_id, user_id=None):
+    """
+    Forget cached authorizations for a team, or for a single member of it
+    Must be called whenever memberships, privileges or team names change
+    """
+
+    with privilege_cache_lock:
+        for key in [k for k, v in privilege_cache.items()
+                    if v[1][0] == team_id and (user_id is None or k[0] == user_id)]:
+            del privilege_cache[key]
+
+
+def match_expression(search_query):
+    """
+    Turn a search box input into an FTS5 query where every word has to prefix match a word
+    Input without any searchable words becomes an empty phrase, which matches nothing
+    """
+
+    words = re.findall(r"\w+", search_query)
+    return " ".join(f'"{word}"*' for word in words) or '""'
+
+
+def page_arguments(default_limit=5, max_limit=50):
+    """
+    Return the keyset cursor and page size requested with ?after=<key>&limit=<n>
+    """
+
+    after = request.args.get("after", "")
+
+    try:
+        limit = int(request.args.get("limit", default_limit))
+    except ValueError:
+        limit = default_limit
+
+    return after, max(1, min(limit, max_limit))
+
+
+def split_page(rows, limit, key):
+    """
+    Split limit + 1 fetched rows into the current page and the cursor for the next page
+    The cursor is empty on the last page
+    """
+
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][key]
+    return rows, ""
+
+
+def render_fragment(template, next_cursor, **context):
+    """
+    Render only the paginated items of a page for pagination.js, passing the next cursor in a header
+    """
+
+    return fragment_response(render_template(template, **context), next_cursor)
+
+
+def fragment_response(html, next_cursor):
+    """
+    Respond with already rendered paginated items, passing the next cursor in a header
+    """
+
+    response = make_response(html)
+    response.headers["X-Next-Cursor"] = quote(next_cursor)
+    return response
 
 
 # Adapted from the CS50 Finance's login_required decorator to require dynamic privileges
@@ -24,10 +145,12 @@ def privilege_required(privilege, response_type):
                     flash("You must be logged in to access this page!")
                     return render_template("login.html")
                 
-                user_exists = db.execute("SELECT 1 FROM users WHERE id = ?", session["user_id"])
+                # Resolve user, team and privilege at once, team is None for login only routes
+                team_name = kwargs.get("team_name") if privilege != "login" else None
+                resolved = resolve_privilege(session["user_id"], team_name)
 
                 # Ensure that user exists, if not clear their session and prompt for re-login
-                if not user_exists:
+                if resolved is None:
                     session.clear()
                     if response_type == "json":
                         return jsonify({"success": False, 
@@ -35,31 +158,27 @@ def privilege_required(privilege, response_type):
                     flash("User does not exist!")
                     return render_template("login.html")
 
+                # Store the resolved authorization for the handler to reuse
+                g.team_id, g.privilege = resolved
+
                 if privilege in ["member", "editor", "admin"]:
                     
                     # Check for membership
-                    team_name = kwargs.get("team_name")
-                    team = db.execute("SELECT * FROM teams WHERE name = ?", team_name)
-                    
-                    if not team:
+                    if g.team_id is None:
                         if response_type == "json":
                             return jsonify({"success": False, 
                                             "error": "Requested team for this action does not exist!"})
                             
                         return render_template("error.html", error="Requested team does not exist!")
 
-                    membership = db.execute(
-                        "SELECT privilege FROM team_members WHERE team_id = ? AND user_id = ?",
-                        team[0]["id"], session["user_id"])
-                    
-                    if not membership:
+                    if g.privilege is None:
                         if response_type == "json":
                             return jsonify({"success": False, 
                                             "error": f"You must be a member of {team_name} for this action!"})
                             
                         return render_template("error.html", error=f"You must be a member of {team_name} to access this page!")
 
-                    actual_privilege = membership[0]["privilege"]
+                    actual_privilege = g.privilege
 
                     # Check for required privilege
                     if privilege == "editor":
@@ -0,0 +1,160 @@
+import json
+from os import getenv
+from time import time
+
+from helpers import db
+
+
+# Events older than the retention period (see events.py) are folded into a snapshot of their topic,
+# cut on SNAPSHOT_INTERVAL boundaries so a topic gets at most one snapshot per interval
+SNAPSHOT_INTERVAL = int(getenv("EVENTS_SNAPSHOT_INTERVAL", 3600))
+
+# Snapshots older than this are removed, apart from each topic's latest one which later ones build on
+SNAPSHOT_RETENTION = int(getenv("EVENTS_SNAPSHOT_RETENTION", 30 * 24 * 3600))
+
+
+def replay(notes, events):
+    """
+    Apply events, oldest first, to a topic's notes (a dict of note id -> content, status and position)
+    """
+
+    for event in events:
+        if event["kind"] == "deleted":
+            notes.pop(str(event["note_id"]), None)
+        else:
+            notes[str(event["note_id"])] = {"content": event["content"],
+                                            "status": event["status"],
+                                            "position": event["position"]}
+
+    return notes
+
+
+def state_at(topic_id, event_id):
+    """
+    Return a topic's live notes as of one of its events, from its latest snapshot up to then
+    plus the events since, so event_id can't be older than that snapshot's events
+    """
+
+    snapshot = db.execute("""
+                          SELECT event_id, notes FROM board_snapshots
+                          WHERE topic_id = ? AND event_id <= ?
+                          ORDER BY event_id DESC
+                          LIMIT 1
+                          """, topic_id, event_id)
+
+    notes, since = (json.loads(snapshot[0]["notes"]), snapshot[0]["event_id"]) if snapshot else ({}, 0)
+
+    events = db.execute("""
+                        SELECT kind, note_id, content, status, position
+                        FROM board_events
+                        WHERE topic_id = ? AND id > ? AND id <= ?
+                        ORDER BY id
+                        """, topic_id, since, event_id)
+
+    return replay(notes, events)
+
+
+def compact_events(retention, interval=SNAPSHOT_INTERVAL):
+    """
+    Fold events older than retention seconds into a snapshot per topic and delete them,
+    a topic at a time so concurrent writers aren't held up
+    Returns the number of events removed
+    """
+
+    cutoff = (int(time()) - retention) // interval * interval
+
+    compacted = 0
+    while True:
+        oldest = db.execute("""
+                            SELECT topic_id FROM board_events
+                            WHERE created_at < ?
+                            ORDER BY created_at
+                            LIMIT 1
+                            """, cutoff)
+        if not oldest:
+            return compacted
+        topic_id = oldest[0]["topic_id"]
+
+        with db.transaction():
+            last = db.execute("SELECT MAX(id) AS id FROM board_events WHERE topic_id = ? AND created_at < ?",
+                              topic_id, cutoff)[0]["id"]
+
+            # Deleted topics have nothing left to take a snapshot of
+            if db.execute("SELECT 1 FROM topics WHERE id = ?", topic_id):
+                db.execute("INSERT INTO board_snapshots (topic_id, event_id, as_of, notes) VALUES (?, ?, ?, ?)",
+                           topic_id, last, cutoff, json.dumps(state_at(topic_id, last)))
+                db.execute("DELETE FROM board_snapshots WHERE topic_id = ? AND event_id < ? AND as_of < ?",
+                           topic_id, last, int(time()) - SNAPSHOT_RETENTION)
+
+            compacted += db.execute("DELETE FROM board_events WHERE topic_id = ? AND id <= ?", topic_id, last)
+
+
+def topic_activity(topic_id, after, limit):
+    """
+    Return a page of a topic's changes newest first, with who made them, and the next page's cursor
+    The cursor is the last event's id
+    """
+
+    before = int(after) if after.isdigit() else 2 ** 62
+
+    events = db.execute("""
+                        SELECT board_events.id, kind, note_id, content, status, previous_content, previous_status,
+                        board_events.created_at, users.username
+                        FROM board_events
+                        LEFT JOIN users ON users.id = board_events.user_id
+                        WHERE topic_id = ? AND board_events.id < ?
+                        ORDER BY board_events.id DESC
+                        LIMIT ?
+                        """, topic_id, before, limit + 1)
+
+    if len(events) > limit:
+        return events[:limit], str(events[limit - 1]["id"])
+    return events, ""
+
+
+def latest_change(topic_id, user_id):
+    """
+    Return a user's latest change to a topic's notes, or None if none is left in the log
+    """
+
+    events = db.execute("""
+                        SELECT id, kind, note_id, content, status, position,
+                        previous_content, previous_status, previous_position
+                        FROM board_events
+                        WHERE topic_id = ? AND user_id = ?
+                        ORDER BY id DESC
+                        LIMIT 1
+                        """, topic_id, user_id)
+
+    return events[0] if events else None
+
+
+def revert_change(event, user_id):
+    """
+    Undo a change with a single write, as long as its note is still as the change left it
+    Returns whether the change was undone
+    """
+
+    if event["kind"] == "created":
+        return db.execute("""
+                          UPDATE notes SET deleted = 1, deleted_at = strftime('%s', 'now'), updated_by = ?
+                          WHERE id = ? AND deleted = 0 AND content IS ? AND status IS ? AND position IS ?
+                          """, user_id, event["note_id"], event["content"], event["status"], event["position"]) > 0
+
+    if event["kind"] == "edited":
+        return db.execute("""
+                          UPDATE notes SET content = ?, updated_by = ?
+                          WHERE id = ? AND deleted = 0 AND content IS ?
+                          """, event["previous_content"], user_id, event["note_id"], event["content"]) > 0
+
+    if event["kind"] == "moved":
+        return db.execute("""
+                          UPDATE notes SET status = ?, position = ?, updated_by = ?
+                          WHERE id = ? AND deleted = 0 AND status IS ? AND position IS ?
+                          """, event["previous_status"], event["previous_position"], user_id,
+                          event["note_id"], event["status"], event["position"]) > 0
+
+    return db.execute("""
+                      UPDATE notes SET deleted = 0, deleted_at = NULL, updated_by = ?
+                      WHERE id = ? AND deleted = 1
+                      """, user_id, event["note_id"]) > 0
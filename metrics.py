@@ -0,0 +1,326 @@
+import hmac
+import json
+import re
+import tempfile
+from os import getenv, getpid, getppid, listdir, makedirs, path, remove, replace
+from threading import Lock
+from time import monotonic, perf_counter, time
+
+from flask import g, has_request_context, request
+
+from fragments import fragment_cache
+
+
+# Each worker periodically writes its totals to this directory, /metrics merges every worker's file
+METRICS_DIR = getenv("METRICS_DIR", path.join(tempfile.gettempdir(), "cloud-board-metrics"))
+METRICS_FLUSH_INTERVAL = float(getenv("METRICS_FLUSH_INTERVAL", 5))
+
+# Bearer token required to read /metrics, without one it is only served to localhost
+METRICS_TOKEN = getenv("METRICS_TOKEN")
+
+# Files left by workers of a previous server are removed once they haven't changed for this long
+STALE_AFTER = 3600
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [1, 2, 3, 5, 10, 20, 50, 100]
+
+# How many of a request's slowest statements are listed in its Server-Timing header
+SERVER_TIMING_STATEMENTS = 5
+
+# This worker's totals per route, since it started
+routes = {}
+lock = Lock()
+
+# This worker's write lock contention totals, since it started
+CONTENTION = ("transactions", "waits", "wait_seconds", "retries", "failures")
+contention = dict.fromkeys(CONTENTION, 0)
+
+# Taking the write lock slower than this (in seconds) means another connection held it
+LOCK_WAIT_THRESHOLD = 0.001
+
+# Last time this worker wrote its totals to METRICS_DIR
+last_flush = 0
+
+
+def observe_statement(sql, args, seconds):
+    """
+    Database observer collecting the statements run while handling the current request
+    """
+
+    if has_request_context() and "statements" in g:
+        g.statements.append((sql, seconds))
+
+
+def observe_lock(seconds, retries, acquired):
+    """
+    Database lock observer counting write transactions, the ones that waited for the write lock,
+    their retries and the ones that gave up
+    """
+
+    with lock:
+        contention["transactions"] += 1
+        if seconds >= LOCK_WAIT_THRESHOLD:
+            contention["waits"] += 1
+            contention["wait_seconds"] += seconds
+        contention["retries"] += retries
+        contention["failures"] += not acquired
+
+
+def start_request():
+    """
+    Start timing the current request
+    """
+
+    g.request_started = perf_counter()
+    g.statements = []
+
+
+def new_route():
+    """
+    Return empty totals for a route
+    """
+
+    return {"requests": 0,
+            "seconds": 0.0,
+            "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            "queries": 0,
+            "query_buckets": [0] * (len(QUERY_BUCKETS) + 1),
+            "db_seconds": 0.0}
+
+
+def bucket(buckets, value):
+    """
+    Return the index of the first histogram bucket a value fits in, the last one being +Inf
+    """
+
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            return index
+    return len(buckets)
+
+
+def record(route, seconds, queries, db_seconds):
+    """
+    Add a finished request to its route's totals
+    """
+
+    with lock:
+        totals = routes.get(route)
+        if totals is None:
+            totals = routes[route] = new_route()
+
+        totals["requests"] += 1
+        totals["seconds"] += seconds
+        totals["latency_buckets"][bucket(LATENCY_BUCKETS, seconds)] += 1
+        totals["queries"] += queries
+        totals["query_buckets"][bucket(QUERY_BUCKETS, queries)] += 1
+        totals["db_seconds"] += db_seconds
+
+
+def describe(sql):
+    """
+    Shorten a statement into a Server-Timing description
+    """
+
+    description = " ".join(sql.split())
+    description = re.sub(r'["\\]', "", description)
+    return description if len(description) <= 60 else description[:57] + "..."
+
+
+def server_timing(seconds, statements, db_seconds):
+    """
+    Format a request's total time, database time and slowest statements as a Server-Timing header
+    """
+
+    entries = [f'db;dur={db_seconds * 1000:.2f};desc="{len(statements)} queries"']
+
+    slowest = sorted(statements, key=lambda statement: statement[1], reverse=True)[:SERVER_TIMING_STATEMENTS]
+    for number, (sql, statement_seconds) in enumerate(slowest, 1):
+        entries.append(f'sql-{number};dur={statement_seconds * 1000:.2f};desc="{describe(sql)}"')
+
+    entries.append(f"total;dur={seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def finish_request(response):
+    """
+    Record the current request in its route's totals and add its Server-Timing header
+    """
+
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+
+    seconds = perf_counter() - started
+    statements = g.pop("statements", [])
+    db_seconds = sum(statement_seconds for _, statement_seconds in statements)
+
+    record(request.endpoint or "unmatched", seconds, len(statements), db_seconds)
+    response.headers["Server-Timing"] = server_timing(seconds, statements, db_seconds)
+
+    flush()
+    return response
+
+
+def snapshot():
+    """
+    Return this worker's totals, including its fragment cache's and write lock counters
+    """
+
+    with lock:
+        totals = {route: dict(values, latency_buckets=list(values["latency_buckets"]),
+                              query_buckets=list(values["query_buckets"]))
+                  for route, values in routes.items()}
+        lock_totals = dict(contention)
+
+    return {"routes": totals, "fragment_cache": fragment_cache.stats(), "contention": lock_totals}
+
+
+def worker_file(pid=None):
+    """
+    Return the metrics file of a worker, prefixed by its parent (e.g. gunicorn's master) process
+    """
+
+    return path.join(METRICS_DIR, f"{getppid()}-{pid or getpid()}.json")
+
+
+def flush(force=False):
+    """
+    Write this worker's totals to its metrics file, at most once per interval unless forced
+    """
+
+    global last_flush
+    if not force and monotonic() - last_flush < METRICS_FLUSH_INTERVAL:
+        return
+
+    last_flush = monotonic()
+    makedirs(METRICS_DIR, exist_ok=True)
+
+    # Written to a temporary file first, so readers never see a partial one
+    filename = worker_file()
+    with open(filename + ".tmp", "w") as file:
+        json.dump(snapshot(), file)
+    replace(filename + ".tmp", filename)
+
+
+def collect():
+    """
+    Merge the totals of every worker of this server, this worker's being read from memory
+    """
+
+    snapshots = [snapshot()]
+    prefix = f"{getppid()}-"
+
+    try:
+        filenames = listdir(METRICS_DIR)
+    except FileNotFoundError:
+        filenames = []
+
+    for filename in filenames:
+        filepath = path.join(METRICS_DIR, filename)
+        if not filename.endswith(".json") or filepath == worker_file():
+            continue
+
+        try:
+            if not filename.startswith(prefix):
+                if time() - path.getmtime(filepath) > STALE_AFTER:
+                    remove(filepath)
+                continue
+
+            with open(filepath) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+
+    merged = {"routes": {}, "fragment_cache": {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0},
+              "contention": dict.fromkeys(CONTENTION, 0)}
+    for worker in snapshots:
+        for route, values in worker["routes"].items():
+            totals = merged["routes"].setdefault(route, new_route())
+            for name, value in values.items():
+                if isinstance(value, list):
+                    totals[name] = [a + b for a, b in zip(totals[name], value)]
+                else:
+                    totals[name] += value
+
+        for name in merged["fragment_cache"]:
+            merged["fragment_cache"][name] += worker["fragment_cache"][name]
+
+        for name in merged["contention"]:
+            merged["contention"][name] += worker.get("contention", {}).get(name, 0)
+
+    return merged
+
+
+def histogram(lines, name, route, buckets, counts, total):
+    """
+    Append a route's histogram samples in Prometheus' cumulative format
+    """
+
+    cumulative = 0
+    for bound, count in zip(buckets + ["+Inf"], counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{route="{route}"}} {total}')
+    lines.append(f'{name}_count{{route="{route}"}} {cumulative}')
+
+
+def render_metrics():
+    """
+    Render every worker's merged totals in Prometheus' text exposition format
+    """
+
+    merged = collect()
+    routes_totals = sorted(merged["routes"].items())
+    lines = []
+
+    lines.append("# HELP cloudboard_request_duration_seconds Time spent handling requests, by route")
+    lines.append("# TYPE cloudboard_request_duration_seconds histogram")
+    for route, totals in routes_totals:
+        histogram(lines, "cloudboard_request_duration_seconds", route,
+                  LATENCY_BUCKETS, totals["latency_buckets"], totals["seconds"])
+
+    lines.append("# HELP cloudboard_db_queries_per_request SQL statements run per request, by route")
+    lines.append("# TYPE cloudboard_db_queries_per_request histogram")
+    for route, totals in routes_totals:
+        histogram(lines, "cloudboard_db_queries_per_request", route,
+                  QUERY_BUCKETS, totals["query_buckets"], totals["queries"])
+
+    lines.append("# HELP cloudboard_db_duration_seconds_total Time spent running SQL statements, by route")
+    lines.append("# TYPE cloudboard_db_duration_seconds_total counter")
+    for route, totals in routes_totals:
+        lines.append(f'cloudboard_db_duration_seconds_total{{route="{route}"}} {totals["db_seconds"]}')
+
+    cache = merged["fragment_cache"]
+    for name, kind, description in [("hits", "counter", "Fragment cache lookups that were cached"),
+                                    ("misses", "counter", "Fragment cache lookups that had to render"),
+                                    ("evictions", "counter", "Fragments evicted to stay within the memory budget"),
+                                    ("entries", "gauge", "Fragments currently cached"),
+                                    ("bytes", "gauge", "Size of the currently cached fragments")]:
+        metric = f"cloudboard_fragment_cache_{name}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {cache[name]}")
+
+    for name, description in [("transactions", "Write transactions started"),
+                              ("waits", "Write transactions that waited for another connection's write lock"),
+                              ("wait_seconds", "Time spent waiting for the write lock"),
+                              ("retries", "Retries of write transactions that timed out waiting for the write lock"),
+                              ("failures", "Write transactions that gave up waiting for the write lock")]:
+        metric = f"cloudboard_db_write_{name}_total"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {merged['contention'][name]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_allowed():
+    """
+    Check whether the current request may read the metrics
+    """
+
+    if METRICS_TOKEN:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+
+    return request.remote_addr in ("127.0.0.1", "::1")
@@ -0,0 +1,132 @@
+import click
+import re
+import sqlite3
+from flask.cli import AppGroup
+from database import DATABASE
+from os import listdir, path
+
+
+MIGRATIONS_DIR = path.join(path.dirname(path.abspath(__file__)), "migrations")
+
+# Migration scripts are named NNNN_description.sql and applied in order
+MIGRATION_PATTERN = re.compile(r"^(\d{4})_\w+\.sql$")
+
+# Set once the schema has been confirmed up to date, so the check runs once per worker
+schema_checked = False
+
+
+def load_migrations():
+    """
+    Return a sorted list of (version, filename) for every migration script
+    """
+
+    migrations = []
+    for filename in listdir(MIGRATIONS_DIR):
+        match = MIGRATION_PATTERN.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), filename))
+
+    migrations.sort()
+    return migrations
+
+
+def latest_version():
+    """
+    Return the schema version the code expects
+    """
+
+    migrations = load_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(database):
+    """
+    Return the schema version stored in the database's user_version header
+    """
+
+    connection = sqlite3.connect(database)
+    try:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def upgrade(database):
+    """
+    Apply every migration newer than the database's user_version, each in its own transaction
+    Returns the list of applied migration filenames
+    """
+
+    connection = sqlite3.connect(database, isolation_level=None)
+    applied = []
+
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+
+        for migration_version, filename in load_migrations():
+            if migration_version <= version:
+                continue
+
+            with open(path.join(MIGRATIONS_DIR, filename)) as file:
+                script = file.read()
+
+            # The version bump is part of the transaction, so a failed script leaves no trace
+            try:
+                connection.executescript(f"BEGIN IMMEDIATE;\n{script}\n"
+                                         f"PRAGMA user_version = {migration_version};\nCOMMIT;")
+            except sqlite3.Error:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+
+            applied.append(filename)
+    finally:
+        connection.close()
+
+    return applied
+
+
+def check_schema(database):
+    """
+    Ensure the database schema matches the code, raising an error if a migration is missing
+    """
+
+    global schema_checked
+    if schema_checked:
+        return
+
+    expected = latest_version()
+    actual = current_version(database)
+
+    if actual < expected:
+        raise RuntimeError(f"Database schema is at version {actual} but version {expected} is required, "
+                           "please run 'flask db upgrade'!")
+    if actual > expected:
+        raise RuntimeError(f"Database schema version {actual} is newer than this code supports ({expected})!")
+
+    schema_checked = True
+
+
+db_cli = AppGroup("db", help="Manage the database schema.")
+
+
+@db_cli.command("upgrade")
+def upgrade_command():
+    """
+    Apply pending migrations to the database
+    """
+
+    applied = upgrade(DATABASE)
+    for filename in applied:
+        click.echo(f"Applied {filename}")
+
+    click.echo(f"Database is at version {current_version(DATABASE)}")
+
+
+@db_cli.command("version")
+def version_command():
+    """
+    Show the current and expected schema versions
+    """
+
+    click.echo(f"Database version: {current_version(DATABASE)}, expected version: {latest_version()}")
@@ -0,0 +1,50 @@
+-- Initial schema for Cloud-Board, along with the indexes the routes in app.py filter and sort by
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS teams (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    code TEXT NOT NULL,
+    description TEXT,
+    access_type TEXT NOT NULL CHECK (access_type IN ('public', 'private'))
+);
+
+-- Keyed by (team_id, user_id) without a rowid, so privilege lookups never leave the primary key
+CREATE TABLE IF NOT EXISTS team_members (
+    team_id INTEGER NOT NULL REFERENCES teams(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    privilege TEXT NOT NULL CHECK (privilege IN ('admin', 'editor', 'drag-only')),
+    PRIMARY KEY (team_id, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    team_id INTEGER NOT NULL REFERENCES teams(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    content TEXT NOT NULL,
+    status TEXT NOT NULL,
+    topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE
+);
+
+-- Team names are looked up by privilege_required on every team route
+CREATE UNIQUE INDEX IF NOT EXISTS teams_name ON teams (name);
+
+-- Public teams in name order for explore
+CREATE INDEX IF NOT EXISTS teams_access_type_name ON teams (access_type, name);
+
+-- Covers the "teams of a user" lookups in teams, explore and the 20 team limit checks
+CREATE INDEX IF NOT EXISTS team_members_user ON team_members (user_id, team_id, privilege);
+
+-- Topics are resolved by (team, name) on every board route and listed by name on team pages
+CREATE UNIQUE INDEX IF NOT EXISTS topics_team_name ON topics (team_id, name);
+
+CREATE INDEX IF NOT EXISTS notes_topic ON notes (topic_id);
@@ -0,0 +1,29 @@
+-- Precomputed counters for totals that would otherwise need a full table scan to display
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Number of public teams, used for the page count on explore
+INSERT OR REPLACE INTO counters (name, value)
+SELECT 'public_teams', COUNT(*) FROM teams WHERE access_type = 'public';
+
+CREATE TRIGGER IF NOT EXISTS teams_public_insert AFTER INSERT ON teams
+WHEN NEW.access_type = 'public'
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'public_teams';
+END;
+
+CREATE TRIGGER IF NOT EXISTS teams_public_delete AFTER DELETE ON teams
+WHEN OLD.access_type = 'public'
+BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'public_teams';
+END;
+
+CREATE TRIGGER IF NOT EXISTS teams_public_update AFTER UPDATE OF access_type ON teams
+WHEN OLD.access_type != NEW.access_type
+BEGIN
+    UPDATE counters SET value = value + (CASE WHEN NEW.access_type = 'public' THEN 1 ELSE -1 END)
+    WHERE name = 'public_teams';
+END;
@@ -0,0 +1,69 @@
+-- Full-text search indexes for the search boxes, kept in sync with their tables by triggers
+-- The prefix indexes make the per-keystroke prefix queries cheap
+
+CREATE VIRTUAL TABLE IF NOT EXISTS teams_search USING fts5(
+    name, description, content='teams', content_rowid='id', prefix='2 3'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(
+    username, content='users', content_rowid='id', prefix='2 3'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS topics_search USING fts5(
+    name, content='topics', content_rowid='id', prefix='2 3'
+);
+
+INSERT INTO teams_search (teams_search) VALUES ('rebuild');
+INSERT INTO users_search (users_search) VALUES ('rebuild');
+INSERT INTO topics_search (topics_search) VALUES ('rebuild');
+
+
+CREATE TRIGGER IF NOT EXISTS teams_search_insert AFTER INSERT ON teams
+BEGIN
+    INSERT INTO teams_search (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS teams_search_delete AFTER DELETE ON teams
+BEGIN
+    INSERT INTO teams_search (teams_search, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS teams_search_update AFTER UPDATE OF name, description ON teams
+BEGIN
+    INSERT INTO teams_search (teams_search, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+    INSERT INTO teams_search (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+END;
+
+
+CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users
+BEGIN
+    INSERT INTO users_search (rowid, username) VALUES (NEW.id, NEW.username);
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users
+BEGIN
+    INSERT INTO users_search (users_search, rowid, username) VALUES ('delete', OLD.id, OLD.username);
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF username ON users
+BEGIN
+    INSERT INTO users_search (users_search, rowid, username) VALUES ('delete', OLD.id, OLD.username);
+    INSERT INTO users_search (rowid, username) VALUES (NEW.id, NEW.username);
+END;
+
+
+CREATE TRIGGER IF NOT EXISTS topics_search_insert AFTER INSERT ON topics
+BEGIN
+    INSERT INTO topics_search (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS topics_search_delete AFTER DELETE ON topics
+BEGIN
+    INSERT INTO topics_search (topics_search, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS topics_search_update AFTER UPDATE OF name ON topics
+BEGIN
+    INSERT INTO topics_search (topics_search, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+    INSERT INTO topics_search (rowid, name) VALUES (NEW.id, NEW.name);
+END;
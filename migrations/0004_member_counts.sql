@@ -0,0 +1,20 @@
+-- Denormalized membership counts, kept exact by triggers on team_members
+-- 'flask recount' recomputes them should they ever drift
+
+ALTER TABLE teams ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN team_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE teams SET member_count = (SELECT COUNT(*) FROM team_members WHERE team_members.team_id = teams.id);
+UPDATE users SET team_count = (SELECT COUNT(*) FROM team_members WHERE team_members.user_id = users.id);
+
+CREATE TRIGGER IF NOT EXISTS team_members_count_insert AFTER INSERT ON team_members
+BEGIN
+    UPDATE teams SET member_count = member_count + 1 WHERE id = NEW.team_id;
+    UPDATE users SET team_count = team_count + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS team_members_count_delete AFTER DELETE ON team_members
+BEGIN
+    UPDATE teams SET member_count = member_count - 1 WHERE id = OLD.team_id;
+    UPDATE users SET team_count = team_count - 1 WHERE id = OLD.user_id;
+END;
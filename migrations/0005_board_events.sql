@@ -0,0 +1,41 @@
+-- Note changes published to board viewers, tailed by the Server-Sent Events streams of every worker
+-- Filled by triggers so every write path publishes, and pruned once events are older than a viewer could miss
+
+CREATE TABLE IF NOT EXISTS board_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic_id INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('created', 'edited', 'moved', 'deleted')),
+    note_id INTEGER NOT NULL,
+    content TEXT,
+    status TEXT,
+    created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS board_events_topic ON board_events (topic_id, id);
+CREATE INDEX IF NOT EXISTS board_events_created_at ON board_events (created_at);
+
+CREATE TRIGGER IF NOT EXISTS notes_event_insert AFTER INSERT ON notes
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status)
+    VALUES (NEW.topic_id, 'created', NEW.id, NEW.content, NEW.status);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_event_edit AFTER UPDATE OF content ON notes
+WHEN OLD.content IS NOT NEW.content
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status)
+    VALUES (NEW.topic_id, 'edited', NEW.id, NEW.content, NEW.status);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_event_move AFTER UPDATE OF status ON notes
+WHEN OLD.status IS NOT NEW.status
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status)
+    VALUES (NEW.topic_id, 'moved', NEW.id, NEW.content, NEW.status);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_event_delete AFTER DELETE ON notes
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id)
+    VALUES (OLD.topic_id, 'deleted', OLD.id);
+END;
@@ -0,0 +1,18 @@
+-- Per-topic version counter bumped by every note write, used as the ETag of the board's notes
+
+ALTER TABLE topics ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS notes_version_insert AFTER INSERT ON notes
+BEGIN
+    UPDATE topics SET version = version + 1 WHERE id = NEW.topic_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_version_update AFTER UPDATE ON notes
+BEGIN
+    UPDATE topics SET version = version + 1 WHERE id = NEW.topic_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_version_delete AFTER DELETE ON notes
+BEGIN
+    UPDATE topics SET version = version + 1 WHERE id = OLD.topic_id;
+END;
@@ -0,0 +1,40 @@
+-- Change versions and soft-delete tombstones for notes, so clients can sync only what changed
+-- Every note write stamps the note with its topic's new version, deletions leave a tombstone
+-- that is compacted away later, raising the topic's compacted_version
+
+ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE notes ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE notes ADD COLUMN deleted_at INTEGER;
+ALTER TABLE topics ADD COLUMN compacted_version INTEGER NOT NULL DEFAULT 0;
+
+UPDATE notes SET version = (SELECT version FROM topics WHERE topics.id = notes.topic_id);
+
+CREATE INDEX IF NOT EXISTS notes_topic_version ON notes (topic_id, version);
+CREATE INDEX IF NOT EXISTS notes_tombstones ON notes (deleted_at) WHERE deleted = 1;
+
+-- Stamping the version only touches the version column, so it doesn't fire these triggers again
+DROP TRIGGER IF EXISTS notes_version_insert;
+DROP TRIGGER IF EXISTS notes_version_update;
+DROP TRIGGER IF EXISTS notes_version_delete;
+
+CREATE TRIGGER notes_version_insert AFTER INSERT ON notes
+BEGIN
+    UPDATE topics SET version = version + 1 WHERE id = NEW.topic_id;
+    UPDATE notes SET version = (SELECT version FROM topics WHERE id = NEW.topic_id) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER notes_version_update AFTER UPDATE OF content, status, deleted ON notes
+BEGIN
+    UPDATE topics SET version = version + 1 WHERE id = NEW.topic_id;
+    UPDATE notes SET version = (SELECT version FROM topics WHERE id = NEW.topic_id) WHERE id = NEW.id;
+END;
+
+-- Deleting a note now means setting its tombstone, hard deletes only happen during compaction
+DROP TRIGGER IF EXISTS notes_event_delete;
+
+CREATE TRIGGER notes_event_delete AFTER UPDATE OF deleted ON notes
+WHEN NEW.deleted AND NOT OLD.deleted
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id)
+    VALUES (NEW.topic_id, 'deleted', NEW.id);
+END;
@@ -0,0 +1,15 @@
+-- Server-side sessions for the sqlite session backend, expired rows are purged in batches
+-- user_id lets every session of a user be revoked at once
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY NOT NULL,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    data BLOB NOT NULL,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+CREATE INDEX IF NOT EXISTS sessions_user ON sessions (user_id);
+
+-- Signed cookie sessions carry the version they were issued at, bumping it revokes them all
+ALTER TABLE users ADD COLUMN session_version INTEGER NOT NULL DEFAULT 0;
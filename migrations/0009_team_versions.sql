@@ -0,0 +1,40 @@
+-- Per-team version counter bumped by topic, membership and team writes, so fragments rendered
+-- from a team's data can be cached under its version and every worker sees a write at once
+
+ALTER TABLE teams ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS topics_team_version_insert AFTER INSERT ON topics
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id = NEW.team_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS topics_team_version_update AFTER UPDATE OF name, team_id ON topics
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id IN (OLD.team_id, NEW.team_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS topics_team_version_delete AFTER DELETE ON topics
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id = OLD.team_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS team_members_version_insert AFTER INSERT ON team_members
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id = NEW.team_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS team_members_version_update AFTER UPDATE OF privilege ON team_members
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id = NEW.team_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS team_members_version_delete AFTER DELETE ON team_members
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id = OLD.team_id;
+END;
+
+-- Only columns shown to users, the version and counter columns are updated by triggers
+CREATE TRIGGER IF NOT EXISTS teams_version_update AFTER UPDATE OF name, description, code, access_type ON teams
+BEGIN
+    UPDATE teams SET version = version + 1 WHERE id = NEW.id;
+END;
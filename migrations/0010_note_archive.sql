@@ -0,0 +1,41 @@
+-- Archive of done notes, which are moved out of notes in batches once they have been done for a
+-- while so boards only load active work (see archive.py)
+
+ALTER TABLE notes ADD COLUMN done_at INTEGER;
+
+UPDATE notes SET done_at = strftime('%s', 'now') WHERE status = 'done';
+
+-- Note ids get reused once their tombstones are compacted, so archived notes have ids of their own
+CREATE TABLE IF NOT EXISTS archived_notes (
+    id INTEGER PRIMARY KEY,
+    note_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+    done_at INTEGER NOT NULL,
+    archived_at INTEGER NOT NULL
+);
+
+-- The archive view pages through a topic's done notes newest first
+CREATE INDEX IF NOT EXISTS archived_notes_topic_done ON archived_notes (topic_id, done_at, note_id);
+
+-- Boards load their live columns and their latest done notes through this index
+CREATE INDEX IF NOT EXISTS notes_topic_status ON notes (topic_id, status, done_at);
+
+-- Its leading column serves every lookup the old topic index did
+DROP INDEX IF EXISTS notes_topic;
+
+-- The archiving job finds the oldest done notes of every topic
+CREATE INDEX IF NOT EXISTS notes_done_at ON notes (done_at) WHERE status = 'done' AND deleted = 0;
+
+-- Stamping done_at doesn't fire any other trigger
+CREATE TRIGGER IF NOT EXISTS notes_done_insert AFTER INSERT ON notes
+WHEN NEW.status = 'done'
+BEGIN
+    UPDATE notes SET done_at = strftime('%s', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_done_update AFTER UPDATE OF status ON notes
+WHEN NEW.status IS NOT OLD.status
+BEGIN
+    UPDATE notes SET done_at = CASE WHEN NEW.status = 'done' THEN strftime('%s', 'now') END WHERE id = NEW.id;
+END;
@@ -0,0 +1,50 @@
+-- Order of the notes within a board column, as fractional position keys (see positions.py),
+-- so moving a note rewrites only its own key however many notes its column holds
+
+ALTER TABLE notes ADD COLUMN position TEXT NOT NULL DEFAULT '';
+
+-- Existing notes keep their creation order, with odd keys that never end in the zero digit
+UPDATE notes SET position = numbered.position
+FROM (SELECT id, printf('%06d', 2 * ROW_NUMBER() OVER (PARTITION BY topic_id, status ORDER BY id) - 1) AS position
+      FROM notes) AS numbered
+WHERE notes.id = numbered.id;
+
+ALTER TABLE board_events ADD COLUMN position TEXT;
+
+-- Reordering a note within its column is a move too, and bumps the versions syncing clients follow
+DROP TRIGGER IF EXISTS notes_event_insert;
+DROP TRIGGER IF EXISTS notes_event_edit;
+DROP TRIGGER IF EXISTS notes_event_move;
+DROP TRIGGER IF EXISTS notes_version_update;
+
+CREATE TRIGGER notes_event_insert AFTER INSERT ON notes
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position)
+    VALUES (NEW.topic_id, 'created', NEW.id, NEW.content, NEW.status, NEW.position);
+END;
+
+CREATE TRIGGER notes_event_edit AFTER UPDATE OF content ON notes
+WHEN OLD.content IS NOT NEW.content
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position)
+    VALUES (NEW.topic_id, 'edited', NEW.id, NEW.content, NEW.status, NEW.position);
+END;
+
+CREATE TRIGGER notes_event_move AFTER UPDATE OF status, position ON notes
+WHEN OLD.status IS NOT NEW.status OR OLD.position IS NOT NEW.position
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position)
+    VALUES (NEW.topic_id, 'moved', NEW.id, NEW.content, NEW.status, NEW.position);
+END;
+
+CREATE TRIGGER notes_version_update AFTER UPDATE OF content, status, deleted, position ON notes
+BEGIN
+    UPDATE topics SET version = version + 1 WHERE id = NEW.topic_id;
+    UPDATE notes SET version = (SELECT version FROM topics WHERE id = NEW.topic_id) WHERE id = NEW.id;
+END;
+
+-- Boards read each live column already in order, and drops look up a card's neighbours
+CREATE INDEX IF NOT EXISTS notes_topic_status_position ON notes (topic_id, status, position);
+
+-- The rebalancing job finds the columns whose keys have grown too long
+CREATE INDEX IF NOT EXISTS notes_long_positions ON notes (topic_id, status) WHERE length(position) > 12;
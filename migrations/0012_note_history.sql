@@ -0,0 +1,77 @@
+-- board_events becomes the topics' append-only history: every event records who made the change
+-- and what the note looked like before it, for the activity feed and undo (see history.py),
+-- and old events are compacted into per-topic snapshots instead of being dropped
+
+-- Written by the same statement that changes the note, so the event triggers can record it
+ALTER TABLE notes ADD COLUMN updated_by INTEGER;
+
+ALTER TABLE board_events ADD COLUMN user_id INTEGER;
+ALTER TABLE board_events ADD COLUMN previous_content TEXT;
+ALTER TABLE board_events ADD COLUMN previous_status TEXT;
+ALTER TABLE board_events ADD COLUMN previous_position TEXT;
+
+-- Undo looks up a user's latest change in a topic
+CREATE INDEX IF NOT EXISTS board_events_topic_user ON board_events (topic_id, user_id, id);
+
+-- A topic's live notes as of one of its events, as a JSON object of note id -> content, status and position
+CREATE TABLE IF NOT EXISTS board_snapshots (
+    id INTEGER PRIMARY KEY,
+    topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+    event_id INTEGER NOT NULL,
+    as_of INTEGER NOT NULL,
+    notes TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS board_snapshots_topic ON board_snapshots (topic_id, event_id);
+
+-- Every topic starts from its current notes, the events kept so far are already reflected in them
+INSERT INTO board_snapshots (topic_id, event_id, as_of, notes)
+SELECT topics.id,
+       COALESCE((SELECT MAX(id) FROM board_events WHERE board_events.topic_id = topics.id), 0),
+       strftime('%s', 'now'),
+       (SELECT json_group_object(notes.id, json_object('content', content, 'status', status, 'position', position))
+        FROM notes WHERE notes.topic_id = topics.id AND deleted = 0)
+FROM topics;
+
+DROP TRIGGER IF EXISTS notes_event_insert;
+DROP TRIGGER IF EXISTS notes_event_edit;
+DROP TRIGGER IF EXISTS notes_event_move;
+DROP TRIGGER IF EXISTS notes_event_delete;
+
+CREATE TRIGGER notes_event_insert AFTER INSERT ON notes
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position, user_id)
+    VALUES (NEW.topic_id, 'created', NEW.id, NEW.content, NEW.status, NEW.position, NEW.updated_by);
+END;
+
+CREATE TRIGGER notes_event_edit AFTER UPDATE OF content ON notes
+WHEN OLD.content IS NOT NEW.content
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position, user_id, previous_content)
+    VALUES (NEW.topic_id, 'edited', NEW.id, NEW.content, NEW.status, NEW.position, NEW.updated_by, OLD.content);
+END;
+
+CREATE TRIGGER notes_event_move AFTER UPDATE OF status, position ON notes
+WHEN OLD.status IS NOT NEW.status OR OLD.position IS NOT NEW.position
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position, user_id,
+                              previous_status, previous_position)
+    VALUES (NEW.topic_id, 'moved', NEW.id, NEW.content, NEW.status, NEW.position, NEW.updated_by,
+            OLD.status, OLD.position);
+END;
+
+-- Deletes keep what was deleted, so the activity feed can show it
+CREATE TRIGGER notes_event_delete AFTER UPDATE OF deleted ON notes
+WHEN NEW.deleted AND NOT OLD.deleted
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position, user_id)
+    VALUES (NEW.topic_id, 'deleted', NEW.id, NEW.content, NEW.status, NEW.position, NEW.updated_by);
+END;
+
+-- Undoing a delete brings the note back, which boards and the history see as it being created again
+CREATE TRIGGER notes_event_restore AFTER UPDATE OF deleted ON notes
+WHEN OLD.deleted AND NOT NEW.deleted
+BEGIN
+    INSERT INTO board_events (topic_id, kind, note_id, content, status, position, user_id)
+    VALUES (NEW.topic_id, 'created', NEW.id, NEW.content, NEW.status, NEW.position, NEW.updated_by);
+END;
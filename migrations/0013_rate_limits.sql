@@ -0,0 +1,11 @@
+-- Token buckets of the API rate limits, shared by every worker (see ratelimit.py)
+-- full_at is when a bucket has refilled completely, after which it can be purged
+
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    full_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS rate_limits_full_at ON rate_limits (full_at);
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+from os import getenv, getpid
+from threading import Lock
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# Hash method in werkzeug's format, e.g. "scrypt", "scrypt:16384:8:1" or "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = getenv("PASSWORD_HASH_METHOD", "scrypt")
+
+# Processes hashing passwords for each app worker (0 hashes inline in the request thread), and how
+# many hashes may be running or waiting at once before new requests are turned away
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(getenv("PASSWORD_HASH_QUEUE", 8))
+
+# Seconds clients are asked to wait before retrying when hashing is saturated
+RETRY_AFTER = 1
+
+pool = None
+pool_pid = None
+pending = 0
+lock = Lock()
+
+# Method prefix of hashes made with PASSWORD_HASH_METHOD, filled in on first use
+current_method = None
+
+
+class PasswordHashingBusy(Exception):
+    """
+    Raised when too many passwords are already being hashed, instead of queueing the request
+    """
+
+
+def hash_method(password_hash):
+    """
+    Return the method prefix of a werkzeug password hash, e.g. "scrypt:32768:8:1"
+    """
+
+    return password_hash.split("$", 1)[0]
+
+
+def verify(password_hash, password, method):
+    """
+    Check a password against its hash, returning whether it matched and,
+    if it did but was made with a different method, a new hash to store instead
+    """
+
+    if not check_password_hash(password_hash, password):
+        return False, None
+
+    new_hash = generate_password_hash(password, method)
+    if hash_method(new_hash) == hash_method(password_hash):
+        return True, None
+
+    return True, new_hash
+
+
+def run(function, *args):
+    """
+    Run a hashing function in the worker's process pool, rejecting it straight away when
+    the pool's queue is full so request threads never pile up behind hashing
+    """
+
+    global pool, pool_pid, pending
+
+    if PASSWORD_HASH_WORKERS <= 0:
+        return function(*args)
+
+    with lock:
+        if pending >= PASSWORD_HASH_QUEUE:
+            raise PasswordHashingBusy("Too many sign in attempts right now, please try again shortly!")
+        pending += 1
+
+        # Each app worker starts its own pool on first use, the forked processes only ever hash
+        if pool is None or pool_pid != getpid():
+            pool = ProcessPoolExecutor(PASSWORD_HASH_WORKERS)
+            pool_pid = getpid()
+
+    try:
+        return pool.submit(function, *args).result()
+    finally:
+        with lock:
+            pending -= 1
+
+
+def hash_password(password):
+    """
+    Hash a password with the configured method
+    """
+
+    return run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    """
+    Check a password against its hash, returning (valid, new_hash) where new_hash is set
+    when the stored hash was made with an older or different method and should be replaced
+    """
+
+    global current_method
+
+    # Matching hashes only need to be compared, rehashing to learn the method is done once
+    if current_method is not None and hash_method(password_hash) == current_method:
+        return run(check_password_hash, password_hash, password), None
+
+    valid, new_hash = run(verify, password_hash, password, PASSWORD_HASH_METHOD)
+    if valid:
+        current_method = hash_method(new_hash) if new_hash else hash_method(password_hash)
+
+    return valid, new_hash
@@ -0,0 +1,175 @@
+from helpers import db
+
+
+# Position keys are strings of these digits, compared as plain (binary collated) text, so a key
+# can always be found between two others and moving a note only ever rewrites its own key
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# Columns holding a key longer than this are rebalanced, the same length is baked into the
+# notes_long_positions partial index (see migrations/0011_note_positions.sql)
+POSITION_MAX_LENGTH = 12
+
+
+def midpoint(low, high):
+    """
+    Return a key between low and high (None meaning no upper bound), neither ending in the zero digit
+    """
+
+    if high is not None:
+
+        # Keep the common prefix, treating the shorter key as padded with zeros
+        common = 0
+        while common < len(high) and (low[common] if common < len(low) else "0") == high[common]:
+            common += 1
+        if common:
+            return high[:common] + midpoint(low[common:], high[common:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+
+    # Consecutive digits, the key has to go one digit deeper
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + midpoint(low[1:], None)
+
+
+def key_between(before, after):
+    """
+    Return a position key sorting after before and before after, either of which may be None
+    Appending and prepending step a single digit, so repeated ones grow keys slowly
+    """
+
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"No position between {before!r} and {after!r}")
+    if after == "" or (after is not None and after.strip("0") == ""):
+        raise ValueError(f"No position before {after!r}")
+
+    before = before or ""
+
+    if after is None:
+        for index, digit in enumerate(before):
+            if digit != DIGITS[-1]:
+                return before[:index] + DIGITS[DIGITS.index(digit) + 1]
+        return before + midpoint("", None)
+
+    if not before:
+        for index, digit in enumerate(after):
+            if DIGITS.index(digit) > 1:
+                return after[:index] + DIGITS[DIGITS.index(digit) - 1]
+
+    return midpoint(before, after)
+
+
+def spread_keys(count):
+    """
+    Return count evenly spaced keys of the shortest length that leaves room between them
+    """
+
+    length = 1
+    while BASE ** length < (count + 1) * BASE:
+        length += 1
+
+    step = BASE ** length // (count + 1)
+    keys = []
+    for n in range(1, count + 1):
+        value = step * n
+
+        # Keys never end in the zero digit, there would be no room left just before them
+        if value % BASE == 0:
+            value += 1
+
+        digits = []
+        for _ in range(length):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append("".join(reversed(digits)))
+
+    return keys
+
+
+def rebalance_column(topic_id, status):
+    """
+    Give the notes of a board column evenly spaced short keys, keeping their order
+    """
+
+    with db.transaction():
+        notes = db.execute("""
+                           SELECT id FROM notes
+                           WHERE topic_id = ? AND status = ? AND deleted = 0
+                           ORDER BY position, id
+                           """, topic_id, status)
+
+        # Renumbering isn't anyone's change, so it stays out of the history users undo from
+        for note, key in zip(notes, spread_keys(len(notes))):
+            db.execute("UPDATE notes SET position = ?, updated_by = NULL WHERE id = ? AND position IS NOT ?",
+                       key, note["id"], key)
+
+    return len(notes)
+
+
+def rebalance_positions():
+    """
+    Rebalance every column holding keys longer than POSITION_MAX_LENGTH
+    Returns the number of columns rebalanced
+    """
+
+    # The planner can't tell how few notes the partial index holds, so it is named outright
+    columns = db.execute("""
+                         SELECT DISTINCT topic_id, status FROM notes INDEXED BY notes_long_positions
+                         WHERE length(position) > 12
+                         """)
+
+    for column in columns:
+        rebalance_column(column["topic_id"], column["status"])
+
+    return len(columns)
+
+
+def note_position(topic_id, status, after_id=None, note_id=None, end=False):
+    """
+    Return the position key placing a note in a column right after the note after_id,
+    at the top of the column if after_id is None, or at its end if end is set
+    note_id is the note being moved, which is skipped when looking for its new neighbours
+    """
+
+    if end:
+        last = db.execute("""
+                          SELECT position FROM notes
+                          WHERE topic_id = ? AND status = ? AND deleted = 0 AND id IS NOT ?
+                          ORDER BY position DESC, id DESC
+                          LIMIT 1
+                          """, topic_id, status, note_id)
+        return key_between(last[0]["position"] if last else None, None)
+
+    before, before_id = None, 0
+    if after_id is not None:
+        above = db.execute("""
+                           SELECT position FROM notes
+                           WHERE id = ? AND topic_id = ? AND status = ? AND deleted = 0
+                           """, after_id, topic_id, status)
+
+        # The note above was moved or deleted meanwhile, so the end of the column is the best guess
+        if not above:
+            return note_position(topic_id, status, note_id=note_id, end=True)
+        before, before_id = above[0]["position"], after_id
+
+    # The next note in board order, which may share the note above's key
+    below = db.execute("""
+                       SELECT position FROM notes
+                       WHERE topic_id = ? AND status = ? AND deleted = 0 AND id IS NOT ?
+                       AND (position, id) > (?, ?)
+                       ORDER BY position, id
+                       LIMIT 1
+                       """, topic_id, status, note_id, before or "", before_id)
+
+    # When the neighbours leave no room (equal keys from concurrent drops between the same two notes),
+    # renumbering the column makes some
+    try:
+        return key_between(before, below[0]["position"] if below else None)
+    except ValueError:
+        rebalance_column(topic_id, status)
+        return note_position(topic_id, status, after_id, note_id)
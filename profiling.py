@@ -0,0 +1,266 @@
+import hmac
+import json
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+from os import getenv, getpid, listdir, makedirs, path, remove, replace
+from time import perf_counter, sleep, time
+
+from flask import g, request
+
+
+# Profiles are written to this spool directory, one JSON file per profiled request,
+# keeping at most PROFILE_MAX_FILES of the newest ones
+PROFILE_DIR = getenv("PROFILE_DIR", path.join(tempfile.gettempdir(), "cloud-board-profiles"))
+PROFILE_MAX_FILES = int(getenv("PROFILE_MAX_FILES", 1000))
+
+# A request is profiled when it sends PROFILE_TOKEN in its X-Profile header,
+# or at random for this fraction of requests (0 turns sampling off)
+PROFILE_TOKEN = getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(getenv("PROFILE_SAMPLE_RATE", 0))
+
+# How often a profiled request's stack is sampled, in seconds
+PROFILE_INTERVAL = float(getenv("PROFILE_INTERVAL", 0.002))
+
+
+class Sampler:
+    """
+    Sampling profiler: a background thread records the stacks of the threads being profiled at
+    a fixed interval, so profiled requests run at full speed apart from briefly sharing the GIL
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pid = None
+        self.switch_interval = None
+
+    def start(self, thread_id):
+        """
+        Start sampling a thread, starting the sampling thread if this process doesn't have one yet
+        """
+
+        with self.lock:
+            self.stacks[thread_id] = Counter()
+
+            # A busy request thread only hands the GIL over every switch interval (5ms by default),
+            # which would leave the sampling thread waiting for it longer than most requests take
+            if self.switch_interval is None:
+                self.switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.switch_interval, self.interval / 4))
+
+            # Threads don't survive a fork, so each worker starts its own
+            if self.pid != getpid():
+                self.pid = getpid()
+                threading.Thread(target=self.run, name="profiler", daemon=True).start()
+
+        self.wake.set()
+
+    def stop(self, thread_id):
+        """
+        Stop sampling a thread, returning how many times each of its stacks was seen
+        """
+
+        with self.lock:
+            return self.stacks.pop(thread_id, Counter())
+
+    def run(self):
+        """
+        Sample the profiled threads until none are left, then wait for the next one
+        """
+
+        while True:
+            self.wake.wait()
+            sleep(self.interval)
+
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.stacks:
+                    self.wake.clear()
+                    if self.switch_interval is not None:
+                        sys.setswitchinterval(self.switch_interval)
+                        self.switch_interval = None
+                    continue
+
+                for thread_id, counts in self.stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counts[collapse(frame)] += 1
+
+
+def frame_name(frame):
+    """
+    Name a frame as function (file:line), where compiled templates keep their template's file name
+    """
+
+    code = frame.f_code
+    return f"{code.co_name} ({path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """
+    Turn a stack into a collapsed stack line, outermost frame first
+    """
+
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+sampler = Sampler()
+
+
+def profile_requested():
+    """
+    Check whether the current request should be profiled
+    """
+
+    token = request.headers.get("X-Profile")
+    if token is not None and PROFILE_TOKEN:
+        return hmac.compare_digest(token, PROFILE_TOKEN)
+
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profile():
+    """
+    Start profiling the current request if it asks to be (or is sampled)
+    """
+
+    if profile_requested():
+        g.profile_started = perf_counter()
+        g.profile_thread = threading.get_ident()
+        sampler.start(g.profile_thread)
+
+
+def finish_profile(response):
+    """
+    Stop profiling the current request and write its profile to the spool directory
+    """
+
+    started = g.pop("profile_started", None)
+    if started is None:
+        return response
+
+    stacks = sampler.stop(g.pop("profile_thread"))
+    milliseconds = (perf_counter() - started) * 1000
+    statements = g.get("statements", [])
+
+    view_args = request.view_args or {}
+    profile = {"time": time(),
+               "route": request.endpoint,
+               "path": request.path,
+               "team": view_args.get("team_name"),
+               "topic": view_args.get("topic_name"),
+               "status": response.status_code,
+               "ms": round(milliseconds, 3),
+               "db_ms": round(sum(seconds for _, seconds in statements) * 1000, 3),
+               "queries": len(statements),
+               "interval_ms": sampler.interval * 1000,
+               "samples": sum(stacks.values()),
+               "stacks": dict(stacks)}
+
+    name = f"{int(profile['time'] * 1000)}-{getpid()}-{threading.get_ident()}"
+    write_profile(name, profile)
+
+    response.headers["X-Profile-Id"] = name
+    return response
+
+
+def discard_profile(error=None):
+    """
+    Stop profiling a request that ended without a response to write the profile for
+    """
+
+    thread_id = g.pop("profile_thread", None)
+    if thread_id is not None:
+        sampler.stop(thread_id)
+
+
+def write_profile(name, profile):
+    """
+    Write a profile to the spool directory, removing the oldest ones past PROFILE_MAX_FILES
+    """
+
+    makedirs(PROFILE_DIR, exist_ok=True)
+
+    # Written to a temporary file first, so readers never see a partial one
+    filename = path.join(PROFILE_DIR, f"{name}.json")
+    with open(filename + ".tmp", "w") as file:
+        json.dump(profile, file)
+    replace(filename + ".tmp", filename)
+
+    profiles = sorted(filename for filename in listdir(PROFILE_DIR) if filename.endswith(".json"))
+    for old in profiles[:-PROFILE_MAX_FILES]:
+        try:
+            remove(path.join(PROFILE_DIR, old))
+        except FileNotFoundError:
+            pass
+
+
+def load_profiles(route=None, team=None, since=None):
+    """
+    Return the spooled profiles, optionally only those of a route or team, or newer than a timestamp
+    """
+
+    try:
+        filenames = sorted(listdir(PROFILE_DIR))
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for filename in filenames:
+        if not filename.endswith(".json"):
+            continue
+
+        try:
+            with open(path.join(PROFILE_DIR, filename)) as file:
+                profile = json.load(file)
+        except (OSError, ValueError):
+            continue
+
+        if route and profile["route"] != route or team and profile["team"] != team:
+            continue
+        if since and profile["time"] < since:
+            continue
+
+        profiles.append(profile)
+
+    return profiles
+
+
+def merge_profiles(profiles):
+    """
+    Add up the stacks of several profiles, in the collapsed stack format flame graph tools read
+    (one "frame;frame;frame count" line per stack)
+    """
+
+    stacks = Counter()
+    for profile in profiles:
+        stacks.update(profile["stacks"])
+
+    return [f"{stack} {count}" for stack, count in sorted(stacks.items())]
+
+
+def hottest_frames(profiles, limit=10):
+    """
+    Return the frames found in the most samples, with their share of all the samples,
+    leaving out the ones every sample goes through (the server's and Flask's outermost frames)
+    """
+
+    inclusive = Counter()
+    total = 0
+    for profile in profiles:
+        for stack, count in profile["stacks"].items():
+            total += count
+            for name in set(stack.split(";")):
+                inclusive[name] += count
+
+    hottest = [(name, count / total) for name, count in inclusive.most_common() if count < total]
+    return hottest[:limit]
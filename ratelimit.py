@@ -0,0 +1,167 @@
+import threading
+from math import ceil
+from os import getenv
+from time import monotonic, time
+
+from flask import request, session
+
+from database import DatabaseBusy
+from helpers import db
+
+
+# Token bucket limits of the *_api endpoints, as "requests/seconds": a client can burst that many requests,
+# then gets requests/seconds more per second. RATE_LIMIT_DEFAULT applies to every endpoint RATE_LIMITS
+# ("endpoint=requests/seconds,...") doesn't name, and a limit of 0 turns limiting off
+RATE_LIMIT_DEFAULT = getenv("RATE_LIMIT_DEFAULT", "120/60")
+RATE_LIMITS = getenv("RATE_LIMITS", "login_api=10/60,register_api=5/300,account_api=10/300,"
+                                    "create_note_api=60/60,move_note_api=120/60,batch_notes_api=30/60")
+
+# Every limit applies per signed in user (per attempted username for logins) and per client IP,
+# with IPs allowed this many times more since a whole office can share one
+RATE_LIMIT_IP_FACTOR = int(getenv("RATE_LIMIT_IP_FACTOR", 4))
+
+# Buckets are shared by every worker through the rate_limits table, each worker takes up to this
+# share of a bucket at once so requests under the limit rarely write to the database. Tokens a
+# worker leaves unused lapse after LEASE_DURATION seconds, by when the bucket has long refilled them
+LEASE_SHARE = 0.1
+LEASE_DURATION = 60
+
+# How often each worker purges the buckets that have filled up again
+PURGE_INTERVAL = 300
+
+
+class RateLimited(Exception):
+    """
+    Raised when a client has used up its tokens for an endpoint, with the seconds until it gets one back
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many requests, please try again in {retry_after} seconds!")
+        self.retry_after = retry_after
+
+
+def parse_limit(limit):
+    """
+    Turn a "requests/seconds" limit into (burst, tokens per second), or None for 0
+    """
+
+    requests, _, seconds = limit.partition("/")
+    if int(requests) <= 0:
+        return None
+    return int(requests), int(requests) / float(seconds or 1)
+
+
+default_limit = parse_limit(RATE_LIMIT_DEFAULT)
+limits = {endpoint.strip(): parse_limit(limit)
+          for endpoint, _, limit in (item.partition("=") for item in RATE_LIMITS.split(",") if item.strip())}
+
+# Tokens this worker has leased per bucket key, as [tokens, lease expiry, refused until]
+leases = {}
+leases_lock = threading.Lock()
+
+# Last time this worker purged full buckets
+last_purge = 0
+
+
+def take_tokens(key, burst, rate):
+    """
+    Take a lease of tokens from a shared bucket, refilling it for the time since it was last used
+    Returns the number of tokens taken, or 0 and the seconds until the bucket has a token again
+    """
+
+    now = time()
+    with db.transaction():
+        row = db.execute("SELECT tokens, updated_at FROM rate_limits WHERE key = ?", key)
+        tokens = min(burst, row[0]["tokens"] + (now - row[0]["updated_at"]) * rate) if row else burst
+
+        # Refused requests leave the bucket as it is, so they don't cost a write
+        if tokens < 1:
+            return 0, (1 - tokens) / rate
+
+        taken = min(int(tokens), max(1, int(burst * LEASE_SHARE)))
+        tokens -= taken
+        db.execute("""
+                   INSERT INTO rate_limits (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                   tokens = excluded.tokens, updated_at = excluded.updated_at, full_at = excluded.full_at
+                   """, key, tokens, now, now + (burst - tokens) / rate)
+
+    purge_rate_limits()
+    return taken, 0
+
+
+def consume(key, burst, rate):
+    """
+    Use a token of a bucket, from this worker's lease when it has one
+    Returns 0, or the seconds to wait when the bucket is empty
+    """
+
+    now = monotonic()
+    with leases_lock:
+        lease = leases.get(key)
+        if lease and lease[2] > now:
+            return lease[2] - now
+        if lease and lease[0] > 0 and lease[1] > now:
+            lease[0] -= 1
+            return 0
+
+    try:
+        taken, wait = take_tokens(key, burst, rate)
+    except DatabaseBusy:
+
+        # The limiter shouldn't turn requests away because the database is busy, the write would be anyway
+        return 0
+
+    with leases_lock:
+        if len(leases) > 10000:
+            for stale in [stale for stale, (_, expiry, refused) in leases.items() if expiry < now and refused < now]:
+                del leases[stale]
+        leases[key] = [taken - 1, now + LEASE_DURATION, now + wait if wait else 0]
+
+    return wait
+
+
+def check_rate_limit():
+    """
+    Raise RateLimited if the current request's user or IP has used up its tokens for the endpoint
+    """
+
+    endpoint = request.endpoint
+    if not endpoint or not endpoint.endswith("_api"):
+        return
+
+    limit = limits.get(endpoint, default_limit)
+    if limit is None:
+        return
+    burst, rate = limit
+
+    # Logins are limited by the username being tried, so guessing one account's password from many IPs is too
+    user = session.get("user_id")
+    if user is None and endpoint == "login_api":
+        data = request.get_json(silent=True)
+        username = data.get("username") if isinstance(data, dict) else None
+        user = f"name:{username.lower()}" if isinstance(username, str) else None
+
+    buckets = [(f"{endpoint}:ip:{request.remote_addr}", burst * RATE_LIMIT_IP_FACTOR, rate * RATE_LIMIT_IP_FACTOR)]
+    if user is not None:
+        buckets.append((f"{endpoint}:user:{user}", burst, rate))
+
+    for key, key_burst, key_rate in buckets:
+        wait = consume(key, key_burst, key_rate)
+        if wait:
+            raise RateLimited(ceil(wait))
+
+
+def purge_rate_limits(force=False):
+    """
+    Delete buckets that have filled up again, they behave the same as missing ones,
+    at most once per interval per worker unless forced
+    Returns the number of buckets removed
+    """
+
+    global last_purge
+    if not force and monotonic() - last_purge < PURGE_INTERVAL:
+        return 0
+
+    last_purge = monotonic()
+    return db.execute("DELETE FROM rate_limits WHERE full_at < ?", time())
@@ -0,0 +1,179 @@
+import secrets
+from os import getenv
+from time import monotonic, time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface, SessionInterface
+
+from helpers import db
+
+
+# Where sessions are kept: "sqlite" stores them in the sessions table behind a random id,
+# "cookie" keeps them in the signed session cookie, revocable through users.session_version
+SESSION_BACKEND = getenv("SESSION_BACKEND", "sqlite")
+
+# How often each worker purges expired sessions and how many rows one purge statement deletes
+PURGE_INTERVAL = 300
+PURGE_BATCH = 500
+
+# Unchanged sessions only have their expiry pushed back once it has aged this many seconds
+TOUCH_INTERVAL = 3600
+
+# Same serializer Flask's cookie sessions use, so flashed message tuples survive the round trip
+serializer = TaggedJSONSerializer()
+
+# Last time this worker purged expired sessions
+last_purge = 0
+
+
+def purge_sessions(force=False):
+    """
+    Delete expired sessions in batches, at most once per interval per worker unless forced
+    Returns the number of sessions removed
+    """
+
+    global last_purge
+    if not force and monotonic() - last_purge < PURGE_INTERVAL:
+        return 0
+
+    last_purge = monotonic()
+    now = int(time())
+
+    # Small batches keep each write transaction short under concurrent requests
+    purged = 0
+    while True:
+        deleted = db.execute("""
+                             DELETE FROM sessions WHERE id IN
+                             (SELECT id FROM sessions WHERE expires_at < ? LIMIT ?)
+                             """, now, PURGE_BATCH)
+        purged += deleted
+        if deleted < PURGE_BATCH:
+            return purged
+
+
+def revoke_sessions(user_id, current=None):
+    """
+    Revoke every session of a user under either backend, except the current one if given
+    """
+
+    with db.transaction():
+        db.execute("UPDATE users SET session_version = session_version + 1 WHERE id = ?", user_id)
+        db.execute("DELETE FROM sessions WHERE user_id = ? AND id != ?", user_id, getattr(current, "sid", None) or "")
+        version = db.execute("SELECT session_version FROM users WHERE id = ?", user_id)[0]["session_version"]
+
+    # Keep the current cookie session valid by moving it to the new version
+    if current is not None:
+        current["session_version"] = version
+
+
+class SQLiteSession(SecureCookieSession):
+    """
+    Session whose data lives in the sessions table, the cookie only holds its random id
+    """
+
+    def __init__(self, initial=None, sid=None, user_id=None, expires_at=0):
+        super().__init__(initial)
+        self.sid = sid
+        self.user_id = user_id
+        self.expires_at = expires_at
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Server-side sessions stored in SQLite, shared by every worker using the same database
+    """
+
+    session_class = SQLiteSession
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return self.session_class()
+
+        rows = db.execute("SELECT user_id, data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                          sid, int(time()))
+        if not rows:
+            return self.session_class()
+
+        return self.session_class(serializer.loads(rows[0]["data"]), sid, rows[0]["user_id"], rows[0]["expires_at"])
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        purge_sessions()
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # Emptied sessions (e.g. logging out) are deleted along with their cookie
+        if not session:
+            if session.sid is not None and session.modified:
+                db.execute("DELETE FROM sessions WHERE id = ?", session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        expires_at = int(time() + app.permanent_session_lifetime.total_seconds())
+        user_id = session.get("user_id")
+        sid = session.sid
+
+        # A new id is issued whenever the logged in user changes, so session ids can't be fixated
+        if sid is None or user_id != session.user_id:
+            if sid is not None:
+                db.execute("DELETE FROM sessions WHERE id = ?", sid)
+            sid = secrets.token_urlsafe(32)
+
+        if sid != session.sid or session.modified:
+            db.execute("REPLACE INTO sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)",
+                       sid, user_id, serializer.dumps(dict(session)), expires_at)
+        elif expires_at - session.expires_at > TOUCH_INTERVAL:
+            db.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", expires_at, sid)
+
+        if sid != session.sid or self.should_set_cookie(app, session):
+            response.set_cookie(name, sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """
+    Stateless signed cookie sessions, checked against the user's session_version so they can be revoked
+    """
+
+    def open_session(self, app, request):
+        session = super().open_session(app, request)
+
+        # Cookies issued before the user's sessions were revoked are treated as logged out
+        if session is not None and "user_id" in session:
+            user = db.execute("SELECT session_version FROM users WHERE id = ?", session["user_id"])
+            if not user or user[0]["session_version"] != session.get("session_version"):
+                session.clear()
+
+        return session
+
+    def save_session(self, app, session, response):
+
+        # Stamp newly logged in sessions with the version they are valid for
+        if "user_id" in session and "session_version" not in session:
+            user = db.execute("SELECT session_version FROM users WHERE id = ?", session["user_id"])
+            if user:
+                session["session_version"] = user[0]["session_version"]
+
+        super().save_session(app, session, response)
+
+
+def session_interface(backend=SESSION_BACKEND):
+    """
+    Return the session interface for the configured backend
+    """
+
+    if backend == "sqlite":
+        return SQLiteSessionInterface()
+    if backend == "cookie":
+        return CookieSessionInterface()
+
+    raise RuntimeError(f"Unknown session backend '{backend}', expected 'sqlite' or 'cookie'!")
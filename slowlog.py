@@ -0,0 +1,108 @@
+import json
+from os import getenv
+from threading import Lock
+from time import time
+
+from flask import has_request_context, request
+
+from helpers import db
+
+
+# Statements taking at least this many milliseconds are logged as JSON lines to SLOW_QUERY_LOG
+# (a negative threshold turns the log off)
+SLOW_QUERY_MS = float(getenv("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = getenv("SLOW_QUERY_LOG", "slow-queries.log")
+
+# Statements EXPLAIN QUERY PLAN works on
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "REPLACE", "UPDATE", "DELETE")
+
+# Statements this worker has already captured a plan for, the plan is only logged the first time
+explained = set()
+lock = Lock()
+
+
+def parameter_shape(value):
+    """
+    Describe a bound parameter without logging its value
+    """
+
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def query_plan(sql, args):
+    """
+    Return a statement's EXPLAIN QUERY PLAN as indented lines, or None if it can't be explained
+    """
+
+    if db.command(sql) not in EXPLAINABLE:
+        return None
+
+    # Run on the connection directly, so explaining isn't observed (and logged) itself
+    try:
+        rows = db.connection.execute(f"EXPLAIN QUERY PLAN {sql}", args).fetchall()
+    except Exception:
+        return None
+
+    depths = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depths[node_id] = depths.get(parent, -1) + 1
+        plan.append("  " * depths[node_id] + detail)
+
+    return plan
+
+
+def observe_slow_statement(sql, args, seconds):
+    """
+    Database observer logging statements slower than SLOW_QUERY_MS
+    """
+
+    milliseconds = seconds * 1000
+    if SLOW_QUERY_MS < 0 or milliseconds < SLOW_QUERY_MS:
+        return
+
+    statement = " ".join(sql.split())
+    entry = {"time": int(time()),
+             "route": (request.endpoint or request.path) if has_request_context() else None,
+             "ms": round(milliseconds, 3),
+             "sql": statement,
+             "params": [parameter_shape(arg) for arg in args]}
+
+    with lock:
+        first = statement not in explained
+        explained.add(statement)
+
+    if first:
+        entry["plan"] = query_plan(sql, args)
+
+    with lock, open(SLOW_QUERY_LOG, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+def summarize(log=SLOW_QUERY_LOG):
+    """
+    Group a slow query log by statement, returning the groups sorted by total time spent
+    """
+
+    statements = {}
+    with open(log) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+
+            summary = statements.setdefault(entry["sql"], {"sql": entry["sql"], "count": 0, "total_ms": 0.0,
+                                                           "max_ms": 0.0, "routes": set(), "plan": None})
+            summary["count"] += 1
+            summary["total_ms"] += entry["ms"]
+            summary["max_ms"] = max(summary["max_ms"], entry["ms"])
+            summary["routes"].add(entry["route"] or "-")
+            if entry.get("plan"):
+                summary["plan"] = entry["plan"]
+
+    return sorted(statements.values(), key=lambda summary: summary["total_ms"], reverse=True)
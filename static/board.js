@@ -77,25 +77,38 @@ document.addEventListener('DOMContentLoaded', function() {
 
             const draggedNoteId = event.dataTransfer.getData("text");
             const draggedNote = document.querySelector(`[data-note-id="${draggedNoteId}"]`);
-            
-            dropZone.querySelector('.cards-section').appendChild(draggedNote);
-            
+            const section = dropZone.querySelector('.cards-section');
+
+            // Drop the card above the first card whose middle is below the pointer
+            const below = Array.from(section.querySelectorAll('.draggable-card')).find(card => {
+                const box = card.getBoundingClientRect();
+                return card !== draggedNote && event.clientY < box.top + box.height / 2;
+            });
+            section.insertBefore(draggedNote, below || null);
+
+            // The server places the note right after the card now above it, or at the top without one
+            const above = draggedNote.previousElementSibling;
+            const move = {
+                note_id: draggedNoteId,
+                column_id: dropZone.dataset.status,
+                is_authorized: isAuthorized
+            };
+            if (dropZone.dataset.status !== 'delete') {
+                move.after_id = above ? Number(above.dataset.noteId) : null;
+            }
+
             // On drag permanently update note state
             fetch(`/move_note_api/${teamName}/${topicName}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ 
-                    note_id: draggedNoteId, 
-                    column_id: dropZone.dataset.status,
-                    is_authorized: isAuthorized
-                })
+                body: JSON.stringify(move)
             })
             .then(res => res.json())
             .then(data => {
+                // On success the card is already in place, the event stream confirms it
                 if (data.success) {
-                    window.location.reload();
-                } 
-                else {
+                    draggedNote.dataset.position = data.position ?? '';
+                } else {
                     // Handle errors
                     showError(data.error || 'An error occurred, please try again later');
                 }
@@ -139,10 +152,8 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(res => res.json())
             .then(data => {
-                if (data.success) {
-                    window.location.reload();
-                } 
-                else {
+                // On success the new card arrives through the event stream
+                if (!data.success) {
                     // Handle errors
                     showError(data.error || 'An error occurred, please try again later');
                 }
@@ -189,10 +200,30 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(res => res.json())
             .then(data => {
-                if (data.success) {
-                    window.location.reload();
-                } 
-                else {
+                // On success the edited card arrives through the event stream
+                if (!data.success) {
+                    showError(data.error || 'An error occurred, please try again later');
+                }
+            })
+            .catch(error => {
+                console.error(error);
+                showError('A network error occurred, please try again later');
+            });
+        });
+    }
+
+    // Function for initializing undoing the user's latest change
+    function initializeUndo() {
+        document.getElementById('undo-button').addEventListener('click', function() {
+            fetch(`/undo_note_api/${teamName}/${topicName}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({})
+            })
+            .then(res => res.json())
+            .then(data => {
+                // On success the reverted card arrives through the event stream
+                if (!data.success) {
                     showError(data.error || 'An error occurred, please try again later');
                 }
             })
@@ -203,9 +234,78 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Function for creating a card element like the ones board.html renders
+    function createCard(noteId, content, position) {
+        const card = document.createElement('div');
+        card.className = 'card mb-2 draggable-card';
+        card.draggable = true;
+        card.dataset.noteId = noteId;
+        card.dataset.position = position;
+
+        const body = document.createElement('div');
+        body.className = 'card-body p-2';
+
+        const text = document.createElement('p');
+        text.className = 'card-text small mb-0';
+        text.textContent = content;
+
+        body.appendChild(text);
+        card.appendChild(body);
+        return card;
+    }
+
+    // Function for placing a card in its column by its position key, returns false if the column isn't on the page
+    function placeCard(card, status, position) {
+        const column = document.querySelector(`.accordion[data-status="${status}"] .cards-section`);
+        if (!column) return false;
+
+        // Keys compare like the database compares them, character code by character code
+        card.dataset.position = position;
+        const next = Array.from(column.querySelectorAll('.draggable-card'))
+            .find(other => other !== card && other.dataset.position > position);
+        column.insertBefore(card, next || null);
+        return true;
+    }
+
+    // Function for applying note changes made by anyone on this board in place
+    function initializeEventStream() {
+        const source = new EventSource(`/team/${encodeURIComponent(teamName)}/topic/${encodeURIComponent(topicName)}/events`);
+
+        source.addEventListener('created', function(event) {
+            const note = JSON.parse(event.data);
+            if (document.querySelector(`[data-note-id="${note.note_id}"]`)) return;
+
+            // Boards without any cards don't render their columns for drag-only members
+            if (!placeCard(createCard(note.note_id, note.content, note.position), note.status, note.position)) {
+                window.location.reload();
+            }
+        });
+
+        source.addEventListener('edited', function(event) {
+            const note = JSON.parse(event.data);
+            const card = document.querySelector(`[data-note-id="${note.note_id}"]`);
+            if (card) {
+                card.querySelector('.card-text').textContent = note.content;
+            }
+        });
+
+        source.addEventListener('moved', function(event) {
+            const note = JSON.parse(event.data);
+            const card = document.querySelector(`[data-note-id="${note.note_id}"]`) || createCard(note.note_id, note.content, note.position);
+            placeCard(card, note.status, note.position);
+        });
+
+        source.addEventListener('deleted', function(event) {
+            const note = JSON.parse(event.data);
+            document.querySelector(`[data-note-id="${note.note_id}"]`)?.remove();
+        });
+    }
+
     // Initialize functionality
     isMobile();
     initializeNoteDrag();
     initializeAddNote();
     initializeEditNote();
+    initializeUndo();
+    initializeEventStream();
 });
\ No newline at end of file
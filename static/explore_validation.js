@@ -11,36 +11,36 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Function to initialize join buttons
     function initializeJoinButtons() {
-        const joinButtons = document.querySelectorAll('.join-button');
 
-        // Add click listener for every team join button
-        joinButtons.forEach(button => {
-            button.addEventListener('click', function(event) {
-                event.preventDefault();
+        // Listen on the document, as pages of team cards are swapped in by pagination.js
+        document.addEventListener('click', function(event) {
+            const button = event.target.closest('.join-button');
+            if (!button) return;
 
-                const teamId = button.getAttribute('data-team-id');
+            event.preventDefault();
 
-                // Send request to join team
-                fetch('/join_team_api', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ team_id: teamId })
-                })
-                .then(res => res.json())
-                .then(data => {
-                    if (data.success) {
-                        window.location.reload();
-                    } 
-                    else {
-                        showError(data.error || 'An error occured, please try again!');
-                    }
-                })
-                .catch(error => {
-                    console.error(error);
-                    showError('A network error occurred, please try again!');
-                });
+            const teamId = button.getAttribute('data-team-id');
+
+            // Send request to join team
+            fetch('/join_team_api', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ team_id: teamId })
+            })
+            .then(res => res.json())
+            .then(data => {
+                if (data.success) {
+                    window.location.reload();
+                } 
+                else {
+                    showError(data.error || 'An error occured, please try again!');
+                }
+            })
+            .catch(error => {
+                console.error(error);
+                showError('A network error occurred, please try again!');
             });
         });
     }
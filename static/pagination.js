@@ -1,74 +1,70 @@
 document.addEventListener('DOMContentLoaded', function() {
-    const itemsPerPage = 5;
-    const items = document.querySelectorAll('.card');
+    const container = document.getElementById('paginated-items');
+
+    // If there's nothing paginated on this page, no pagination is needed
+    if (!container) {
+        return;
+    }
+
+    // Page size, total item count (empty if unknown, e.g. for searches) and the first page's next cursor
+    const limit = parseInt(container.dataset.limit);
+    const total = container.dataset.total === '' ? null : parseInt(container.dataset.total);
+    const firstNextCursor = container.dataset.nextCursor;
 
     // If there's only one page, no pagination is needed
-    if (items.length <= itemsPerPage) {
+    if (!firstNextCursor) {
         return;
     }
 
-    // Calculate the total number of pages and initialize current page counter
+    // cursors[i] is the cursor that loads page i + 1, so going back is just reusing an earlier cursor
+    const initialParams = new URLSearchParams(window.location.search);
+    const cursors = [initialParams.get('after') || '', firstNextCursor];
     let currentPage = 1;
-    const totalPages = Math.ceil(items.length / itemsPerPage);
+    const totalPages = total === null ? null : Math.max(1, Math.ceil(total / limit));
 
     // Initialize pagination elements
     const paginationContainer = document.querySelector('.pagination');
     const prevButton = document.getElementById('prev-btn');
     const nextButton = document.getElementById('next-btn');
     const pageInfo = document.getElementById('page-info');
-    
+
     // Show pagination and set initial page info
     paginationContainer.removeAttribute('hidden');
-    pageInfo.textContent = `Page 1 of ${totalPages}`;
 
 
 
-    // Function for showing the page'th page
+    // Function for updating the pagination controls
+    function updateControls() {
+        pageInfo.textContent = totalPages === null ? `Page ${currentPage}` : `Page ${currentPage} of ${totalPages}`;
+        prevButton.disabled = currentPage === 1;
+        nextButton.disabled = !cursors[currentPage];
+    }
+
+    // Function for requesting the page'th page from the server and swapping it in
     function showPage(page) {
-        const start = (page - 1) * itemsPerPage;
-        const end = start + itemsPerPage;
+        const params = new URLSearchParams(window.location.search);
+        params.set('after', cursors[page - 1]);
+        params.set('limit', limit);
+        params.set('partial', '1');
 
-        // Show or hide items
-        items.forEach((item, index) => {
-            item.style.display = (index >= start && index < end) ? 'block' : 'none';
-        });
-        
-        // Update sections (dedicated section for teams.html)
-        const yourTeamsSection = document.getElementById('your-teams-section');
-        const otherTeamsSection = document.getElementById('other-teams-section');
-
-        // If the your teams section exists, check for visible cards and update the container
-        if (yourTeamsSection) {
-            const cards = yourTeamsSection.querySelectorAll('.card');
-            let hasVisibleCards = false;
-            for (let i = 0; i < cards.length; i++) {
-
-                if (cards[i].style.display !== 'none') {
-                    hasVisibleCards = true;
-                    break;
-                }
-            }
-            yourTeamsSection.style.display = hasVisibleCards ? 'block' : 'none';
-        }
-
-        // If the other teams section exists, check for visible cards and update the container
-        if (otherTeamsSection) {
-            const cards = otherTeamsSection.querySelectorAll('.card');
-            let hasVisibleCards = false;
-            for (let i = 0; i < cards.length; i++) {
-                if (cards[i].style.display !== 'none') {
-                    hasVisibleCards = true;
-                    break;
-                }
-            }
-            otherTeamsSection.style.display = hasVisibleCards ? 'block' : 'none';
-        }
-        
-        // Update pagination controls
-        pageInfo.textContent = `Page ${page} of ${totalPages}`;
-        prevButton.disabled = page === 1;
-        nextButton.disabled = page === totalPages;
+        prevButton.disabled = true;
+        nextButton.disabled = true;
 
+        fetch(`${window.location.pathname}?${params}`)
+        .then(res => {
+            // The cursor for the following page comes back in a header, empty on the last page
+            cursors[page] = decodeURIComponent(res.headers.get('X-Next-Cursor') || '');
+            return res.text();
+        })
+        .then(html => {
+            container.innerHTML = html;
+            currentPage = page;
+            updateControls();
+        })
+        .catch(error => {
+            console.error(error);
+            updateControls();
+        });
     }
 
     // Function for initializing pagination
@@ -77,20 +73,18 @@ document.addEventListener('DOMContentLoaded', function() {
         // Add the button event listeners
         prevButton.onclick = () => {
             if (currentPage > 1) {
-                currentPage--;
-                showPage(currentPage);
+                showPage(currentPage - 1);
             }
         };
-    
+
         nextButton.onclick = () => {
-            if (currentPage < totalPages) {
-                currentPage++;
-                showPage(currentPage);
+            if (cursors[currentPage]) {
+                showPage(currentPage + 1);
             }
         };
     };
-    
+
     // Initialize functionality
-    showPage(1);
+    updateControls();
     updatePagination();
 });
@@ -0,0 +1,129 @@
+import os
+import random
+import sqlite3
+import tempfile
+from os import path
+
+import pytest
+
+
+# The app reads its configuration when imported, so the environment is set up before any test imports it
+directory = tempfile.mkdtemp(prefix="cloud-board-tests-")
+os.environ["DATABASE"] = path.join(directory, "test.db")
+os.environ["SECRET_KEY"] = "test"
+os.environ["METRICS_DIR"] = path.join(directory, "metrics")
+os.environ["SLOW_QUERY_MS"] = "-1"
+os.environ["PROFILE_DIR"] = path.join(directory, "profiles")
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+os.environ["EVENTS_STREAM_DURATION"] = "0.05"
+os.environ["EVENTS_POLL_INTERVAL"] = "0.01"
+os.environ["RATE_LIMIT_DEFAULT"] = "0"
+os.environ["RATE_LIMITS"] = ""
+
+PASSWORD = "Passw0rdA"
+
+# Large enough that a full scan of any table is clearly worse than an index lookup
+USERS = 3000
+TEAMS = 600
+MEMBERSHIPS_PER_USER = 10
+TOPICS_PER_TEAM = 3
+NOTES_PER_TOPIC = 20
+
+STATUSES = ["announcements", "todo", "doing", "done"]
+
+
+def seed(database):
+    """
+    Fill a freshly migrated database with a realistic data set, plus a known team for the tests
+    Team 1 ("Alpha Team") has alice as admin, bob as editor and carol as a plain member
+    """
+
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(PASSWORD, os.environ["PASSWORD_HASH_METHOD"])
+    rng = random.Random(0)
+
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA foreign_keys = ON")
+
+    usernames = ["alice", "bobby", "carol", "david"] + [f"user{n}" for n in range(5, USERS + 1)]
+    connection.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, ?)",
+                           [(n, username, password_hash) for n, username in enumerate(usernames, 1)])
+
+    team_names = ["Alpha Team", "Beta Team"] + [f"Team {n:04}" for n in range(3, TEAMS + 1)]
+    connection.executemany("""
+                           INSERT INTO teams (id, name, code, description, access_type)
+                           VALUES (?, ?, ?, ?, ?)
+                           """, [(n, name, f"CODE{n:04}", f"Description of {name}", rng.choice(["public", "private"]))
+                                 for n, name in enumerate(team_names, 1)])
+    connection.execute("UPDATE teams SET access_type = 'public' WHERE id IN (1, 2)")
+
+    memberships = [(1, 1, "admin"), (1, 2, "editor"), (1, 3, "drag-only")]
+    for user in range(5, USERS + 1):
+        for team in rng.sample(range(3, TEAMS + 1), MEMBERSHIPS_PER_USER):
+            memberships.append((team, user, rng.choice(["admin", "editor", "drag-only"])))
+    connection.executemany("INSERT INTO team_members (team_id, user_id, privilege) VALUES (?, ?, ?)", memberships)
+
+    connection.executemany("INSERT INTO topics (name, team_id) VALUES (?, ?)",
+                           [(f"Topic {n}", team) for team in range(1, TEAMS + 1) for n in range(1, TOPICS_PER_TEAM + 1)])
+    # Alpha Team's notes were written by bob, so he has changes to undo
+    connection.executemany("INSERT INTO notes (content, status, topic_id, position, updated_by) VALUES (?, ?, ?, ?, ?)",
+                           [(f"Note {n}", rng.choice(STATUSES), topic, f"{2 * n + 1:06}",
+                             2 if topic <= TOPICS_PER_TEAM else None)
+                            for topic in range(1, TEAMS * TOPICS_PER_TEAM + 1) for n in range(NOTES_PER_TOPIC)])
+
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture(scope="session")
+def seeded():
+    """
+    Path of a seeded database that every test starts from
+    """
+
+    from migrate import upgrade
+
+    template = path.join(directory, "seeded.db")
+    upgrade(template)
+    seed(template)
+    return template
+
+
+@pytest.fixture
+def app(seeded):
+    """
+    The app, with its database restored to the seeded state and its in-memory caches emptied
+    """
+
+    from app import app
+    from fragments import fragment_cache
+    from helpers import db, privilege_cache
+    from ratelimit import leases
+
+    source = sqlite3.connect(seeded)
+    source.backup(db.connection)
+    source.close()
+
+    fragment_cache.clear()
+    privilege_cache.clear()
+    leases.clear()
+
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def login(app):
+    """
+    Return a function logging a user in and returning their test client
+    """
+
+    def login(username):
+        client = app.test_client()
+        response = client.post("/login_api", json={"username": username, "password": PASSWORD})
+        assert response.get_json()["success"], response.get_json()
+        return client
+
+    return login
@@ -0,0 +1,85 @@
+import re
+import time
+
+import archive
+from helpers import db
+
+
+def add_done_notes(count, done_at):
+    """
+    Add done notes to Alpha Team's Topic 1, done one second apart starting at done_at, returning their ids
+    """
+
+    note_ids = []
+    for n in range(count):
+        note_id = db.execute("INSERT INTO notes (content, status, topic_id) VALUES (?, 'done', 1)", f"Done {n}")
+        db.execute("UPDATE notes SET done_at = ? WHERE id = ?", done_at + n, note_id)
+        note_ids.append(note_id)
+    return note_ids
+
+
+def test_done_at_follows_status(app):
+    note_id = db.execute("INSERT INTO notes (content, status, topic_id) VALUES ('Note', 'todo', 1)")
+    assert db.execute("SELECT done_at FROM notes WHERE id = ?", note_id)[0]["done_at"] is None
+
+    db.execute("UPDATE notes SET status = 'done' WHERE id = ?", note_id)
+    assert db.execute("SELECT done_at FROM notes WHERE id = ?", note_id)[0]["done_at"] >= int(time.time()) - 1
+
+    db.execute("UPDATE notes SET status = 'doing' WHERE id = ?", note_id)
+    assert db.execute("SELECT done_at FROM notes WHERE id = ?", note_id)[0]["done_at"] is None
+
+
+def test_board_only_loads_latest_done_notes(login):
+    client = login("carol")
+    newest = add_done_notes(archive.BOARD_DONE_NOTES + 5, int(time.time()) + 1000)
+
+    notes = client.get("/api/team/Alpha Team/topic/Topic 1/notes").get_json()
+    done = [note["id"] for note in notes["notes"] if note["status"] == "done"]
+
+    assert sorted(done) == sorted(newest[5:])
+    assert notes["older_done"] is True
+    assert b"Older Done Notes" in client.get("/team/Alpha Team/topic/Topic 1").data
+
+
+def test_old_done_notes_are_archived_in_batches(app):
+    old = add_done_notes(7, 1000)
+    recent = add_done_notes(3, int(time.time()))
+    events = db.execute("SELECT COUNT(*) AS count FROM board_events WHERE kind = 'deleted'")[0]["count"]
+
+    assert archive.archive_done_notes(age=3600, batch=3) == 7
+
+    archived = db.execute("SELECT note_id FROM archived_notes ORDER BY done_at")
+    assert [note["note_id"] for note in archived] == old
+    assert db.execute("SELECT COUNT(*) AS count FROM notes WHERE id IN (?, ?, ?) AND deleted = 0", *recent)[0]["count"] == 3
+
+    # Archived notes leave boards like deleted notes do
+    assert db.execute("SELECT COUNT(*) AS count FROM board_events WHERE kind = 'deleted'")[0]["count"] == events + 7
+    assert archive.archive_done_notes(age=3600) == 0
+
+
+def test_archive_view_pages_through_every_done_note(login):
+    client = login("carol")
+    add_done_notes(12, 1000)
+    add_done_notes(12, int(time.time()))
+    archive.archive_done_notes(age=3600)
+
+    expected = db.execute("""
+                          SELECT (SELECT COUNT(*) FROM notes WHERE topic_id = 1 AND status = 'done' AND deleted = 0) +
+                          (SELECT COUNT(*) FROM archived_notes WHERE topic_id = 1) AS count
+                          """)[0]["count"]
+
+    page = client.get("/team/Alpha Team/topic/Topic 1/archive?limit=5")
+    assert page.status_code == 200
+
+    seen = []
+    cursor = ""
+    while True:
+        response = client.get("/team/Alpha Team/topic/Topic 1/archive", query_string={"after": cursor, "limit": 5,
+                                                                                       "partial": 1})
+        seen += re.findall(r'<p class="card-text small mb-1">(.*?)</p>', response.get_data(as_text=True))
+        cursor = response.headers["X-Next-Cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == expected
+    assert seen.count("Done 0") == 2
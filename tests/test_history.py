@@ -0,0 +1,95 @@
+import history
+from helpers import db
+
+
+def live_notes(topic_id):
+    """
+    A topic's live notes in the shape snapshots store them
+    """
+
+    return {str(note["id"]): {"content": note["content"], "status": note["status"], "position": note["position"]}
+            for note in db.execute("SELECT id, content, status, position FROM notes WHERE topic_id = ? AND deleted = 0",
+                                   topic_id)}
+
+
+def event_count():
+    return db.execute("SELECT COUNT(*) AS count FROM board_events")[0]["count"]
+
+
+def test_undo_reverts_an_edit_and_undoing_again_redoes_it(login):
+    client = login("bobby")
+    client.post("/edit_note_api/Alpha Team/Topic 1", json={"note_id": 3, "content": "Edited"})
+
+    assert client.post("/undo_note_api/Alpha Team/Topic 1", json={}).get_json()["undone"] == "edited"
+    assert db.execute("SELECT content FROM notes WHERE id = 3")[0]["content"] == "Note 2"
+
+    client.post("/undo_note_api/Alpha Team/Topic 1", json={})
+    assert db.execute("SELECT content FROM notes WHERE id = 3")[0]["content"] == "Edited"
+
+    activity = client.get("/api/team/Alpha Team/topic/Topic 1/activity?limit=3").get_json()
+    assert [(event["kind"], event["content"], event["previous_content"], event["username"])
+            for event in activity["events"]] == [("edited", "Edited", "Note 2", "bobby"),
+                                                 ("edited", "Note 2", "Edited", "bobby"),
+                                                 ("edited", "Edited", "Note 2", "bobby")]
+
+    older = client.get(f"/api/team/Alpha Team/topic/Topic 1/activity?after={activity['next_cursor']}").get_json()
+    assert older["events"][0]["kind"] == "created"
+
+
+def test_undo_puts_a_moved_note_back_in_place(login):
+    client = login("carol")
+    before = db.execute("SELECT status, position FROM notes WHERE id = 3")[0]
+    events = event_count()
+
+    client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": 3, "column_id": "doing", "after_id": None})
+    assert event_count() == events + 1
+
+    assert client.post("/undo_note_api/Alpha Team/Topic 1", json={}).get_json()["success"]
+    assert db.execute("SELECT status, position FROM notes WHERE id = 3")[0] == before
+
+
+def test_undo_restores_a_deleted_note(login):
+    client = login("bobby")
+    client.post("/edit_note_api/Alpha Team/Topic 1", json={"note_id": 3, "content": ""})
+
+    assert client.post("/undo_note_api/Alpha Team/Topic 1", json={}).get_json()["undone"] == "deleted"
+
+    notes = client.get("/api/team/Alpha Team/topic/Topic 1/notes").get_json()["notes"]
+    assert 3 in [note["id"] for note in notes]
+
+
+def test_undo_is_refused_once_someone_else_changed_the_note(login):
+    bobby = login("bobby")
+    bobby.post("/edit_note_api/Alpha Team/Topic 1", json={"note_id": 3, "content": "Edited"})
+    login("alice").post("/edit_note_api/Alpha Team/Topic 1", json={"note_id": 3, "content": "Edited again"})
+
+    response = bobby.post("/undo_note_api/Alpha Team/Topic 1", json={}).get_json()
+    assert response["error"] == "The note has changed since, it can not be undone!"
+    assert db.execute("SELECT content FROM notes WHERE id = 3")[0]["content"] == "Edited again"
+
+    assert login("carol").post("/undo_note_api/Alpha Team/Topic 1", json={}).get_json()["error"] == \
+        "There is nothing to undo!"
+
+
+def test_old_events_are_compacted_into_snapshots(login):
+    client = login("bobby")
+    client.post("/edit_note_api/Alpha Team/Topic 1", json={"note_id": 3, "content": "Edited"})
+    client.post("/edit_note_api/Alpha Team/Topic 1", json={"note_id": 10, "content": ""})
+    db.execute("UPDATE board_events SET created_at = created_at - 7200")
+
+    compacted = history.compact_events(3600, interval=60)
+
+    assert compacted > 0
+    assert event_count() == 0
+    latest = db.execute("SELECT MAX(event_id) AS id FROM board_snapshots WHERE topic_id = 1")[0]["id"]
+    assert history.state_at(1, latest) == live_notes(1)
+
+    # Later events replay on top of the snapshot, and the next compaction builds on it
+    client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": 3, "column_id": "done"})
+    client.post("/create_note_api/Alpha Team/Topic 1", json={"content": "New", "status": "todo"})
+    last = db.execute("SELECT MAX(id) AS id FROM board_events WHERE topic_id = 1")[0]["id"]
+    assert history.state_at(1, last) == live_notes(1)
+
+    db.execute("UPDATE board_events SET created_at = created_at - 7200")
+    assert history.compact_events(3600, interval=60) == 2
+    assert history.state_at(1, last) == live_notes(1)
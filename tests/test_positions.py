@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+import positions
+from helpers import db
+
+
+def column(status="todo"):
+    """
+    Ids of the notes in a column of Alpha Team's Topic 1, in board order
+    """
+
+    return [note["id"] for note in db.execute("""
+                                              SELECT id FROM notes
+                                              WHERE topic_id = 1 AND status = ? AND deleted = 0
+                                              ORDER BY position, id
+                                              """, status)]
+
+
+def longest_position(status="todo"):
+    """
+    Length of the longest position key in a column of Alpha Team's Topic 1
+    """
+
+    return db.execute("SELECT MAX(length(position)) AS length FROM notes WHERE topic_id = 1 AND status = ?",
+                      status)[0]["length"]
+
+
+def test_keys_sort_between_their_neighbours():
+    rng = random.Random(0)
+    keys = [positions.key_between(None, None)]
+
+    for _ in range(2000):
+        index = rng.randint(0, len(keys))
+        before = keys[index - 1] if index else None
+        after = keys[index] if index < len(keys) else None
+
+        key = positions.key_between(before, after)
+        assert (before is None or before < key) and (after is None or key < after)
+        assert not key.endswith("0")
+        keys.insert(index, key)
+
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_appending_and_prepending_keep_keys_short():
+    key = first = positions.key_between(None, None)
+    for _ in range(100):
+        key = positions.key_between(key, None)
+        first = positions.key_between(None, first)
+
+    assert len(key) <= 5 and len(first) <= 5
+
+
+def test_no_key_fits_between_equal_keys():
+    with pytest.raises(ValueError):
+        positions.key_between("V", "V")
+    with pytest.raises(ValueError):
+        positions.key_between(None, "000")
+
+
+def test_spread_keys_are_evenly_spaced_and_short():
+    keys = positions.spread_keys(1000)
+
+    assert keys == sorted(keys) and len(set(keys)) == 1000
+    assert {len(key) for key in keys} == {3}
+    assert not any(key.endswith("0") for key in keys)
+
+
+def test_move_after_a_note_is_a_single_update(login):
+    client = login("carol")
+    todo = column()
+    moved = column("doing")[0]
+
+    statements = []
+    db.observers.append(lambda sql, args, seconds: statements.append(sql))
+    try:
+        response = client.post("/move_note_api/Alpha Team/Topic 1",
+                               json={"note_id": moved, "column_id": "todo", "after_id": todo[0]})
+    finally:
+        db.observers.pop()
+
+    assert response.get_json()["success"]
+    assert [sql for sql in statements if sql.lstrip().startswith("UPDATE notes")] == \
+        ["UPDATE notes SET status = ?, position = ?, updated_by = ? WHERE id = ?"]
+    assert column() == [todo[0], moved] + todo[1:]
+
+
+def test_moves_place_notes_at_the_top_or_end(login):
+    client = login("carol")
+    todo = column()
+
+    client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": todo[-1], "column_id": "todo", "after_id": None})
+    assert column() == [todo[-1]] + todo[:-1]
+
+    client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": todo[-1], "column_id": "todo"})
+    assert column() == todo
+
+    response = client.post("/move_note_api/Alpha Team/Topic 1",
+                           json={"note_id": todo[0], "column_id": "todo", "after_id": "first"})
+    assert response.get_json()["error"] == "Invalid note position!"
+
+
+def test_board_shows_columns_in_position_order(login):
+    client = login("carol")
+    todo = column()
+    client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": todo[-1], "column_id": "todo", "after_id": None})
+
+    notes = client.get("/api/team/Alpha Team/topic/Topic 1/notes").get_json()["notes"]
+    assert [note["id"] for note in notes if note["status"] == "todo"] == [todo[-1]] + todo[:-1]
+
+
+def test_long_keys_are_rebalanced(app):
+    todo = column()
+
+    # Dropping notes right below the top card over and over grows the keys there
+    for note_id in todo[1:] * 10:
+        db.execute("UPDATE notes SET position = ? WHERE id = ?",
+                   positions.note_position(1, "todo", todo[0], note_id), note_id)
+    order = column()
+
+    assert longest_position() > positions.POSITION_MAX_LENGTH
+    assert positions.rebalance_positions() == 1
+    assert column() == order
+    assert longest_position() <= 2
+    assert positions.rebalance_positions() == 0
+
+
+def test_equal_keys_are_rebalanced_when_dropping_between_them(app):
+    todo = column()
+    db.execute("UPDATE notes SET position = 'V' WHERE topic_id = 1 AND status = 'todo'")
+
+    position = positions.note_position(1, "todo", todo[0], todo[-1])
+    db.execute("UPDATE notes SET position = ? WHERE id = ?", position, todo[-1])
+
+    assert column() == [todo[0], todo[-1]] + todo[1:-1]
@@ -0,0 +1,60 @@
+import json
+from os import path
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def spool(app, monkeypatch, tmp_path):
+    """
+    An empty profile spool directory and a profiling token
+    """
+
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling.sampler, "interval", 0.0005)
+    return tmp_path
+
+
+def test_requests_are_only_profiled_with_the_token(login, spool):
+    client = login("carol")
+
+    assert "X-Profile-Id" not in client.get("/team/Alpha Team/topic/Topic 1").headers
+    assert "X-Profile-Id" not in client.get("/team/Alpha Team/topic/Topic 1", headers={"X-Profile": "wrong"}).headers
+    assert list(spool.iterdir()) == []
+
+
+def test_profile_is_tagged_and_spooled(login, spool):
+    client = login("carol")
+
+    response = client.get("/team/Alpha Team/topic/Topic 1", headers={"X-Profile": "secret"})
+
+    with open(path.join(spool, response.headers["X-Profile-Id"] + ".json")) as file:
+        profile = json.load(file)
+
+    assert profile["route"] == "board"
+    assert profile["team"] == "Alpha Team"
+    assert profile["topic"] == "Topic 1"
+    assert profile["queries"] > 0
+    assert profile["samples"] == sum(profile["stacks"].values())
+    assert profiling.sampler.stacks == {}
+
+
+def test_profiles_merge_into_collapsed_stacks(app, spool):
+    profiling.write_profile("1", {"time": 1, "route": "board", "team": "Alpha Team", "ms": 10, "samples": 3,
+                                  "stacks": {"main;board;render": 2, "main;board;query": 1}})
+    profiling.write_profile("2", {"time": 2, "route": "board", "team": "Beta Team", "ms": 20, "samples": 2,
+                                  "stacks": {"main;board;render": 2}})
+    profiling.write_profile("3", {"time": 3, "route": "teams", "team": None, "ms": 5, "samples": 1,
+                                  "stacks": {"main;teams": 1}})
+
+    boards = profiling.load_profiles(route="board")
+    assert profiling.merge_profiles(boards) == ["main;board;query 1", "main;board;render 4"]
+    assert profiling.hottest_frames(boards) == [("render", 0.8), ("query", 0.2)]
+    assert len(profiling.load_profiles(team="Alpha Team")) == 1
+
+    result = app.test_cli_runner().invoke(args=["profiles", "--route", "teams"])
+    assert result.exit_code == 0
+    assert "main;teams 1" in result.output
@@ -0,0 +1,170 @@
+import re
+
+import pytest
+
+from helpers import db
+from slowlog import query_plan
+
+
+# Tables that grow with usage, scanning any of them is a regression
+LARGE_TABLES = {"users", "teams", "team_members", "topics", "notes", "archived_notes", "board_events", "sessions",
+                "rate_limits", "counters"}
+
+# (statement substring, plan detail substring) -> why the scan or sort is acceptable
+ALLOWLIST = {
+    ("ORDER BY bm25(teams_search", "USE TEMP B-TREE FOR ORDER BY"):
+        "search results are ranked by relevance, which only exists once the matches are found",
+    ("ORDER BY team_members.privilege, teams.name", "USE TEMP B-TREE FOR ORDER BY"):
+        "sorts the user's own teams, which are capped at 20",
+    ("ORDER BY users.username", "USE TEMP B-TREE FOR ORDER BY"):
+        "sorts the members of one team, found through the team's primary key range",
+    ("WHERE length(position) > 12", "SCAN notes USING INDEX notes_long_positions"):
+        "the partial index only holds notes whose position keys need rebalancing",
+    ("UPDATE teams SET member_count", "SCAN teams"):
+        "flask recount checks every team by design",
+    ("UPDATE users SET team_count", "SCAN users"):
+        "flask recount checks every user by design",
+}
+
+SCAN = re.compile(r"^SCAN (\w+)")
+
+# Every route, driven as (user, method, url, JSON body), in the seeded database
+ROUTES = {
+    "index": ("alice", "GET", "/", None),
+    "login": (None, "GET", "/login", None),
+    "login_api": (None, "POST", "/login_api", {"username": "alice", "password": "Passw0rdA"}),
+    "register": (None, "GET", "/register", None),
+    "register_api": (None, "POST", "/register_api", {"username": "erin1", "password": "Passw0rdA",
+                                                      "confirmation": "Passw0rdA"}),
+    "account": ("alice", "GET", "/account", None),
+    "account_api": ("alice", "POST", "/account_api", {"username": "alice2", "current_password": "Passw0rdA",
+                                                       "new_password": "Passw0rdB", "confirmation": "Passw0rdB"}),
+    "logout": ("alice", "GET", "/logout", None),
+    "metrics": (None, "GET", "/metrics", None),
+    "explore": ("alice", "GET", "/explore", None),
+    "explore_page": ("alice", "GET", "/explore?after=Team 0100&partial=1", None),
+    "explore_search": ("alice", "GET", "/explore?search=team 01", None),
+    "explore_search_page": ("alice", "GET", "/explore?search=team&after=Team 0100&partial=1", None),
+    "join_team_api": ("alice", "POST", "/join_team_api", {"team_id": 2}),
+    "teams": ("alice", "GET", "/teams", None),
+    "teams_page": ("alice", "GET", "/teams?after=Alpha Team&partial=1", None),
+    "teams_search": ("alice", "GET", "/teams?search=alpha", None),
+    "create_team": ("alice", "GET", "/create_team", None),
+    "create_team_api": ("alice", "POST", "/create_team_api", {"team_name": "Gamma Team", "team_code": "",
+                                                               "team_description": "New", "team_access_type": "public"}),
+    "join_team": ("alice", "GET", "/join_team", None),
+    "join_with_credentials_api": ("alice", "POST", "/join_with_credentials_api", {"team_name": "Team 0003",
+                                                                                   "team_code": "CODE0003"}),
+    "leave_team_api": ("bobby", "POST", "/leave_team_api/Alpha Team", {}),
+    "team_page": ("carol", "GET", "/team/Alpha Team", None),
+    "team_page_partial": ("carol", "GET", "/team/Alpha Team?after=Topic 1&partial=1", None),
+    "manage_team": ("alice", "GET", "/manage_team/Alpha Team", None),
+    "manage_team_search": ("alice", "GET", "/manage_team/Alpha Team?search=car", None),
+    "manage_team_api": ("alice", "POST", "/manage_team_api/Alpha Team", {"team_name": "Omega Team", "team_code": "OMEGA1",
+                                                                          "team_description": "Renamed",
+                                                                          "team_access_type": "private"}),
+    "manage_member_api": ("alice", "POST", "/manage_member_api/Alpha Team", {"member_id": "3", "privilege": "editor"}),
+    "manage_member_api_kick": ("alice", "POST", "/manage_member_api/Alpha Team", {"member_id": "3", "privilege": "kick"}),
+    "delete_team_api": ("alice", "POST", "/delete_team_api/Alpha Team", {}),
+    "edit_team": ("bobby", "GET", "/edit_team/Alpha Team", None),
+    "edit_team_search": ("bobby", "GET", "/edit_team/Alpha Team?search=topic", None),
+    "create_topic_api": ("bobby", "POST", "/create_topic_api/Alpha Team", {"topic_name": "Topic 4"}),
+    "edit_topic_api": ("bobby", "POST", "/edit_topic_api/Alpha Team/Topic 1", {"new_name": "Renamed topic"}),
+    "edit_topic_api_delete": ("bobby", "POST", "/edit_topic_api/Alpha Team/Topic 1", {"new_name": "D"}),
+    "board": ("carol", "GET", "/team/Alpha Team/topic/Topic 1", None),
+    "board_archive": ("carol", "GET", "/team/Alpha Team/topic/Topic 1/archive", None),
+    "board_archive_page": ("carol", "GET", "/team/Alpha Team/topic/Topic 1/archive?after=1999999999.5&partial=1", None),
+    "board_events": ("carol", "GET", "/team/Alpha Team/topic/Topic 1/events", None),
+    "board_notes_api": ("carol", "GET", "/api/team/Alpha Team/topic/Topic 1/notes", None),
+    "board_changes_api": ("carol", "GET", "/api/team/Alpha Team/topic/Topic 1/changes?since=5", None),
+    "create_note_api": ("bobby", "POST", "/create_note_api/Alpha Team/Topic 1", {"content": "New", "status": "todo"}),
+    "edit_note_api": ("bobby", "POST", "/edit_note_api/Alpha Team/Topic 1", {"note_id": 1, "content": "Edited"}),
+    "move_note_api": ("carol", "POST", "/move_note_api/Alpha Team/Topic 1", {"note_id": 1, "column_id": "done"}),
+    "move_note_api_after": ("carol", "POST", "/move_note_api/Alpha Team/Topic 1", {"note_id": 2, "column_id": "todo",
+                                                                                    "after_id": 3}),
+    "move_note_api_delete": ("carol", "POST", "/move_note_api/Alpha Team/Topic 1", {"note_id": 1, "column_id": "delete"}),
+    "batch_notes_api": ("bobby", "POST", "/batch_notes_api/Alpha Team/Topic 1", {"operations": [
+        {"action": "create", "content": "New", "status": "todo"},
+        {"action": "edit", "note_id": 2, "content": "Edited"},
+        {"action": "move", "note_id": 3, "status": "doing"},
+        {"action": "delete", "note_id": 4}]}),
+    "undo_note_api": ("bobby", "POST", "/undo_note_api/Alpha Team/Topic 1", {}),
+    "board_activity_api": ("carol", "GET", "/api/team/Alpha Team/topic/Topic 1/activity", None),
+    "board_activity_api_page": ("carol", "GET", "/api/team/Alpha Team/topic/Topic 1/activity?after=10&limit=5", None),
+}
+
+# Maintenance commands that run SQL of their own
+COMMANDS = ["recount", "compact-events", "compact-tombstones", "archive-notes", "rebalance-positions", "purge-sessions"]
+
+
+@pytest.fixture
+def statements():
+    """
+    Record every statement run through db while a test runs, with its query plan
+    """
+
+    recorded = []
+
+    def observe(sql, args, seconds):
+        recorded.append((" ".join(sql.split()), query_plan(sql, args) or []))
+
+    db.observers.append(observe)
+    yield recorded
+    db.observers.remove(observe)
+
+
+def violations(recorded):
+    """
+    Return the plan steps that scan a large table or sort through a temporary B-tree
+    and aren't on the allowlist
+    """
+
+    found = []
+    for sql, plan in recorded:
+        for step in plan:
+            detail = step.strip()
+            scan = SCAN.match(detail)
+
+            if scan and scan.group(1) in LARGE_TABLES and "VIRTUAL TABLE" not in detail:
+                problem = detail
+            elif "USE TEMP B-TREE" in detail:
+                problem = detail
+            else:
+                continue
+
+            if not any(statement in sql and step_detail in detail for statement, step_detail in ALLOWLIST):
+                found.append(f"{problem}\n    in: {sql}")
+
+    return sorted(set(found))
+
+
+def test_every_route_is_covered(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - {"static", "assets"}
+    covered = {name for name in endpoints if any(key == name or key.startswith(f"{name}_") for key in ROUTES)}
+    assert endpoints == covered
+
+
+@pytest.mark.parametrize("name", ROUTES)
+def test_route_query_plans(name, app, login, statements):
+    user, method, url, body = ROUTES[name]
+    client = login(user) if user else app.test_client()
+
+    # Only the statements run by the route itself are checked, not those of logging in
+    statements.clear()
+    response = client.open(url, method=method, json=body)
+
+    assert response.status_code in (200, 302)
+    if response.is_json:
+        assert response.get_json()["success"], response.get_json()
+    else:
+        assert b"<title>\n\n    Error" not in response.data
+
+    assert violations(statements) == []
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_command_query_plans(command, app, statements):
+    result = app.test_cli_runner().invoke(args=[command])
+
+    assert result.exit_code == 0, result.output
+    assert violations(statements) == []
@@ -0,0 +1,93 @@
+import pytest
+
+import ratelimit
+from helpers import db
+
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    """
+    Small limits on moving notes and logging in, with every other endpoint unlimited
+    """
+
+    monkeypatch.setattr(ratelimit, "default_limit", None)
+    monkeypatch.setattr(ratelimit, "limits", {"move_note_api": (20, 20 / 60), "login_api": (2, 2 / 60)})
+
+
+@pytest.fixture
+def bucket_statements():
+    """
+    Record the statements run against the rate_limits table
+    """
+
+    recorded = []
+
+    def observe(sql, args, seconds):
+        if "rate_limits" in sql:
+            recorded.append(sql)
+
+    db.observers.append(observe)
+    yield recorded
+    db.observers.remove(observe)
+
+
+def move(client):
+    return client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": 3, "column_id": "todo"})
+
+
+def test_requests_over_the_limit_are_refused(login, limited, bucket_statements):
+    client = login("carol")
+    bucket_statements.clear()
+
+    assert all(move(client).get_json()["success"] for _ in range(20))
+
+    response = move(client)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert response.get_json() == {"success": False, "error": "Too many requests, please try again in 3 seconds!"}
+
+    # Tokens are taken a few at a time (2 of carol's 20, 8 of her IP's 80), and refused requests
+    # don't touch the database at all
+    assert len([sql for sql in bucket_statements if "INSERT" in sql]) == 10 + 3
+    statements = len(bucket_statements)
+    assert move(client).status_code == 429
+    assert len(bucket_statements) == statements
+
+    # Pages aren't limited
+    assert client.get("/team/Alpha Team/topic/Topic 1").status_code == 200
+
+
+def test_buckets_are_shared_between_workers(login, limited):
+    client = login("carol")
+    for _ in range(20):
+        move(client)
+
+    # Another worker starts without any leases of its own
+    ratelimit.leases.clear()
+    assert move(client).status_code == 429
+
+    db.execute("UPDATE rate_limits SET updated_at = updated_at - 60")
+    ratelimit.leases.clear()
+    assert move(client).get_json()["success"]
+
+
+def test_logins_are_limited_per_username_across_ips(app, limited):
+    client = app.test_client()
+
+    def log_in(username, address):
+        return client.post("/login_api", json={"username": username, "password": "wrong"},
+                           environ_base={"REMOTE_ADDR": address})
+
+    assert log_in("alice", "10.0.0.1").status_code == 200
+    assert log_in("alice", "10.0.0.2").status_code == 200
+    assert log_in("alice", "10.0.0.3").status_code == 429
+    assert log_in("bobby", "10.0.0.3").status_code == 200
+
+
+def test_full_buckets_are_purged(login, limited):
+    # Logging in and moving a note both used carol's and her IP's buckets
+    move(login("carol"))
+    assert ratelimit.purge_rate_limits(force=True) == 0
+
+    db.execute("UPDATE rate_limits SET full_at = full_at - 3600")
+    assert ratelimit.purge_rate_limits(force=True) == 4
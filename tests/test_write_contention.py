@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import database
+import metrics
+from helpers import db
+
+
+@pytest.fixture
+def client(login):
+    """
+    A drag-only member of Alpha Team, logged in before the write lock is taken
+    """
+
+    return login("carol")
+
+
+@pytest.fixture
+def write_lock(client, monkeypatch):
+    """
+    Another connection holding the database's write lock, with short lock waits and retries
+    """
+
+    monkeypatch.setattr(db, "write_retries", 2)
+    monkeypatch.setattr(db, "write_retry_backoff", 0.01)
+    monkeypatch.setattr(database.random, "uniform", lambda low, high: high)
+    db.connection.execute("PRAGMA busy_timeout = 10")
+
+    other = sqlite3.connect(os.environ["DATABASE"], isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    yield other
+
+    if other.in_transaction:
+        other.execute("ROLLBACK")
+    other.close()
+    db.connection.execute(f"PRAGMA busy_timeout = {db.busy_timeout}")
+
+
+def test_busy_write_is_retried_then_refused(client, write_lock):
+    before = dict(metrics.contention)
+
+    response = client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": 1, "column_id": "done"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.get_json()["success"] is False
+    assert metrics.contention["retries"] - before["retries"] == 2
+    assert metrics.contention["failures"] - before["failures"] == 1
+
+
+def test_write_succeeds_once_the_lock_is_released(client, write_lock):
+    before = dict(metrics.contention)
+
+    threading.Timer(0.02, write_lock.execute, ["COMMIT"]).start()
+    response = client.post("/move_note_api/Alpha Team/Topic 1", json={"note_id": 1, "column_id": "done"})
+
+    assert response.get_json()["success"]
+    assert metrics.contention["retries"] > before["retries"]
+    assert metrics.contention["waits"] > before["waits"]
+    assert db.execute("SELECT status FROM notes WHERE id = 1")[0]["status"] == "done"